@@ -0,0 +1,218 @@
+"""
+Control de admisión para las rutas que llaman al modelo (`/analyse_meal`).
+
+Dos capas, por worker:
+
+1. Token bucket por usuario: ADMISSION_RATE_PER_MIN análisis por minuto con
+   ráfagas de hasta ADMISSION_BURST. Sin token -> 429 con Retry-After (lo
+   que falta para el próximo token).
+2. Cupo global de ADMISSION_MAX_CONCURRENCY llamadas en curso con cola justa:
+   cada usuario tiene su fila y el cupo libre va al que menos tiene en curso
+   (a igualdad, por turnos), con a lo sumo ADMISSION_MAX_INFLIGHT_PER_USER
+   en curso por usuario. Así un cliente
+   que dispara muchas peticiones no se lleva todos los cupos ni deja a los
+   demás detrás de su cola. Cola llena (ADMISSION_MAX_QUEUE en total o
+   ADMISSION_MAX_QUEUED_PER_USER por usuario) o espera mayor que
+   ADMISSION_QUEUE_TIMEOUT_S -> 429.
+
+El estado vive en el event loop del worker (sin locks). Con varios workers
+los límites son por worker: el efectivo por usuario puede llegar a
+WEB_CONCURRENCY veces el configurado.
+
+Métricas: admission_rejected_total{route,reason}, admission_queue_depth,
+admission_inflight y admission_wait_seconds.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.core import metrics
+
+RATE_PER_MIN = float(os.getenv("ADMISSION_RATE_PER_MIN", "6"))
+BURST = float(os.getenv("ADMISSION_BURST", "3"))
+MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+MAX_INFLIGHT_PER_USER = int(os.getenv("ADMISSION_MAX_INFLIGHT_PER_USER", "2"))
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+MAX_QUEUED_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUED_PER_USER", "2"))
+QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "20"))
+MAX_TRACKED_USERS = 10000
+
+admission_rejected_total = metrics.counter(
+    "admission_rejected_total", "Requests rechazadas con 429 por motivo (rate, queue_full, timeout)"
+)
+admission_queue_depth = metrics.gauge("admission_queue_depth", "Requests esperando cupo para llamar al modelo")
+admission_inflight = metrics.gauge("admission_inflight", "Requests con cupo llamando al modelo")
+admission_wait_seconds = metrics.histogram(
+    "admission_wait_seconds", "Espera en la cola justa hasta obtener cupo",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0),
+)
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Un bucket por clave; `take()` devuelve 0 si hay token o los segundos hasta el próximo."""
+
+    def __init__(self, rate_per_s: float, burst: float, max_keys: int = MAX_TRACKED_USERS):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def take(self, key: str, now: Optional[float] = None) -> float:
+        if self.rate_per_s <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        tokens, last = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate_per_s)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate_per_s
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            # el menos usado recientemente: como mucho se le devuelve la ráfaga completa
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class FairLimiter:
+    """Cupo global con una fila por usuario atendida por turnos."""
+
+    def __init__(
+        self,
+        limit: int = MAX_CONCURRENCY,
+        per_user: int = MAX_INFLIGHT_PER_USER,
+        max_queue: int = MAX_QUEUE,
+        max_queued_per_user: int = MAX_QUEUED_PER_USER,
+    ):
+        self.limit = limit
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.active = 0
+        self.queued = 0
+        self._inflight: Dict[str, int] = {}
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._avg_hold_s = 5.0  # EWMA de la duración con cupo, para estimar Retry-After
+
+    def _grant(self, user: str, fut: asyncio.Future) -> None:
+        self.active += 1
+        self._inflight[user] = self._inflight.get(user, 0) + 1
+        fut.set_result(None)
+
+    def _next_user(self) -> Optional[str]:
+        # el que menos tiene en curso; a igualdad, el primero en turno
+        best, best_inflight = None, self.per_user
+        for user in self._waiting:
+            inflight = self._inflight.get(user, 0)
+            if inflight < best_inflight:
+                best, best_inflight = user, inflight
+                if inflight == 0:
+                    break
+        return best
+
+    def _dispatch(self) -> None:
+        while self.active < self.limit:
+            user = self._next_user()
+            if user is None:
+                break
+            queue = self._waiting.pop(user)
+            fut = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._waiting[user] = queue  # al final: turno del siguiente usuario
+            self._grant(user, fut)
+        self._publish()
+
+    def _publish(self) -> None:
+        admission_queue_depth.set(self.queued)
+        admission_inflight.set(self.active)
+
+    def retry_after(self) -> float:
+        return max(1.0, self._avg_hold_s * (self.queued + 1) / max(self.limit, 1))
+
+    async def acquire(self, user: str, timeout: float = QUEUE_TIMEOUT_S) -> None:
+        user_queue = self._waiting.get(user)
+        if self.queued >= self.max_queue or (user_queue and len(user_queue) >= self.max_queued_per_user):
+            raise Rejected("queue_full", self.retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user, deque()).append(fut)
+        self.queued += 1
+        self._dispatch()
+        if fut.done():
+            return
+
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # el cupo llegó justo al cancelar/vencer: se devuelve
+                self.release(user)
+            else:
+                fut.cancel()
+                queue = self._waiting.get(user)
+                if queue is not None and fut in queue:
+                    queue.remove(fut)
+                    self.queued -= 1
+                    if not queue:
+                        del self._waiting[user]
+                self._publish()
+            if isinstance(e, asyncio.TimeoutError):
+                raise Rejected("timeout", self.retry_after())
+            raise
+
+    def release(self, user: str, held_s: Optional[float] = None) -> None:
+        self.active -= 1
+        remaining = self._inflight.get(user, 1) - 1
+        if remaining:
+            self._inflight[user] = remaining
+        else:
+            self._inflight.pop(user, None)
+        if held_s is not None:
+            self._avg_hold_s = 0.8 * self._avg_hold_s + 0.2 * held_s
+        self._dispatch()
+
+
+_buckets = TokenBucket(RATE_PER_MIN / 60.0, BURST)
+_limiter = FairLimiter()
+
+
+def _too_many(route: str, reason: str, retry_after: float, detail: str) -> HTTPException:
+    admission_rejected_total.inc(route=route, reason=reason)
+    return HTTPException(
+        status_code=429, detail=detail, headers={"Retry-After": str(math.ceil(retry_after))}
+    )
+
+
+@asynccontextmanager
+async def admit(user_id: str, route: str) -> AsyncIterator[None]:
+    """Reserva token y cupo para una llamada al modelo; 429 si el usuario o la cola van llenos."""
+    wait = _buckets.take(user_id)
+    if wait > 0:
+        raise _too_many(route, "rate", wait, "Demasiados análisis seguidos; espera un momento.")
+
+    started = time.monotonic()
+    try:
+        await _limiter.acquire(user_id)
+    except Rejected as e:
+        raise _too_many(route, e.reason, e.retry_after, "El servicio está ocupado; reintenta en unos segundos.")
+    admitted = time.monotonic()
+    admission_wait_seconds.observe(admitted - started, route=route)
+    try:
+        yield
+    finally:
+        _limiter.release(user_id, time.monotonic() - admitted)
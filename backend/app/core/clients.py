@@ -0,0 +1,82 @@
+"""
+Clientes pesados (Supabase, OpenAI) con inicialización perezosa.
+
+`supabase`, `openai` y sus dependencias tardan cientos de ms en importarse y
+`create_client` arma varios subclientes; hacerlo al importar `app.main` alarga
+el arranque en frío de cada worker. Los accessors `get_*` importan y crean el
+cliente en el primer uso y lo cachean; `LazyClient` permite seguir exponiendo
+variables de módulo (`supabase`, `supabase_admin`, `client`) sin crearlas.
+
+La falta de variables de entorno ya no rompe el import: se reporta como
+RuntimeError en el primer uso del cliente.
+"""
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Callable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# lru_cache no evita que dos hilos creen el cliente a la vez en el primer uso
+_lock = threading.Lock()
+
+
+def _require(*names: str) -> list:
+    values = [os.getenv(name) for name in names]
+    if not all(values):
+        raise RuntimeError(f"{' and '.join(names)} environment variables must be set")
+    return values
+
+
+@lru_cache(maxsize=None)
+def _create_supabase(url: str, key: str):
+    from supabase import create_client
+
+    return create_client(url, key)
+
+
+def get_supabase():
+    """Cliente Supabase con la anon/service key de SUPABASE_KEY."""
+    url, key = _require("SUPABASE_URL", "SUPABASE_KEY")
+    with _lock:
+        return _create_supabase(url, key)
+
+
+def get_supabase_admin():
+    """Cliente Supabase con la service role key (storage e inserciones)."""
+    url, key = _require("SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY")
+    with _lock:
+        return _create_supabase(url, key)
+
+
+@lru_cache(maxsize=None)
+def _create_openai(api_key: str):
+    from openai import OpenAI
+
+    # los reintentos los maneja call_model (con jitter y circuit breaker), no el SDK
+    return OpenAI(api_key=api_key, max_retries=0)
+
+
+def get_openai():
+    with _lock:
+        return _create_openai(os.getenv("OPENAI_API_KEY"))
+
+
+class LazyClient:
+    """
+    Proxy que crea el cliente real en el primer acceso a un atributo.
+
+    Los atributos asignados sobre el proxy (p. ej. con `unittest.mock.patch`)
+    quedan en el propio proxy y tapan al cliente real hasta que se borran.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._factory(), name)
+
+    def __repr__(self) -> str:
+        return f"<LazyClient {getattr(self._factory, '__name__', self._factory)}>"
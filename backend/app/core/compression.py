@@ -0,0 +1,163 @@
+"""
+Compresión gzip/brotli de respuestas negociada por Accept-Encoding.
+
+- Solo respuestas completas (un único mensaje de cuerpo: JSON, texto); las
+  de streaming (exportes) pasan tal cual.
+- Solo tipos compresibles y cuerpos >= COMPRESS_MIN_BYTES (por debajo la
+  cabecera y el CPU cuestan más de lo que se ahorra).
+- Brotli si el cliente lo acepta y el paquete `Brotli` está instalado; si no,
+  gzip. Calidades en COMPRESS_GZIP_LEVEL y COMPRESS_BROTLI_QUALITY (niveles
+  bajos: comprimen casi lo mismo en JSON por mucho menos CPU).
+- Un ETag fuerte pasa a débil (W/) al comprimir: los bytes ya no son los
+  mismos, pero sigue validando con If-None-Match (comparación débil).
+- `Vary: Accept-Encoding` va en toda respuesta compresible, se comprima o
+  no (cuerpo chico, cliente sin Accept-Encoding): un proxy no debe servir la
+  versión de un encoding a un cliente que pidió otra.
+- Cuerpos grandes se comprimen en el threadpool para no frenar el event loop.
+"""
+import asyncio
+import gzip
+import os
+from typing import Dict, List, Optional, Tuple
+
+from app.core import metrics
+
+try:
+    import brotli
+except ImportError:  # sin Brotli instalado se negocia solo gzip
+    brotli = None
+
+MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+THREAD_BYTES = int(os.getenv("COMPRESS_THREAD_KB", "256")) * 1024
+
+COMPRESSIBLE = (b"application/json", b"text/", b"application/javascript", b"image/svg+xml")
+
+compressed_responses_total = metrics.counter(
+    "compressed_responses_total", "Respuestas comprimidas por encoding"
+)
+compression_bytes_saved_total = metrics.counter(
+    "compression_bytes_saved_total", "Bytes ahorrados por la compresión de respuestas"
+)
+
+
+def _accepted(accept_encoding: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Encoding a usar ("br", "gzip") o None; a igual q se prefiere brotli."""
+    if not accept_encoding:
+        return None
+    accepted = _accepted(accept_encoding)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _with_vary(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Agrega Accept-Encoding al Vary existente (o lo crea) sin duplicarlo."""
+    out, merged = [], False
+    for key, value in headers:
+        if key.lower() == b"vary":
+            if value.strip() != b"*" and b"accept-encoding" not in value.lower():
+                value = value + b", Accept-Encoding"
+            merged = True
+        out.append((key, value))
+    if not merged:
+        out.append((b"vary", b"Accept-Encoding"))
+    return out
+
+
+class CompressionMiddleware:
+    """Middleware ASGI puro: comprime el cuerpo completo si el cliente lo acepta."""
+
+    def __init__(self, app, minimum_size: int = MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or ())
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        start_message = None
+
+        async def compressing_send(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                return await send(message)
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            response_headers = list(start.get("headers", []))
+            content_type = _header(response_headers, b"content-type") or b""
+            if (
+                message.get("more_body", False)
+                or _header(response_headers, b"content-encoding") is not None
+                or not content_type.startswith(COMPRESSIBLE)
+            ):
+                await send(start)
+                return await send(message)
+
+            if encoding is None or len(body) < self.minimum_size:
+                # compresible para otro cliente: el caché tiene que saberlo igual
+                await send({**start, "headers": _with_vary(response_headers)})
+                return await send(message)
+
+            if len(body) >= THREAD_BYTES:
+                compressed = await asyncio.to_thread(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            compressed_responses_total.inc(encoding=encoding)
+            compression_bytes_saved_total.inc(len(body) - len(compressed))
+
+            new_headers = []
+            for key, value in response_headers:
+                lower = key.lower()
+                if lower == b"content-length":
+                    continue
+                if lower == b"etag" and not value.startswith(b"W/"):
+                    value = b"W/" + value
+                new_headers.append((key, value))
+            new_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            await send({**start, "headers": _with_vary(new_headers)})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
@@ -0,0 +1,125 @@
+"""
+ETag / If-None-Match para las lecturas que la app refresca al enfocar pantallas
+(`/users/me`, `/meals/day`, `/history_meals`, `/history_meals/{id}`).
+
+Dos validadores:
+
+- Versión por usuario (`bump()` en cada escritura: save_analysis,
+  delete_meal, users, miniaturas). El ETag se calcula *antes* de consultar y,
+  si coincide con If-None-Match, se responde 304 sin tocar la base. Solo es
+  fiable si este proceso ve todas las escrituras, así que se usa con un único
+  worker (ETAG_MODE=version, por defecto si WEB_CONCURRENCY == 1). El ETag
+  lleva una época aleatoria por proceso: tras un reinicio no se confunden
+  versiones.
+- Hash del cuerpo (ETAG_MODE=hash, por defecto con varios workers): se
+  consulta igual pero se ahorra la transferencia con el 304.
+
+Las respuestas llevan `Cache-Control: private, no-cache` (el cliente guarda
+y revalida siempre). Escrituras hechas fuera del proceso (jobs, SQL manual)
+no suben la versión; en modo version las ve el siguiente reinicio o cambio.
+"""
+import hashlib
+import json
+import os
+import secrets
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.core import metrics
+from app.core.responses import dumps
+
+EPOCH = secrets.token_hex(4)
+CACHE_CONTROL = "private, no-cache"
+
+etag_requests_total = metrics.counter(
+    "etag_requests_total",
+    "Lecturas con ETag por resultado (version_hit = 304 sin DB, hash_hit = 304 tras consultar, miss)",
+)
+
+_lock = threading.Lock()
+_versions: Dict[str, int] = {}
+
+
+def mode() -> str:
+    configured = os.getenv("ETAG_MODE")
+    if configured in ("version", "hash"):
+        return configured
+    return "version" if int(os.getenv("WEB_CONCURRENCY", "1")) <= 1 else "hash"
+
+
+def bump(user_id: Optional[str]) -> None:
+    """Invalida los ETags de versión del usuario (llamar tras cada escritura suya)."""
+    if not user_id:
+        return
+    with _lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+def version(user_id: str) -> int:
+    with _lock:
+        return _versions.get(user_id, 0)
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def version_tag(user_id: str, *parts) -> str:
+    # débil: la misma versión puede serializarse distinto (p. ej. orden de claves)
+    return f'W/"v{EPOCH}.{version(user_id)}.{_digest(*parts)[:12]}"'
+
+
+def content_tag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Comparación débil de If-None-Match (lista separada por comas o `*`)."""
+    if not if_none_match:
+        return False
+    bare = tag[2:] if tag.startswith("W/") else tag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == bare:
+            return True
+    return False
+
+
+def _not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CACHE_CONTROL})
+
+
+def conditional(request: Request, user_id: str, route: str, load: Callable[[], Any], *parts) -> Response:
+    """
+    Responde `load()` como JSON con ETag, o 304 si el cliente ya lo tiene.
+
+    `parts` son las entradas que cambian el contenido además de la ruta y la
+    query (p. ej. el día local resuelto de /meals/day, que cambia a medianoche).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    tag = None
+    if mode() == "version":
+        # la versión se lee antes de consultar: una escritura concurrente deja el ETag viejo
+        tag = version_tag(user_id, request.url.path, request.url.query, *parts)
+        if matches(if_none_match, tag):
+            etag_requests_total.inc(route=route, outcome="version_hit")
+            return _not_modified(tag)
+
+    body = dumps(load())
+    if tag is None:
+        tag = content_tag(body)
+        if matches(if_none_match, tag):
+            etag_requests_total.inc(route=route, outcome="hash_hit")
+            return _not_modified(tag)
+
+    etag_requests_total.inc(route=route, outcome="miss")
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": tag, "Cache-Control": CACHE_CONTROL},
+    )
@@ -0,0 +1,229 @@
+"""
+Pub/sub en proceso para empujar cambios a los clientes (GET /meals/day/stream).
+
+Las escrituras de un usuario (save_analysis, delete_meal, relog, miniaturas,
+perfil) llaman a `publish(user_id, kind)` junto a `etags.bump`; cada stream
+abierto de ese usuario tiene una suscripción (cola asyncio en el loop del
+worker) y recalcula el resumen del día al recibir el evento. El evento solo
+avisa "cambió algo": el contenido se vuelve a leer de la base.
+
+- `publish` es seguro desde cualquier hilo (rutas síncronas, threadpool de
+  miniaturas): entrega con `loop.call_soon_threadsafe`. Desde código async se
+  usa `publish_async`: con sqlite el insert puede esperar al lock de escritura
+  (hasta 5 s) y no debe bloquear el event loop.
+- Colas acotadas (EVENTS_QUEUE_SIZE): si un cliente lento no consume, se
+  descarta el evento más viejo; como los eventos se coalescen no se pierde
+  información, solo repeticiones.
+- `close_all()` (al drenar) despierta a todos los streams para que terminen y
+  uvicorn no espere conexiones abiertas indefinidamente.
+
+Backends: `memory` (por worker) y `sqlite` (archivo compartido por los workers
+de un mismo contenedor: `publish` inserta una fila y un hilo por worker la lee
+cada EVENTS_POLL_S). Por defecto sqlite si WEB_CONCURRENCY > 1, igual que
+idempotency.
+"""
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from app.core import metrics
+
+QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "16"))
+POLL_S = float(os.getenv("EVENTS_POLL_S", "0.25"))
+RETENTION_S = float(os.getenv("EVENTS_RETENTION_S", "60"))
+
+events_published_total = metrics.counter("events_published_total", "Eventos publicados por tipo")
+events_dropped_total = metrics.counter(
+    "events_dropped_total", "Eventos descartados por cola de suscriptor llena (el más viejo)"
+)
+event_subscribers = metrics.gauge("event_subscribers", "Suscripciones abiertas en este worker")
+
+CLOSE = {"kind": "close"}
+
+
+class Subscription:
+    """Cola de un stream; se crea y se lee en el loop del worker."""
+
+    def __init__(self, user_id: str, maxsize: int = QUEUE_SIZE):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        # corre en el loop (vía call_soon_threadsafe)
+        if self.queue.full():
+            self.queue.get_nowait()
+            events_dropped_total.inc()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Siguiente evento o None si vence el timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self) -> list:
+        """Eventos ya encolados (para coalescer una ráfaga en un solo recálculo)."""
+        pending = []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        return pending
+
+
+class MemoryBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        event_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+        event_subscribers.dec()
+
+    def subscribers(self, user_id: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(user_id, ()))
+
+    def publish(self, user_id: str, kind: str) -> None:
+        self._fanout(user_id, {"kind": kind, "ts": time.time()})
+
+    def _fanout(self, user_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, ()))
+        for subscription in targets:
+            _deliver(subscription, event)
+
+    def close_all(self) -> None:
+        with self._lock:
+            targets = [s for subscribers in self._subscribers.values() for s in subscribers]
+        for subscription in targets:
+            _deliver(subscription, CLOSE)
+
+
+def _deliver(subscription: Subscription, event: Dict[str, Any]) -> None:
+    try:
+        subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+    except RuntimeError:
+        pass  # loop cerrado: el stream ya terminó
+
+
+class SqliteBroker(MemoryBroker):
+    """Archivo SQLite compartido: publish inserta, un hilo por worker reparte lo nuevo."""
+
+    def __init__(self, path: str, poll_s: float = POLL_S):
+        super().__init__()
+        self.path = path
+        self.poll_s = poll_s
+        self._local = threading.local()
+        self._poller: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "create table if not exists events ("
+            " id integer primary key autoincrement, user_id text not null,"
+            " kind text not null, created_at real not null)"
+        )
+        # solo eventos posteriores al arranque de este worker
+        self._last_id = conn.execute("select coalesce(max(id), 0) from events").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("pragma journal_mode=wal")
+            self._local.conn = conn
+        return conn
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = super().subscribe(user_id)
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, name="events-poller", daemon=True)
+                self._poller.start()
+        return subscription
+
+    def publish(self, user_id: str, kind: str) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("insert into events (user_id, kind, created_at) values (?, ?, ?)", (user_id, kind, now))
+        if random.random() < 0.01:  # limpieza ocasional
+            conn.execute("delete from events where created_at < ?", (now - RETENTION_S,))
+
+    def poll(self) -> int:
+        """Reparte a los suscriptores locales las filas nuevas; devuelve cuántas leyó."""
+        rows = self._conn().execute(
+            "select id, user_id, kind, created_at from events where id > ? order by id", (self._last_id,)
+        ).fetchall()
+        for row_id, user_id, kind, created_at in rows:
+            self._last_id = row_id
+            self._fanout(user_id, {"kind": kind, "ts": created_at})
+        return len(rows)
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_s):
+            try:
+                self.poll()
+            except sqlite3.Error as e:
+                logging.warning(f"events: lectura de {self.path} falló: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def _default_broker():
+    backend = os.getenv("EVENTS_BACKEND")
+    if backend is None:
+        backend = "sqlite" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "memory"
+    if backend == "sqlite":
+        return SqliteBroker(os.getenv("EVENTS_DB_PATH", "data/events.sqlite3"))
+    return MemoryBroker()
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = _default_broker()
+    return _broker
+
+
+def publish(user_id: Optional[str], kind: str) -> None:
+    """Avisa a los streams del usuario; nunca falla la escritura que lo llama."""
+    if not user_id:
+        return
+    events_published_total.inc(kind=kind)
+    try:
+        get_broker().publish(user_id, kind)
+    except Exception as e:
+        logging.warning(f"events: no se pudo publicar {kind}: {e}")
+
+
+async def publish_async(user_id: Optional[str], kind: str) -> None:
+    """`publish` para rutas async: el insert del backend sqlite corre en el threadpool."""
+    await asyncio.to_thread(publish, user_id, kind)
+
+
+def close_all() -> None:
+    if _broker is not None:
+        _broker.close_all()
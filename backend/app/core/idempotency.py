@@ -0,0 +1,346 @@
+"""
+Idempotency-Key para endpoints que suben imágenes o llaman al modelo.
+
+El cliente móvil reintenta `/save_analysis` y `/analyse_meal` cuando la red
+falla; con la cabecera `Idempotency-Key` el reintento devuelve la respuesta
+original en vez de volver a subir, insertar o pagar otra llamada al modelo.
+
+- La clave se aísla por usuario y ruta: `<user_id>:<ruta>:<key>`.
+- Primer request: se reserva la clave (in-flight) a nombre de un token del
+  request y al terminar se guarda status + cuerpo durante IDEMPOTENCY_TTL_S.
+  Se guardan 2xx y 4xx; con 5xx, 429/408/409 o excepción la clave se libera
+  para que el reintento se ejecute. `complete`/`release` solo tocan la
+  reserva de su propio token.
+- En memoria la reserva no vence (si el worker vive, el request sigue en
+  curso). En sqlite dura IDEMPOTENCY_LEASE_S y se renueva mientras corre el
+  handler: si el worker muere a mitad, vence sola y el reintento se ejecuta.
+- Duplicado concurrente: espera al primero (hasta IDEMPOTENCY_WAIT_S) y
+  devuelve su respuesta; si no termina a tiempo, 409 con Retry-After.
+- Misma clave con otro contenido (fingerprint distinto): 422.
+- Cada entrada cuenta sus replays (`hits`); métricas en
+  `idempotency_requests_total{route,outcome}`.
+
+Backends: `memory` (por worker) y `sqlite` (archivo compartido por los workers
+de un mismo contenedor). Por defecto sqlite si WEB_CONCURRENCY > 1.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Awaitable, Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from app.core import metrics
+
+TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", str(24 * 3600)))
+WAIT_S = float(os.getenv("IDEMPOTENCY_WAIT_S", "60"))
+LEASE_S = float(os.getenv("IDEMPOTENCY_LEASE_S", str(WAIT_S)))
+MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+MAX_KEY_LENGTH = 255
+POLL_S = 0.05
+# respuestas que dependen del momento y no del contenido: no se guardan
+RETRYABLE_STATUS = {408, 409, 425, 429}
+
+idempotency_requests_total = metrics.counter(
+    "idempotency_requests_total",
+    "Requests con Idempotency-Key por resultado (new, replay, waited, in_progress, mismatch)",
+)
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    body: bytes
+    media_type: str = "application/json"
+    hits: int = 0  # replays servidos (lo devuelve begin)
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    owner: str
+    expires_at: float
+    response: Optional[StoredResponse] = None
+    hits: int = 0
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class MemoryIdempotencyStore:
+    """TTL + LRU en memoria del worker; los duplicados en vuelo esperan un asyncio.Event."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def _get(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        # solo vencen las respuestas guardadas: una reserva en memoria es de un request vivo
+        if entry is not None and entry.response is not None and entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def _owned(self, key: str, token: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        return entry if entry is not None and entry.owner == token else None
+
+    async def begin(self, key: str, fingerprint: str, token: str) -> Tuple[str, Optional[StoredResponse]]:
+        entry = self._get(key)
+        if entry is None:
+            self._entries[key] = _Entry(fingerprint, token, time.monotonic() + LEASE_S)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return "new", None
+        self._entries.move_to_end(key)
+        if entry.fingerprint != fingerprint:
+            return "mismatch", None
+        if entry.response is None:
+            return "in_flight", None
+        entry.hits += 1
+        return "replay", replace(entry.response, hits=entry.hits)
+
+    async def wait(self, key: str, timeout: float) -> None:
+        entry = self._get(key)
+        if entry is not None and entry.response is None:
+            try:
+                await asyncio.wait_for(entry.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def renew(self, key: str, token: str) -> None:
+        pass  # la reserva en memoria no vence
+
+    async def complete(self, key: str, token: str, response: StoredResponse) -> None:
+        entry = self._owned(key, token)
+        if entry is not None:
+            entry.response = response
+            entry.expires_at = time.monotonic() + TTL_S
+            entry.done.set()
+
+    async def release(self, key: str, token: str) -> None:
+        entry = self._owned(key, token)
+        if entry is not None:
+            del self._entries[key]
+            entry.done.set()
+
+
+class SqliteIdempotencyStore:
+    """Archivo SQLite compartido entre workers; la espera de duplicados es por polling."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "create table if not exists idempotency ("
+                " key text primary key, fingerprint text not null, expires_at real not null,"
+                " status integer, body blob, media_type text, hits integer not null default 0,"
+                " owner text)"
+            )
+            columns = {row[1] for row in conn.execute("pragma table_info(idempotency)")}
+            if "owner" not in columns:  # archivo creado antes de los tokens de reserva
+                conn.execute("alter table idempotency add column owner text")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("pragma journal_mode=wal")
+            self._local.conn = conn
+        return conn
+
+    def _begin(self, key: str, fingerprint: str, token: str) -> Tuple[str, Optional[StoredResponse]]:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("begin immediate")
+        try:
+            if random.random() < 0.01:  # limpieza ocasional de claves vencidas
+                conn.execute("delete from idempotency where expires_at <= ?", (now,))
+            conn.execute("delete from idempotency where key = ? and expires_at <= ?", (key, now))
+            row = conn.execute(
+                "select fingerprint, status, body, media_type, hits from idempotency where key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "insert into idempotency (key, fingerprint, expires_at, owner) values (?, ?, ?, ?)",
+                    (key, fingerprint, now + LEASE_S, token),
+                )
+                result = ("new", None)
+            elif row[0] != fingerprint:
+                result = ("mismatch", None)
+            elif row[1] is None:
+                result = ("in_flight", None)
+            else:
+                conn.execute("update idempotency set hits = hits + 1 where key = ?", (key,))
+                result = ("replay", StoredResponse(row[1], bytes(row[2]), row[3], row[4] + 1))
+            conn.execute("commit")
+            return result
+        except BaseException:
+            conn.execute("rollback")
+            raise
+
+    def _state(self, key: str) -> Optional[int]:
+        # una reserva vencida (worker caído) cuenta como liberada
+        row = self._conn().execute(
+            "select status from idempotency where key = ? and expires_at > ?", (key, time.time())
+        ).fetchone()
+        return -1 if row is None else row[0]
+
+    async def begin(self, key: str, fingerprint: str, token: str) -> Tuple[str, Optional[StoredResponse]]:
+        return await asyncio.to_thread(self._begin, key, fingerprint, token)
+
+    async def wait(self, key: str, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if await asyncio.to_thread(self._state, key) is not None:
+                return  # completada (status) o liberada (-1)
+            await asyncio.sleep(POLL_S)
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        # la conexión es por hilo: se obtiene dentro del hilo del threadpool
+        self._conn().execute(sql, params)
+
+    async def renew(self, key: str, token: str) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "update idempotency set expires_at = ? where key = ? and owner = ? and status is null",
+            (time.time() + LEASE_S, key, token),
+        )
+
+    async def complete(self, key: str, token: str, response: StoredResponse) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "update idempotency set status = ?, body = ?, media_type = ?, expires_at = ?"
+            " where key = ? and owner = ?",
+            (response.status, response.body, response.media_type, time.time() + TTL_S, key, token),
+        )
+
+    async def release(self, key: str, token: str) -> None:
+        await asyncio.to_thread(self._execute, "delete from idempotency where key = ? and owner = ?", (key, token))
+
+
+def _default_store():
+    backend = os.getenv("IDEMPOTENCY_BACKEND")
+    if backend is None:
+        backend = "sqlite" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "memory"
+    if backend == "sqlite":
+        return SqliteIdempotencyStore(os.getenv("IDEMPOTENCY_DB_PATH", "data/idempotency.sqlite3"))
+    return MemoryIdempotencyStore()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = _default_store()
+    return _store
+
+
+def fingerprint(*parts) -> str:
+    """Huella del contenido del request (para detectar la misma clave con otro payload)."""
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def _storable(status: int) -> bool:
+    return status < 500 and status not in RETRYABLE_STATUS
+
+
+def _replay(stored: StoredResponse, hits: int) -> Response:
+    return Response(
+        content=stored.body,
+        status_code=stored.status,
+        media_type=stored.media_type,
+        headers={"Idempotent-Replayed": "true", "Idempotency-Hits": str(hits)},
+    )
+
+
+async def _keep_leased(store, key: str, token: str) -> None:
+    # renueva la reserva mientras corre el handler (análisis con cola, reintentos y hedging)
+    while True:
+        await asyncio.sleep(LEASE_S / 3)
+        try:
+            await store.renew(key, token)
+        except Exception as e:
+            logging.warning(f"idempotency: no se pudo renovar la reserva: {e}")
+
+
+async def run(
+    idempotency_key: Optional[str],
+    user_id: str,
+    route: str,
+    request_fingerprint: str,
+    handler: Callable[[], Awaitable[Response]],
+) -> Response:
+    """Ejecuta `handler` una sola vez por (usuario, ruta, Idempotency-Key)."""
+    if not idempotency_key:
+        return await handler()
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key supera {MAX_KEY_LENGTH} caracteres.")
+
+    store = get_store()
+    key = f"{user_id}:{route}:{idempotency_key}"
+    token = uuid.uuid4().hex
+    waited = False
+    deadline = time.monotonic() + WAIT_S
+    # si el request en vuelo falla y libera la clave, el que esperaba la toma y ejecuta
+    while True:
+        outcome, stored = await store.begin(key, request_fingerprint, token)
+        if outcome == "mismatch":
+            idempotency_requests_total.inc(route=route, outcome="mismatch")
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key ya usada con un contenido distinto."
+            )
+        if outcome == "replay":
+            idempotency_requests_total.inc(route=route, outcome="waited" if waited else "replay")
+            return _replay(stored, stored.hits)
+        if outcome == "in_flight":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                idempotency_requests_total.inc(route=route, outcome="in_progress")
+                raise HTTPException(
+                    status_code=409,
+                    detail="Hay un request con esta Idempotency-Key en curso.",
+                    headers={"Retry-After": "1"},
+                )
+            waited = True
+            await store.wait(key, remaining)
+            continue
+        break
+
+    idempotency_requests_total.inc(route=route, outcome="new")
+    renewer = asyncio.create_task(_keep_leased(store, key, token))
+    try:
+        response = await handler()
+    except HTTPException as e:
+        if _storable(e.status_code):
+            body = json.dumps({"detail": e.detail}).encode()
+            await store.complete(key, token, StoredResponse(e.status_code, body))
+        else:
+            await store.release(key, token)
+        raise
+    except BaseException:
+        await store.release(key, token)
+        raise
+    finally:
+        renewer.cancel()
+
+    if _storable(response.status_code):
+        await store.complete(
+            key, token, StoredResponse(response.status_code, bytes(response.body), response.media_type)
+        )
+    else:
+        await store.release(key, token)
+    return response
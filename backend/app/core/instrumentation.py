@@ -0,0 +1,106 @@
+"""
+Instrumentación ligera por etapas (auth, db, storage, model).
+
+`span("db")` mide un bloque y lo acumula en los tiempos del request actual
+(ContextVar, visible también desde el threadpool de los endpoints síncronos).
+TimingMiddleware agrega al final del request:
+
+- histogramas `http_request_duration_seconds{route,method,status}` y
+  `stage_duration_seconds{route,stage}` servidos en /metrics;
+- cabecera `Server-Timing` con la duración total por etapa.
+
+El costo por span es un perf_counter y un append, apto para producción.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.core import metrics
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Latencia de requests HTTP por ruta", STAGE_BUCKETS
+)
+stage_duration = metrics.histogram(
+    "stage_duration_seconds", "Latencia por etapa (auth, db, storage, model) y ruta", STAGE_BUCKETS
+)
+
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+        else:
+            # fuera de un request (jobs, CLI): se registra sin ruta
+            stage_duration.observe(elapsed, route="-", stage=stage)
+
+
+def _summarize(timings: List[Tuple[str, float]]) -> Dict[str, Tuple[float, int]]:
+    summary: Dict[str, Tuple[float, int]] = {}
+    for stage, elapsed in timings:
+        total, count = summary.get(stage, (0.0, 0))
+        summary[stage] = (total + elapsed, count + 1)
+    return summary
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    parts = []
+    for stage, (elapsed, count) in _summarize(timings).items():
+        part = f"{stage};dur={elapsed * 1000:.1f}"
+        if count > 1:
+            part += f';desc="{count} calls"'
+        parts.append(part)
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class TimingMiddleware:
+    """Middleware ASGI puro (sin BaseHTTPMiddleware) para no añadir overhead por request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", header.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _timings.reset(token)
+            route = _route_label(scope)
+            request_duration.observe(elapsed, route=route, method=scope["method"], status=status_code)
+            for stage, stage_elapsed in timings:
+                stage_duration.observe(stage_elapsed, route=route, stage=stage)
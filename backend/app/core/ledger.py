@@ -0,0 +1,270 @@
+"""
+Ledger de llamadas al modelo: tokens, latencia, bytes de imagen, resultado y costo.
+
+Los registros se encolan sin bloquear el request y un hilo en segundo plano los
+escribe por lotes en SQLite (MODEL_LEDGER_PATH). `summarize()` agrega por día y
+modelo (p50/p95 de latencia, tokens y costo) y se usa desde el endpoint de admin
+y desde la CLI:
+
+    python -m app.core.ledger --days 7
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core import metrics
+
+# USD por 1M de tokens (input, output). Sobrescribible con MODEL_PRICES_JSON.
+DEFAULT_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-5-mini": (0.25, 2.00),
+}
+
+dropped_total = metrics.counter("model_ledger_dropped_total", "Registros del ledger descartados por cola llena")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_calls (
+    ts TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    model TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    latency_ms REAL NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    image_bytes INTEGER NOT NULL,
+    cost_usd REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS model_calls_ts_idx ON model_calls (ts);
+"""
+
+_COLUMNS = (
+    "ts", "purpose", "model", "outcome", "latency_ms", "prompt_tokens",
+    "completion_tokens", "total_tokens", "image_bytes", "cost_usd",
+)
+
+
+def _load_prices() -> Dict[str, tuple]:
+    prices = dict(DEFAULT_PRICES)
+    raw = os.getenv("MODEL_PRICES_JSON")
+    if raw:
+        try:
+            prices.update({k: tuple(v) for k, v in json.loads(raw).items()})
+        except (ValueError, TypeError):
+            logging.warning("MODEL_PRICES_JSON inválido; se usan precios por defecto")
+    return prices
+
+
+PRICES = _load_prices()
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+@dataclass
+class ModelCallRecord:
+    purpose: str
+    model: str
+    outcome: str
+    latency_ms: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    image_bytes: int = 0
+    cost_usd: float = 0.0
+    ts: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+    @classmethod
+    def from_response(cls, purpose: str, model: str, latency_ms: float, response: Any = None,
+                      outcome: str = "ok", image_bytes: int = 0) -> "ModelCallRecord":
+        usage = getattr(response, "usage", None)
+
+        def tokens(name: str) -> int:
+            value = getattr(usage, name, 0)
+            return value if isinstance(value, int) else 0
+
+        prompt, completion = tokens("prompt_tokens"), tokens("completion_tokens")
+        total = tokens("total_tokens") or prompt + completion
+        return cls(
+            purpose=purpose,
+            model=model,
+            outcome=outcome,
+            latency_ms=latency_ms,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            total_tokens=total,
+            image_bytes=image_bytes,
+            cost_usd=estimate_cost(model, prompt, completion),
+        )
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class LedgerWriter:
+    """Escritor en segundo plano: `record()` nunca bloquea; el hilo escribe por lotes."""
+
+    def __init__(self, path: str, max_queue: int = 10_000, batch_size: int = 200, flush_interval_s: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self._queue: "queue.Queue[Optional[ModelCallRecord]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="model-ledger", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def record(self, rec: ModelCallRecord) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(rec)
+        except queue.Full:
+            dropped_total.inc()
+
+    def _run(self) -> None:
+        conn = _connect(self.path)
+        placeholders = ",".join("?" for _ in _COLUMNS)
+        sql = f"INSERT INTO model_calls ({','.join(_COLUMNS)}) VALUES ({placeholders})"
+        stop = False
+        while not stop:
+            batch: List[ModelCallRecord] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval_s)
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+                while len(batch) < self.batch_size and not stop:
+                    item = self._queue.get_nowait()
+                    if item is None:
+                        stop = True
+                    else:
+                        batch.append(item)
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    conn.executemany(sql, [tuple(asdict(r)[c] for c in _COLUMNS) for r in batch])
+                    conn.commit()
+                except sqlite3.Error:
+                    logging.exception("No se pudo escribir el ledger de modelos")
+        conn.close()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Vacía la cola y detiene el hilo (atexit / tests)."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        self._thread = None
+
+
+_writer: Optional[LedgerWriter] = None
+
+
+def get_writer() -> LedgerWriter:
+    global _writer
+    if _writer is None:
+        _writer = LedgerWriter(os.getenv("MODEL_LEDGER_PATH", "data/model_calls.sqlite3"))
+    return _writer
+
+
+def record(rec: ModelCallRecord) -> None:
+    get_writer().record(rec)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(days: int = 7, path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Agrega por día (UTC) y modelo: llamadas, errores, p50/p95 de latencia, tokens y costo."""
+    path = path or get_writer().path
+    if not os.path.exists(path):
+        return []
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    conn = _connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT substr(ts, 1, 10), model, outcome, latency_ms, prompt_tokens, completion_tokens, "
+            "total_tokens, image_bytes, cost_usd FROM model_calls WHERE ts >= ? ORDER BY ts",
+            (since,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    groups: Dict[tuple, List[tuple]] = {}
+    for row in rows:
+        groups.setdefault((row[0], row[1]), []).append(row)
+
+    report = []
+    for (day, model), items in sorted(groups.items()):
+        latencies = sorted(r[3] for r in items)
+        calls = len(items)
+        report.append({
+            "day": day,
+            "model": model,
+            "calls": calls,
+            "errors": sum(1 for r in items if r[2] != "ok"),
+            "p50_latency_ms": round(_percentile(latencies, 0.50), 1),
+            "p95_latency_ms": round(_percentile(latencies, 0.95), 1),
+            "avg_prompt_tokens": round(sum(r[4] for r in items) / calls, 1),
+            "avg_completion_tokens": round(sum(r[5] for r in items) / calls, 1),
+            "total_tokens": sum(r[6] for r in items),
+            "avg_image_bytes": round(sum(r[7] for r in items) / calls),
+            "cost_usd": round(sum(r[8] for r in items), 6),
+        })
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Resumen de llamadas al modelo por día y modelo")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--path", default=None, help="Ruta del SQLite (por defecto MODEL_LEDGER_PATH)")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    report = summarize(args.days, args.path)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    header = f"{'day':<10} {'model':<14} {'calls':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'tokens':>9} {'usd':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in report:
+        print(
+            f"{r['day']:<10} {r['model']:<14} {r['calls']:>6} {r['errors']:>4} "
+            f"{r['p50_latency_ms']:>9.1f} {r['p95_latency_ms']:>9.1f} {r['total_tokens']:>9} {r['cost_usd']:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
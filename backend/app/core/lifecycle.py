@@ -0,0 +1,113 @@
+"""
+Ciclo de vida del worker: warmup, readiness y drenado ante SIGTERM.
+
+- `warmup()` instancia los clientes (Supabase, OpenAI) y cachés antes de que el
+  worker marque `ready`; con WARMUP_NETWORK=true además abre la conexión HTTP
+  a Supabase con una consulta mínima.
+- `install_drain_handler()` envuelve el handler de SIGTERM de uvicorn: marca el
+  worker como no listo (readiness 503) y, tras DRAIN_DELAY_S, deja que uvicorn
+  cierre el socket y espere los requests en curso.
+- `RecycleMiddleware` recicla el worker tras MAX_REQUESTS (± jitter) requests
+  enviándose SIGTERM; el supervisor de uvicorn levanta uno nuevo. El jitter evita
+  que todos los workers se reciclen a la vez (con carga pareja llegan juntos).
+"""
+import asyncio
+import logging
+import os
+import random
+import signal
+import time
+from typing import Any, Dict
+
+_state: Dict[str, Any] = {"ready": False, "draining": False, "started_at": None, "warmup_ms": None}
+
+
+def is_ready() -> bool:
+    return _state["ready"] and not _state["draining"]
+
+
+def is_draining() -> bool:
+    return _state["draining"]
+
+
+def status() -> Dict[str, Any]:
+    return {
+        "ready": is_ready(),
+        "draining": _state["draining"],
+        "pid": os.getpid(),
+        "warmup_ms": _state["warmup_ms"],
+        "uptime_s": round(time.monotonic() - _state["started_at"], 1) if _state["started_at"] else None,
+    }
+
+
+def warmup() -> None:
+    """Inicializa clientes y cachés; los errores de red no impiden arrancar."""
+    start = time.perf_counter()
+
+    from app.core.supabase import supabase
+    from app.routes import analyse
+    from app.core import timezones
+
+    # las propiedades de supabase-py crean los subclientes (y su pool httpx) en el primer acceso
+    supabase.auth, supabase.postgrest
+    analyse.supabase_admin.auth, analyse.supabase_admin.postgrest, analyse.supabase_admin.storage
+    analyse.client.chat.completions
+    timezones.resolve_tz(timezones.DEFAULT_TZ)
+
+    if os.getenv("WARMUP_NETWORK", "false").lower() in ("1", "true", "yes"):
+        try:
+            supabase.table("objectives").select("id").limit(1).execute()
+        except Exception as e:
+            logging.warning(f"Warmup de red falló: {e}")
+
+    _state["warmup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def mark_ready() -> None:
+    _state["ready"] = True
+    _state["draining"] = False
+    _state["started_at"] = time.monotonic()
+
+
+def mark_draining() -> None:
+    _state["draining"] = True
+    # los streams SSE no terminan solos: se cierran para que uvicorn no los espere
+    from app.core import events
+    events.close_all()
+
+
+def install_drain_handler(delay_s: float = 0.0) -> None:
+    """Encadena nuestro SIGTERM antes del handler de uvicorn (llamar con el loop corriendo)."""
+    loop = asyncio.get_running_loop()
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        return
+
+    def handle(sig, frame):
+        if _state["draining"]:
+            return
+        mark_draining()
+        logging.info(f"SIGTERM: drenando worker {os.getpid()} (delay {delay_s:g}s)")
+        if delay_s > 0:
+            loop.call_soon_threadsafe(loop.call_later, delay_s, previous, sig, frame)
+        else:
+            previous(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle)
+
+
+class RecycleMiddleware:
+    """Cuenta requests del worker y dispara un drenado ordenado al llegar al límite."""
+
+    def __init__(self, app, max_requests: int = 0, jitter: int = 0):
+        self.app = app
+        self.limit = max_requests + random.randint(0, max(jitter, 0)) if max_requests > 0 else 0
+        self.count = 0
+
+    async def __call__(self, scope, receive, send):
+        if self.limit and scope["type"] == "http":
+            self.count += 1
+            if self.count == self.limit:
+                logging.info(f"Worker {os.getpid()} alcanzó {self.limit} requests; reciclando")
+                os.kill(os.getpid(), signal.SIGTERM)
+        await self.app(scope, receive, send)
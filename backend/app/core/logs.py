@@ -0,0 +1,208 @@
+"""
+Logging estructurado que no bloquea los requests.
+
+`setup()` deja en el root logger un único handler que solo encola el registro
+(`put_nowait`); un hilo en segundo plano (QueueListener) lo formatea y lo
+escribe en stdout. Si la cola se llena (LOG_QUEUE_SIZE) el registro se
+descarta y se cuenta en `log_records_dropped_total`: el request nunca espera
+al disco ni a la terminal.
+
+Cada línea es un JSON con ts, level, logger, msg, request_id y los campos de
+`extra=` (LOG_FORMAT=text para desarrollo). RequestIdMiddleware toma
+`X-Request-ID` del cliente (o genera uno), lo devuelve en la respuesta y lo
+deja en un ContextVar, visible también desde el threadpool de las rutas
+síncronas; al terminar el request escribe una línea de acceso (`app.access`).
+
+Muestreo: con LOG_INFO_SAMPLE_RATE < 1 solo se escriben los INFO/DEBUG de esa
+fracción de requests. La decisión es por request_id, así un request muestreado
+conserva todas sus líneas; WARNING o más y los logs fuera de un request
+(arranque, drenado, jobs) siempre pasan.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.core import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1"))
+
+log_records_dropped_total = metrics.counter(
+    "log_records_dropped_total", "Registros de log descartados por cola llena"
+)
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+access_log = logging.getLogger("app.access")
+
+# atributos propios de LogRecord: lo demás viene de extra= y va al JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def sampled(request_id: Optional[str], rate: float) -> bool:
+    """Decisión estable por request: todas sus líneas entran o ninguna."""
+    if rate >= 1 or request_id is None:
+        return True
+    if rate <= 0:
+        return False
+    return zlib.crc32(request_id.encode()) % 10000 < rate * 10000
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s [%(levelname)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [rid={request_id}]" if request_id else line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Encola sin esperar; agrega request_id y aplica el muestreo en el hilo del request."""
+
+    def __init__(self, log_queue: queue.Queue, sample_rate: float = INFO_SAMPLE_RATE):
+        super().__init__(log_queue)
+        self.sample_rate = sample_rate
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # copia con el mensaje ya interpolado: los args pueden cambiar antes de que escriba el hilo
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        request_id = request_id_var.get()
+        if record.levelno < logging.WARNING and not sampled(request_id, self.sample_rate):
+            return
+        try:
+            record = self.prepare(record)
+            record.request_id = request_id
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped_total.inc()
+        except Exception:
+            self.handleError(record)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None) -> None:
+    """Instala el handler con cola en el root logger (idempotente; una vez por proceso/worker)."""
+    global _listener
+    if _listener is not None:
+        return
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if not isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, writer)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """Vacía la cola y detiene el hilo escritor."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, NonBlockingQueueHandler):
+                root.removeHandler(handler)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class RequestIdMiddleware:
+    """Middleware ASGI puro: request_id en ContextVar + cabecera X-Request-ID + línea de acceso."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = _header(scope, b"x-request-id")
+        # se acepta el del cliente/proxy si es razonable; si no, uno nuevo
+        request_id = incoming if incoming and len(incoming) <= 128 and incoming.isprintable() else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # los 5xx siempre se escriben (WARNING no se muestrea)
+            access_log.log(
+                logging.WARNING if status_code >= 500 else logging.INFO,
+                f"{scope['method']} {scope['path']} {status_code}",
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                },
+            )
+            request_id_var.reset(token)
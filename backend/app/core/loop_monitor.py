@@ -0,0 +1,49 @@
+"""
+Monitor de lag del event loop: una tarea duerme `interval` segundos y mide
+cuánto tarde despierta. El exceso es tiempo en que el loop estuvo bloqueado
+(código síncrono en handlers async, CPU, GC...). Se expone en /metrics.
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+from app.core import metrics
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+lag_seconds = metrics.histogram("event_loop_lag_seconds", "Retraso del event loop respecto al intervalo esperado", LAG_BUCKETS)
+lag_max_seconds = metrics.gauge("event_loop_lag_max_seconds", "Máximo lag observado del event loop")
+
+_task: Optional[asyncio.Task] = None
+
+
+async def _run(interval: float) -> None:
+    worst = 0.0
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - start - interval, 0.0)
+        lag_seconds.observe(lag)
+        if lag > worst:
+            worst = lag
+            lag_max_seconds.set(worst)
+
+
+def start() -> None:
+    global _task
+    if os.getenv("LOOP_LAG_MONITOR", "true").lower() not in ("1", "true", "yes"):
+        return
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(_run(float(os.getenv("LOOP_LAG_INTERVAL_S", "0.1"))))
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,301 @@
+"""
+Envoltura resiliente para las llamadas al proveedor de modelos (OpenAI).
+
+- Timeout explícito por llamada y reintentos con backoff exponencial + jitter
+  solo sobre errores reintentables (timeouts, conexión, 429 y 5xx).
+- Hedging opcional: si la llamada supera el p95 observado para ese modelo se
+  lanza una petición duplicada y se usa la primera que responda.
+- Circuit breaker: tras varios fallos consecutivos del proveedor se falla rápido
+  durante un periodo de enfriamiento en lugar de acumular requests colgadas.
+
+Configuración por variables de entorno (MODEL_TIMEOUT_S, MODEL_MAX_RETRIES,
+MODEL_HEDGE_ENABLED, MODEL_BREAKER_FAILURES, ...).
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.core import metrics
+from app.core.instrumentation import span
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+retries_total = metrics.counter("model_retries_total", "Reintentos de llamadas al modelo")
+hedges_total = metrics.counter("model_hedges_total", "Peticiones duplicadas (hedged) lanzadas")
+hedge_wins_total = metrics.counter("model_hedge_wins_total", "Peticiones hedged que respondieron primero")
+calls_total = metrics.counter("model_calls_total", "Llamadas al modelo por resultado")
+breaker_state = metrics.gauge("model_breaker_state", "Estado del circuit breaker (0=closed, 1=half_open, 2=open)")
+breaker_rejections_total = metrics.counter("model_breaker_rejections_total", "Llamadas rechazadas con el circuito abierto")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class ModelCallPolicy:
+    timeout_s: float = 60.0
+    max_retries: int = 2
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 8.0
+    hedge: bool = False
+    hedge_after_s: Optional[float] = None  # fijo; si es None se usa el p95 observado
+    hedge_min_delay_s: float = 2.0
+    hedge_min_samples: int = 20
+
+    @classmethod
+    def from_env(cls) -> "ModelCallPolicy":
+        hedge_after = os.getenv("MODEL_HEDGE_AFTER_S")
+        return cls(
+            timeout_s=_env_float("MODEL_TIMEOUT_S", 60.0),
+            max_retries=_env_int("MODEL_MAX_RETRIES", 2),
+            backoff_base_s=_env_float("MODEL_BACKOFF_BASE_S", 0.5),
+            backoff_max_s=_env_float("MODEL_BACKOFF_MAX_S", 8.0),
+            hedge=_env_bool("MODEL_HEDGE_ENABLED", False),
+            hedge_after_s=float(hedge_after) if hedge_after else None,
+            hedge_min_delay_s=_env_float("MODEL_HEDGE_MIN_DELAY_S", 2.0),
+            hedge_min_samples=_env_int("MODEL_HEDGE_MIN_SAMPLES", 20),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniforme entre 0 y base * 2^(attempt-1), acotado."""
+        cap = min(self.backoff_max_s, self.backoff_base_s * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+
+class CircuitOpenError(RuntimeError):
+    """El proveedor está degradado y el circuito está abierto."""
+
+    def __init__(self, message: str, retry_after_s: float = 0.0):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        breaker_state.set(0, breaker=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        breaker_state.set(self._STATE_VALUES[state], breaker=self.name)
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+            self._set_state(self.HALF_OPEN)
+            self._probe_in_flight = False
+
+    def retry_after_s(self) -> float:
+        """Segundos hasta que el circuito deje pasar la próxima sonda (0 si está cerrado)."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.OPEN:
+                return max(0.0, self.reset_timeout_s - (time.monotonic() - self._opened_at))
+            return 0.0
+
+    def allow(self) -> bool:
+        """True si se puede llamar al proveedor; en half_open solo pasa una sonda."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+
+class LatencyWindow:
+    """Ventana deslizante de latencias exitosas por modelo para estimar el p95."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Dict[str, Deque[float]] = {}
+        self._size = size
+        self._lock = threading.Lock()
+
+    def add(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self._size)).append(seconds)
+
+    def quantile(self, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < min_samples or not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+        return samples[index]
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # APIConnectionError / APITimeoutError de openai no traen status_code
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+DEFAULT_POLICY = ModelCallPolicy.from_env()
+breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=_env_int("MODEL_BREAKER_FAILURES", 5),
+    reset_timeout_s=_env_float("MODEL_BREAKER_RESET_S", 30.0),
+)
+latencies = LatencyWindow()
+
+
+def _hedge_delay(policy: ModelCallPolicy, model: str) -> Optional[float]:
+    if not policy.hedge:
+        return None
+    if policy.hedge_after_s is not None:
+        return policy.hedge_after_s
+    p95 = latencies.quantile(model, 0.95, policy.hedge_min_samples)
+    if p95 is None:
+        return None
+    return max(p95, policy.hedge_min_delay_s)
+
+
+async def _attempt(create: Callable[..., Any], kwargs: Dict[str, Any], policy: ModelCallPolicy, model: str) -> Any:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + policy.timeout_s
+    delay = _hedge_delay(policy, model)
+    hedge_at = started + delay if delay is not None and delay < policy.timeout_s else None
+
+    def launch() -> "asyncio.Future[Any]":
+        # el cliente de OpenAI es síncrono: se ejecuta en el threadpool para no bloquear el loop
+        return asyncio.ensure_future(asyncio.to_thread(create, timeout=policy.timeout_s, **kwargs))
+
+    primary = launch()
+    pending = {primary}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            now = loop.time()
+            if now >= deadline:
+                break
+            until = min(deadline, hedge_at) if hedge_at is not None else deadline
+            done, pending = await asyncio.wait(pending, timeout=until - now, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    latencies.add(model, loop.time() - started)
+                    if task is not primary:
+                        hedge_wins_total.inc(model=model)
+                    return task.result()
+                error = task.exception()
+            if hedge_at is not None and pending and loop.time() >= hedge_at:
+                hedge_at = None
+                hedges_total.inc(model=model)
+                pending.add(launch())
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if error is not None and not pending:
+        raise error
+    raise asyncio.TimeoutError(f"La llamada a {model} superó {policy.timeout_s:g}s")
+
+
+async def call_model(
+    create: Callable[..., Any],
+    *,
+    policy: Optional[ModelCallPolicy] = None,
+    circuit: Optional[CircuitBreaker] = None,
+    **kwargs: Any,
+) -> Any:
+    """
+    Ejecuta `create(**kwargs)` (p. ej. client.chat.completions.create) aplicando
+    timeout, reintentos con jitter, hedging y circuit breaker.
+    """
+    policy = policy or DEFAULT_POLICY
+    circuit = circuit or breaker
+    model = str(kwargs.get("model", "unknown"))
+    attempt = 0
+
+    while True:
+        if not circuit.allow():
+            breaker_rejections_total.inc(model=model)
+            calls_total.inc(model=model, outcome="circuit_open")
+            raise CircuitOpenError(
+                f"Proveedor de modelos degradado; circuito '{circuit.name}' abierto",
+                retry_after_s=circuit.retry_after_s(),
+            )
+        try:
+            with span("model"):
+                result = await _attempt(create, kwargs, policy, model)
+        except Exception as exc:
+            retryable = is_retryable(exc)
+            if retryable:
+                circuit.record_failure()
+            else:
+                # errores del request (400, 401...) no indican degradación del proveedor
+                circuit.record_success()
+            if not retryable or attempt >= policy.max_retries:
+                calls_total.inc(model=model, outcome="error")
+                raise
+            attempt += 1
+            retries_total.inc(model=model)
+            await asyncio.sleep(policy.backoff(attempt))
+            continue
+
+        circuit.record_success()
+        calls_total.inc(model=model, outcome="ok")
+        return result
@@ -0,0 +1,33 @@
+"""
+Serialización JSON rápida para las respuestas.
+
+`dumps()` usa orjson (C, ~5-10x más rápido que json + jsonable_encoder en
+listas largas como /history_meals). Lo que orjson no sabe serializar
+(Decimal, modelos pydantic, ...) pasa por `jsonable_encoder` vía `default`.
+Sin orjson instalado se usa el mismo formato que JSONResponse de Starlette.
+
+`FastJSONResponse` es la response_class por defecto de la app.
+"""
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson está en requirements.txt
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
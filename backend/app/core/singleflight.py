@@ -0,0 +1,82 @@
+"""
+Single-flight: lecturas idénticas concurrentes comparten una sola consulta.
+
+Al abrir la app varios componentes piden `/users/me` y `/meals/day` del mismo
+usuario casi a la vez; con `read()` la primera petición (leader) consulta a
+Supabase y las que llegan mientras tanto esperan y reciben el mismo resultado
+(o la misma excepción). No es una caché: al terminar la llamada la clave se
+libera y la siguiente lectura vuelve a consultar.
+
+La clave incluye la versión de escrituras del usuario (`etags.version`): una
+lectura que empieza después de save_analysis / delete_meal / edit_profile no
+se une a una consulta lanzada antes de la escritura.
+
+Las rutas son síncronas (threadpool), así que la espera es un threading.Event.
+El resultado se comparte entre requests: no mutarlo.
+
+Métricas: singleflight_requests_total{read,outcome=leader|shared}.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+from app.core import etags, metrics
+
+T = TypeVar("T")
+
+singleflight_requests_total = metrics.counter(
+    "singleflight_requests_total",
+    "Lecturas por resultado (leader = consultó, shared = reusó una consulta en vuelo)",
+)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class Group:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T], label: str = "default") -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            singleflight_requests_total.inc(read=label, outcome="shared")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        singleflight_requests_total.inc(read=label, outcome="leader")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+reads = Group()
+
+
+def read(user_id: str, name: str, fn: Callable[[], T], *args: Hashable) -> T:
+    """Ejecuta la lectura `name` del usuario (con `args` como parte de la clave) una vez por ráfaga."""
+    return reads.do((name, user_id, etags.version(user_id), *args), fn, label=name)
@@ -0,0 +1,376 @@
+"""
+Helpers de Supabase Storage para el bucket de comidas (SUPABASE_BUCKET).
+
+Con STORAGE_URL_MODE=public (por defecto) las URLs guardadas en `meals` son públicas:
+    {SUPABASE_URL}/storage/v1/object/public/{bucket}/{path}
+`public_url()` y `object_path()` convierten entre ruta del objeto y esa URL.
+
+Con STORAGE_URL_MODE=signed (bucket privado) `img_url`, `thumb_url` y
+`thumbnails` guardan la ruta del objeto (`stored_ref()`), y las rutas de lectura
+pasan sus filas por `sign_rows()`: una sola llamada de firma por página para las
+rutas que no están en caché. Las URLs firmadas se cachean por ventanas de
+SIGNED_URL_REFRESH_S (45 min) y se firman por SIGNED_URL_TTL_S (1 h): todo lo
+entregado en una ventana sigue válido al menos TTL - REFRESH después de que
+termina. `url_window()` va en el ETag, así un 304 nunca prolonga URLs vencidas.
+
+Imágenes direccionadas por contenido: `put_blob()` guarda cada foto en
+`blobs/<sha[:2]>/<sha256>.<ext>` y no la vuelve a subir si ya existe. La tabla
+`image_blobs` lleva el refcount (RPCs acquire/release_image_blob, ver
+sql/002_content_addressed_images.sql); el blob se borra cuando ninguna comida
+lo referencia.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.clients import get_supabase_admin
+from app.core.instrumentation import span
+from app.core.uploads import storage_source
+
+HASH_CHUNK = 1024 * 1024
+EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/heic": "heic",
+    "image/heif": "heif",
+    "image/gif": "gif",
+}
+
+image_dedup_total = metrics.counter(
+    "image_dedup_total", "Imágenes guardadas por resultado (hit = ya existía, miss = subida nueva)"
+)
+image_dedup_bytes_saved_total = metrics.counter(
+    "image_dedup_bytes_saved_total", "Bytes que no se subieron gracias a la deduplicación"
+)
+image_blobs_deleted_total = metrics.counter(
+    "image_blobs_deleted_total", "Blobs borrados al quedar sin referencias"
+)
+signed_url_requests_total = metrics.counter(
+    "signed_url_requests_total", "URLs firmadas pedidas por resultado (hit = caché, miss = firmada)"
+)
+signed_url_batches_total = metrics.counter(
+    "signed_url_batches_total", "Llamadas de firma por lote a Storage"
+)
+
+SIGNED_URL_TTL_S = int(os.getenv("SIGNED_URL_TTL_S", "3600"))
+SIGNED_URL_REFRESH_S = int(os.getenv("SIGNED_URL_REFRESH_S", str(SIGNED_URL_TTL_S * 3 // 4)))
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "50000"))
+URL_FIELDS = ("img_url", "thumb_url", "thumbnails")
+
+
+def bucket_name() -> str:
+    bucket = os.getenv("SUPABASE_BUCKET")
+    if not bucket:
+        raise RuntimeError("SUPABASE_BUCKET no está configurado.")
+    return bucket
+
+
+def _public_prefix() -> str:
+    url = os.getenv("SUPABASE_URL")
+    if not url:
+        raise RuntimeError("SUPABASE_URL no está configurado.")
+    return f"{url.rstrip('/')}/storage/v1/object/public/{bucket_name()}/"
+
+
+def public_url(path: str) -> str:
+    return _public_prefix() + path.lstrip("/")
+
+
+def url_mode() -> str:
+    return os.getenv("STORAGE_URL_MODE", "public").lower()
+
+
+def stored_ref(path: str) -> str:
+    """Lo que se guarda en `meals` para un objeto: URL pública o, en modo signed, la ruta."""
+    return path if url_mode() == "signed" else public_url(path)
+
+
+def _is_path(ref: Any) -> bool:
+    return isinstance(ref, str) and bool(ref) and "://" not in ref
+
+
+def object_path(url: Optional[str]) -> Optional[str]:
+    """Ruta del objeto dentro del bucket a partir de su URL pública (o None si no es nuestra)."""
+    if not url:
+        return None
+    if _is_path(url):
+        return url  # guardada en modo signed
+    marker = f"/storage/v1/object/public/{bucket_name()}/"
+    _, found, path = url.partition(marker)
+    return path.split("?", 1)[0] if found else None
+
+
+def bucket():
+    return get_supabase_admin().storage.from_(bucket_name())
+
+
+def upload(path: str, source, content_type: str, upsert: bool = False, cache_control: str = "3600") -> None:
+    """Sube bytes o un BufferedReader (síncrono: llamar desde el threadpool)."""
+    with span("storage"):
+        bucket().upload(
+            path=path,
+            file=source,
+            file_options={
+                "content-type": content_type,
+                "upsert": "true" if upsert else "false",
+                "cache-control": cache_control,
+            },
+        )
+
+
+def download(path: str) -> bytes:
+    with span("storage"):
+        return bucket().download(path)
+
+
+@dataclass
+class StoredBlob:
+    hash: str
+    path: str
+    size: int
+    content_type: str
+    uploaded: bool  # False si el objeto ya existía (dedup)
+
+
+def content_hash(fileobj) -> Tuple[str, int]:
+    """SHA-256 y tamaño leyendo por chunks (no carga el archivo entero)."""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def blob_path(digest: str, content_type: str) -> str:
+    # la extensión sale del content-type (no del nombre de archivo) para que los mismos bytes den la misma clave
+    ext = EXTENSIONS.get((content_type or "").lower(), "bin")
+    return f"blobs/{digest[:2]}/{digest}.{ext}"
+
+
+def _exists(bucket_api, path: str) -> bool:
+    try:
+        with span("storage"):
+            return bool(bucket_api.exists(path))
+    except Exception:
+        return False
+
+
+def _upload(bucket_api, path: str, fileobj, content_type: str, upsert: bool) -> bool:
+    """Sube desde el spool; devuelve False si otro request ya lo había subido (409)."""
+    try:
+        with span("storage"), storage_source(fileobj) as source:
+            bucket_api.upload(
+                path=path,
+                file=source,
+                file_options={
+                    "content-type": content_type,
+                    "upsert": "true" if upsert else "false",
+                    # la clave cambia si cambian los bytes: se puede cachear indefinidamente
+                    "cache-control": "31536000",
+                },
+            )
+        return True
+    except Exception as e:
+        if not upsert and ("409" in str(e) or "Duplicate" in str(e) or "already exists" in str(e)):
+            return False
+        raise
+
+
+def put_blob(bucket_api, fileobj, content_type: str) -> StoredBlob:
+    """Guarda la imagen bajo su hash; si ya existe no se vuelve a subir (síncrono)."""
+    digest, size = content_hash(fileobj)
+    path = blob_path(digest, content_type)
+    uploaded = not _exists(bucket_api, path) and _upload(bucket_api, path, fileobj, content_type, upsert=False)
+    if uploaded:
+        image_dedup_total.inc(outcome="miss")
+    else:
+        image_dedup_total.inc(outcome="hit")
+        image_dedup_bytes_saved_total.inc(size)
+    return StoredBlob(digest, path, size, content_type, uploaded)
+
+
+def _first_row(data: Any) -> Dict[str, Any]:
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        return data[0]
+    return data if isinstance(data, dict) else {}
+
+
+def acquire_blob(client, bucket_api, blob: StoredBlob, fileobj) -> int:
+    """
+    Suma una referencia al blob; devuelve el refcount resultante.
+
+    Si quedamos como única referencia sin haber subido nosotros el objeto (fila
+    nueva tras un borrado concurrente o un objeto anterior a la tabla), se
+    vuelve a subir con upsert para no apuntar a un objeto que se está borrando.
+    """
+    with span("db"):
+        res = client.rpc("acquire_image_blob", {
+            "p_hash": blob.hash,
+            "p_path": blob.path,
+            "p_size": blob.size,
+            "p_content_type": blob.content_type,
+        }).execute()
+    refcount = _first_row(res.data).get("refcount")
+    if refcount == 1 and not blob.uploaded:
+        _upload(bucket_api, blob.path, fileobj, blob.content_type, upsert=True)
+    return refcount
+
+
+def release_blob(client, digest: str) -> Optional[str]:
+    """Resta una referencia; devuelve la ruta del objeto si quedó sin referencias."""
+    with span("db"):
+        res = client.rpc("release_image_blob", {"p_hash": digest}).execute()
+    row = _first_row(res.data)
+    if row.get("refcount") == 0 and row.get("path"):
+        return row["path"]
+    return None
+
+
+def release_image(client, image_hash: Optional[str]) -> None:
+    """Suelta la referencia de una comida borrada; sin referencias borra el blob y sus miniaturas."""
+    from app.core import thumbnails  # thumbnails importa este módulo
+
+    if not image_hash:
+        return
+    try:
+        path = release_blob(client, image_hash)
+        if path:
+            remove([path, *thumbnails.paths_for(path)])
+    except Exception as e:
+        logging.warning(f"No se pudo liberar el blob {image_hash}: {e}")
+
+
+def remove(paths: List[str]) -> None:
+    """Borra objetos del bucket (best-effort: un fallo solo deja basura)."""
+    if not paths:
+        return
+    try:
+        with span("storage"):
+            bucket().remove(paths)
+        image_blobs_deleted_total.inc()
+    except Exception as e:
+        logging.warning(f"No se pudieron borrar {paths}: {e}")
+
+
+def dedup_stats(client) -> Dict[str, Any]:
+    """Blobs únicos, referencias, bytes guardados vs lógicos, ratio y bytes ahorrados."""
+    with span("db"):
+        res = client.rpc("image_dedup_stats", {}).execute()
+    row = _first_row(res.data)
+    blobs = int(row.get("blobs") or 0)
+    refs = int(row.get("references_count") or 0)
+    stored = int(row.get("stored_bytes") or 0)
+    logical = int(row.get("logical_bytes") or 0)
+    return {
+        "blobs": blobs,
+        "references": refs,
+        "stored_bytes": stored,
+        "logical_bytes": logical,
+        "bytes_saved": logical - stored,
+        "dedup_ratio": round(refs / blobs, 3) if blobs else None,
+    }
+
+
+# ---------- URLs firmadas (bucket privado) ----------
+
+def url_window(now: Optional[float] = None) -> Optional[int]:
+    """Ventana de firma actual (None en modo public); las URLs cacheadas no cruzan ventanas."""
+    if url_mode() != "signed":
+        return None
+    return int((time.time() if now is None else now) // max(SIGNED_URL_REFRESH_S, 1))
+
+
+class SignedUrlCache:
+    """ruta -> (ventana, URL firmada), LRU acotado y compartido entre requests del worker."""
+
+    def __init__(self, max_entries: int = SIGNED_URL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._urls: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+
+    def get_many(self, paths: List[str], window: int) -> Dict[str, str]:
+        found = {}
+        with self._lock:
+            for path in paths:
+                entry = self._urls.get(path)
+                if entry is not None and entry[0] == window:
+                    self._urls.move_to_end(path)
+                    found[path] = entry[1]
+        return found
+
+    def put_many(self, urls: Dict[str, str], window: int) -> None:
+        with self._lock:
+            for path, url in urls.items():
+                self._urls[path] = (window, url)
+                self._urls.move_to_end(path)
+            while len(self._urls) > self.max_entries:
+                self._urls.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._urls.clear()
+
+
+signed_urls = SignedUrlCache()
+
+
+def sign(paths: List[str], now: Optional[float] = None) -> Dict[str, str]:
+    """URLs firmadas para `paths`: las de la caché y el resto en una sola llamada por lote."""
+    window = url_window(now)
+    unique = list(dict.fromkeys(p for p in paths if _is_path(p)))
+    if window is None or not unique:
+        return {}
+    urls = signed_urls.get_many(unique, window)
+    missing = [p for p in unique if p not in urls]
+    signed_url_requests_total.inc(len(urls), outcome="hit")
+    if not missing:
+        return urls
+    signed_url_requests_total.inc(len(missing), outcome="miss")
+    signed_url_batches_total.inc()
+    try:
+        with span("storage"):
+            results = bucket().create_signed_urls(missing, SIGNED_URL_TTL_S)
+    except Exception as e:
+        # sin firma la página igual se sirve; las imágenes se reintentan en el próximo request
+        logging.warning(f"No se pudieron firmar {len(missing)} URLs: {e}")
+        return urls
+    # las que fallan (objeto inexistente) quedan sin firmar y sin cachear
+    fresh = {
+        r["path"]: r.get("signedURL") or r.get("signedUrl")
+        for r in results
+        if not r.get("error") and (r.get("signedURL") or r.get("signedUrl"))
+    }
+    signed_urls.put_many(fresh, window)
+    urls.update(fresh)
+    return urls
+
+
+def sign_rows(rows: List[Dict[str, Any]], fields=URL_FIELDS) -> List[Dict[str, Any]]:
+    """Copias de `rows` con las rutas de `fields` cambiadas por URLs firmadas (modo signed)."""
+    if url_mode() != "signed" or not rows:
+        return rows
+    paths = []
+    for row in rows:
+        for field in fields:
+            value = row.get(field)
+            paths.extend(value.values() if isinstance(value, dict) else [value])
+    urls = sign(paths)
+
+    def resolve(value):
+        if isinstance(value, dict):
+            return {k: urls.get(v, v) for k, v in value.items()}
+        return urls.get(value, value) if isinstance(value, str) else value
+
+    return [{**row, **{f: resolve(row[f]) for f in fields if f in row}} for row in rows]
+
@@ -1,17 +1,11 @@
-from supabase import create_client
-import os
-from dotenv import load_dotenv
-from fastapi import HTTPException
-
-load_dotenv()
+import logging
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
+from fastapi import HTTPException
+from app.core.clients import LazyClient, get_supabase
+from app.core.instrumentation import span
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# se crea en el primer uso (ver app.core.clients)
+supabase = LazyClient(get_supabase)
 
 def verify_token(token: str):
     """Verify the JWT token."""
@@ -20,10 +14,11 @@ def verify_token(token: str):
         token = token.split(" ")[1]
          
     try:
-        user_data = supabase.auth.get_user(token)
+        with span("auth"):
+            user_data = supabase.auth.get_user(token)
         return user_data.user.id # type: ignore
           
     except Exception as e:
-        print(f"Error verifying token: {e}")
+        logging.warning(f"Error verifying token: {e}")
         raise HTTPException(status_code=500, detail=f"Invalid or expired token, {e}")
     
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Miniaturas WebP de las fotos de comidas.
+
+`save_analysis` encola la imagen recién subida con `submit()`; un pool de hilos
+(THUMBNAIL_WORKERS) genera un WebP por tamaño de THUMBNAIL_SIZES, lo sube a
+`thumbs/<ab>/<sha256>_<tamaño>.webp` (junto al blob, ver app.core.storage) y
+guarda en `meals`:
+
+- `thumbnails`: {"160": url, "320": url, ...}
+- `thumb_url`: la de THUMBNAIL_DEFAULT_SIZE (la que usan las listas)
+
+Las imágenes deduplicadas reusan las miniaturas del blob (`existing_urls()`).
+El request no espera al pool. Si hay más de THUMBNAIL_MAX_PENDING trabajos en
+cola la comida queda sin miniatura y la completa el backfill
+(`python -m app.jobs.backfill_thumbnails`).
+"""
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, Optional
+
+from app.core import etags, events, metrics, storage
+from app.core.clients import get_supabase_admin
+from app.core.instrumentation import span
+
+SIZES = tuple(int(s) for s in os.getenv("THUMBNAIL_SIZES", "160,320,640").split(",") if s.strip())
+DEFAULT_SIZE = int(os.getenv("THUMBNAIL_DEFAULT_SIZE", "320"))
+QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+MAX_PENDING = int(os.getenv("THUMBNAIL_MAX_PENDING", "100"))
+ENABLED = os.getenv("THUMBNAILS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+thumbnails_total = metrics.counter(
+    "thumbnails_total", "Trabajos de miniaturas por resultado (ok, failed, skipped)"
+)
+thumbnail_pending = metrics.gauge("thumbnail_pending", "Trabajos de miniaturas en cola o en curso")
+thumbnail_duration = metrics.histogram(
+    "thumbnail_duration_seconds", "Duración de generar y subir las miniaturas de una comida",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_pending = 0
+
+
+def render(source, sizes: Iterable[int] = SIZES, quality: int = QUALITY) -> Dict[int, bytes]:
+    """WebP por tamaño (lado mayor), de mayor a menor reusando la reducción anterior."""
+    from PIL import Image, ImageOps  # Pillow solo se carga al generar miniaturas
+
+    sizes = sorted(set(sizes), reverse=True)
+    out: Dict[int, bytes] = {}
+    with Image.open(source) as img:
+        # JPEG: decodifica directamente a una escala reducida (mucho menos CPU y memoria)
+        img.draft("RGB", (sizes[0], sizes[0]))
+        current = ImageOps.exif_transpose(img)
+        if current.mode not in ("RGB", "RGBA"):
+            current = current.convert("RGB")
+        for size in sizes:
+            current = current.copy()
+            current.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            current.save(buf, "WEBP", quality=quality, method=4)
+            out[size] = buf.getvalue()
+    return out
+
+
+def thumb_path(source_path: str, size: int) -> str:
+    """blobs/<ab>/<sha>.<ext> -> thumbs/<ab>/<sha>_<size>.webp (también rutas meals/... anteriores)"""
+    rest = source_path.split("/", 1)[1] if source_path.startswith(("blobs/", "meals/")) else source_path
+    stem = rest.rsplit(".", 1)[0]
+    return f"thumbs/{stem}_{size}.webp"
+
+
+def paths_for(source_path: str):
+    return [thumb_path(source_path, size) for size in SIZES]
+
+
+def existing_urls(bucket_api, source_path: str) -> Optional[Dict[str, str]]:
+    """URLs de miniaturas ya generadas para este blob (imagen deduplicada) o None."""
+    try:
+        with span("storage"):
+            if not bucket_api.exists(thumb_path(source_path, DEFAULT_SIZE)):
+                return None
+    except Exception:
+        return None
+    return {str(size): storage.stored_ref(thumb_path(source_path, size)) for size in SIZES}
+
+
+def generate(meal_id, source_path: str, source) -> Dict[str, str]:
+    """Genera, sube y registra las miniaturas de una comida; devuelve {tamaño: url o ruta (modo signed)}."""
+    started = time.perf_counter()
+    urls: Dict[str, str] = {}
+    for size, data in render(source).items():
+        path = thumb_path(source_path, size)
+        storage.upload(path, data, "image/webp", upsert=True, cache_control="31536000")
+        urls[str(size)] = storage.stored_ref(path)
+
+    default = urls.get(str(DEFAULT_SIZE)) or urls[min(urls, key=lambda s: abs(int(s) - DEFAULT_SIZE))]
+    with span("db"):
+        res = get_supabase_admin().table("meals").update(
+            {"thumbnails": urls, "thumb_url": default}
+        ).eq("id", meal_id).execute()
+    # /meals/day lista thumb_url: invalida el ETag del dueño y avisa a sus streams
+    for row in getattr(res, "data", None) or []:
+        if isinstance(row, dict):
+            etags.bump(row.get("user_id"))
+            events.publish(row.get("user_id"), "thumbnail")
+    thumbnail_duration.observe(time.perf_counter() - started)
+    return urls
+
+
+def _run(meal_id, source_path: str, tmp_path: str) -> None:
+    global _pending
+    try:
+        with open(tmp_path, "rb") as fh:
+            generate(meal_id, source_path, fh)
+        thumbnails_total.inc(outcome="ok")
+    except Exception as e:
+        thumbnails_total.inc(outcome="failed")
+        logging.warning(f"No se pudieron generar miniaturas de la comida {meal_id}: {e}")
+    finally:
+        os.unlink(tmp_path)
+        with _lock:
+            _pending -= 1
+            thumbnail_pending.set(_pending)
+
+
+def submit(meal_id, source_path: str, fileobj: BinaryIO) -> bool:
+    """
+    Encola las miniaturas de una comida recién guardada.
+
+    Copia la imagen a un archivo temporal (el UploadFile se cierra al terminar
+    el request). Devuelve False si están deshabilitadas o la cola está llena.
+    """
+    global _executor, _pending
+    if not ENABLED or meal_id is None:
+        return False
+    with _lock:
+        if _pending >= MAX_PENDING:
+            thumbnails_total.inc(outcome="skipped")
+            return False
+        _pending += 1
+        thumbnail_pending.set(_pending)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="thumbs")
+
+    try:
+        fileobj.seek(0)
+        with tempfile.NamedTemporaryFile(prefix="thumb-", delete=False) as tmp:
+            shutil.copyfileobj(fileobj, tmp)
+        _executor.submit(_run, meal_id, source_path, tmp.name)
+    except Exception:
+        with _lock:
+            _pending -= 1
+            thumbnail_pending.set(_pending)
+        raise
+    return True
+
+
+def shutdown(wait: bool = True) -> None:
+    """Termina los trabajos pendientes (al drenar el worker)."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,226 @@
+"""
+Zonas horarias y límites de día local (antes duplicados en routes/meals.py y routes/analyse.py).
+
+- `resolve_tz` memoiza el tzinfo por nombre; un nombre inválido cae a -05:00
+  para America/Lima (sin tzdata) o a UTC, como antes.
+- `day_range_utc` / `range_utc`: rango UTC [inicio, fin) de días locales,
+  memoizado por (tz, día).
+- `local_date_times`: conversión en bloque de una columna de timestamps a
+  (fecha, "HH:MM") locales para el export. Arma una vez la tabla de inicios de
+  día en UTC para el rango de las filas (`DayTable`) y ubica cada timestamp con
+  bisect; solo los días con cambio de offset (DST) convierten fila a fila.
+- `user_timezone`: timezone guardado en `users.timezone` (sql/008), con caché
+  por worker de USER_TIMEZONE_TTL_S; `forget_user` la invalida al editar el
+  perfil. Otros workers ven el cambio al vencer el TTL. `cached_user_timezone`
+  mira la caché sin ir a la base (validadores de ETag).
+
+`python -m bench.timezones` mide la conversión de 100k filas contra la versión
+fila a fila.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime, time as time_cls, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.clients import get_supabase_admin
+from app.core.instrumentation import span
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except Exception:
+    ZoneInfo = None
+    ZoneInfoNotFoundError = Exception
+
+DEFAULT_TZ = os.getenv("DEFAULT_TIMEZONE", "America/Lima")
+USER_TZ_TTL_S = float(os.getenv("USER_TIMEZONE_TTL_S", "300"))
+USER_TZ_CACHE_SIZE = int(os.getenv("USER_TIMEZONE_CACHE_SIZE", "10000"))
+
+# "HH:MM" por minuto del día: evita strftime por fila
+_HHMM = tuple(f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60))
+
+
+@lru_cache(maxsize=512)
+def _zone(tz_name: str):
+    if ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def is_valid_tz(tz_name: Optional[str]) -> bool:
+    return bool(tz_name) and _zone(tz_name) is not None
+
+
+def resolve_tz(tz_name: str):
+    """
+    Devuelve tzinfo robusto:
+    - ZoneInfo(tz_name) (memoizado)
+    - Si falla y es Lima: -05:00 fijo (Perú no usa DST)
+    - Si falla cualquier otra: UTC
+    """
+    zone = _zone(tz_name)
+    if zone is not None:
+        return zone
+    if tz_name == "America/Lima":
+        return timezone(timedelta(hours=-5))
+    return timezone.utc
+
+
+def now_utc_iso() -> str:
+    """Marca de tiempo para date_creation (timestamptz: el instante no depende de la zona)."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def today(tz_name: str) -> str:
+    return datetime.now(resolve_tz(tz_name)).date().isoformat()
+
+
+@lru_cache(maxsize=4096)
+def _day_bounds(tz_name: str, day: date) -> Tuple[str, str]:
+    tz = resolve_tz(tz_name)
+    start_local = datetime.combine(day, time_cls.min).replace(tzinfo=tz)
+    end_local = datetime.combine(day + timedelta(days=1), time_cls.min).replace(tzinfo=tz)
+    return (
+        start_local.astimezone(timezone.utc).isoformat(),
+        end_local.astimezone(timezone.utc).isoformat(),
+    )
+
+
+def day_range_utc(date_str: Optional[str], tz_name: str = DEFAULT_TZ) -> Tuple[str, str, str]:
+    """
+    Convierte una fecha local (YYYY-MM-DD) a rango UTC [start, end) ISO8601.
+    Si no se pasa fecha, usa la fecha “hoy” en la TZ indicada.
+    ValueError si la fecha está malformada.
+    """
+    day = date.fromisoformat(date_str or today(tz_name))
+    start_utc, end_utc = _day_bounds(tz_name, day)
+    return day.isoformat(), start_utc, end_utc
+
+
+def range_utc(from_date: Optional[str], to_date: Optional[str], tz_name: str) -> Optional[Tuple[str, str]]:
+    """
+    Convierte un rango local [from_date, to_date] a rango UTC [start, end).
+
+    - Si ambos son None: devuelve None → se interpreta como "todo".
+    - Si solo llega uno de los dos, ese día es el rango.
+    """
+    if not from_date and not to_date:
+        return None
+    start_day = date.fromisoformat(from_date or to_date)
+    end_day = date.fromisoformat(to_date) if to_date else start_day
+    if end_day < start_day:
+        raise ValueError("to_date no puede ser anterior a from_date")
+    return _day_bounds(tz_name, start_day)[0], _day_bounds(tz_name, end_day)[1]
+
+
+class DayTable:
+    """Inicio en epoch UTC de cada día local de `tz_name` entre first y last (inclusive)."""
+
+    def __init__(self, tz_name: str, first: date, last: date):
+        tz = resolve_tz(tz_name)
+        days = [first + timedelta(days=i) for i in range((last - first).days + 2)]
+        midnights = [datetime.combine(d, time_cls.min).replace(tzinfo=tz) for d in days]
+        offsets = [m.utcoffset() for m in midnights]
+        self.tz = tz
+        self.starts = [m.timestamp() for m in midnights]
+        self.dates = [d.isoformat() for d in days[:-1]]
+        # mismo offset a medianoche y a la medianoche siguiente: sin cambio de hora ese día
+        self.uniform = [offsets[i] == offsets[i + 1] for i in range(len(days) - 1)]
+
+    def local(self, ts: float) -> Tuple[str, str]:
+        i = bisect_right(self.starts, ts) - 1
+        if self.uniform[i]:
+            return self.dates[i], _HHMM[int(ts - self.starts[i]) // 60]
+        local = datetime.fromtimestamp(ts, self.tz)
+        return local.date().isoformat(), local.strftime("%H:%M")
+
+
+@lru_cache(maxsize=64)
+def day_table(tz_name: str, first: date, last: date) -> DayTable:
+    return DayTable(tz_name, first, last)
+
+
+def _epoch(value: str) -> float:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:  # PostgREST siempre manda offset; por si acaso, UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def local_date_times(values: Sequence[str], tz_name: str) -> List[Tuple[str, str]]:
+    """(fecha_local, hora_local "HH:MM") para cada timestamp ISO de `values`, en tz_name."""
+    if not values:
+        return []
+    stamps = [_epoch(v) for v in values]
+    # el día local está a lo sumo a un día del día UTC
+    first = datetime.fromtimestamp(min(stamps), timezone.utc).date() - timedelta(days=1)
+    last = datetime.fromtimestamp(max(stamps), timezone.utc).date() + timedelta(days=1)
+    table = day_table(tz_name, first, last)
+    starts, dates, uniform, hhmm = table.starts, table.dates, table.uniform, _HHMM
+    out = []
+    # las filas suelen venir ordenadas por fecha: se sigue en el mismo día sin bisect
+    i, day_start, day_end = 0, starts[0], starts[1]
+    for ts in stamps:
+        if not day_start <= ts < day_end:
+            i = bisect_right(starts, ts) - 1
+            day_start, day_end = starts[i], starts[i + 1]
+        if uniform[i]:
+            out.append((dates[i], hhmm[int(ts - day_start) // 60]))
+        else:
+            out.append(table.local(ts))
+    return out
+
+
+def local_date_time(value: str, tz_name: str) -> Tuple[str, str]:
+    return local_date_times([value], tz_name)[0]
+
+
+_user_lock = threading.Lock()
+_user_tz: Dict[str, Tuple[float, str]] = {}
+
+
+def user_timezone(user_id: str) -> str:
+    """Timezone del perfil (users.timezone) o DEFAULT_TZ si no tiene o no se pudo leer."""
+    now = time.monotonic()
+    with _user_lock:
+        cached = _user_tz.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    try:
+        with span("db"):
+            res = get_supabase_admin().table("users").select("timezone").eq("id", user_id).execute()
+        stored = (res.data or [{}])[0].get("timezone")
+    except Exception as e:
+        logging.warning(f"No se pudo leer el timezone del usuario: {e}")
+        return DEFAULT_TZ
+    tz_name = stored if is_valid_tz(stored) else DEFAULT_TZ
+    with _user_lock:
+        if len(_user_tz) >= USER_TZ_CACHE_SIZE:
+            _user_tz.clear()
+        _user_tz[user_id] = (now + USER_TZ_TTL_S, tz_name)
+    return tz_name
+
+
+def cached_user_timezone(user_id: str) -> Optional[Tuple[str, float]]:
+    """(timezone, vence_en) si está en caché y vigente; nunca consulta la base."""
+    with _user_lock:
+        cached = _user_tz.get(user_id)
+    if cached is None or cached[0] <= time.monotonic():
+        return None
+    return cached[1], cached[0]
+
+
+def quarter_hour() -> int:
+    """Cuarto de hora UTC actual: todos los offsets de zona son múltiplos de 15 min."""
+    return int(time.time() // 900)
+
+
+def forget_user(user_id: str) -> None:
+    with _user_lock:
+        _user_tz.pop(user_id, None)
@@ -0,0 +1,118 @@
+"""
+Subidas de imágenes acotadas y sin copias completas en memoria.
+
+- `UploadLimitMiddleware` corta los cuerpos multipart de más de MAX_UPLOAD_MB
+  con 413: por Content-Length antes de leer nada y, si el cliente no lo manda
+  (chunked) o miente, en cuanto lo recibido pasa el límite.
+- Starlette ya vuelca cada archivo a un SpooledTemporaryFile mientras parsea el
+  form; UPLOAD_SPOOL_KB fija cuánto queda en memoria antes de pasar a disco.
+- `storage_source()` entrega ese archivo a storage3 como BufferedReader (httpx
+  lo envía por chunks) en vez de `await image.read()`.
+"""
+import io
+import os
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+from starlette.formparsers import MultiPartParser
+
+from app.core import metrics
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_KB", "1024")) * 1024
+
+MultiPartParser.spool_max_size = SPOOL_MAX_BYTES
+
+upload_rejected_total = metrics.counter(
+    "upload_rejected_total", "Subidas rechazadas con 413 (reason=declared|streamed)"
+)
+upload_bytes = metrics.histogram(
+    "upload_bytes", "Tamaño de los archivos subidos",
+    buckets=(64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6),
+)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """Rechaza con 413 los cuerpos multipart que superan `max_bytes`."""
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or ())
+        if not headers.get(b"content-type", b"").startswith(b"multipart/"):
+            return await self.app(scope, receive, send)
+
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            upload_rejected_total.inc(reason="declared")
+            return await self._reject(send)
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # FastAPI convierte el error de parseo en un 400; lo reemplazamos por el 413
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded:
+            upload_rejected_total.inc(reason="streamed")
+            await self._reject(send)
+
+    async def _reject(self, send) -> None:
+        body = f'{{"detail":"El archivo supera el máximo de {self.max_bytes // (1024 * 1024)} MB"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+@contextmanager
+def storage_source(fileobj) -> Iterator[Union[io.BufferedReader, bytes]]:
+    """
+    Adapta el archivo del UploadFile al tipo que acepta storage3.upload.
+
+    storage3 solo reconoce bytes/BufferedReader/FileIO. Si el spool pasó a disco
+    se abre un BufferedReader sobre un dup del descriptor (se lee del disco por
+    chunks); si sigue en memoria (< UPLOAD_SPOOL_KB) se entregan sus bytes.
+    """
+    fileobj.seek(0)
+    inner = getattr(fileobj, "_file", fileobj)  # SpooledTemporaryFile
+    if isinstance(inner, io.BytesIO):
+        yield inner.getvalue()
+        return
+    reader = os.fdopen(os.dup(inner.fileno()), "rb")
+    try:
+        reader.seek(0)
+        yield reader
+    finally:
+        reader.close()
+
@@ -0,0 +1,82 @@
+"""
+Backfill de miniaturas para comidas guardadas antes del pipeline (o cuyo trabajo falló).
+
+    python -m app.jobs.backfill_thumbnails --batch-size 100 --workers 4
+    python -m app.jobs.backfill_thumbnails --limit 20 --dry-run
+
+Recorre `meals` por id donde `thumb_url is null`, descarga la imagen original de
+Storage y genera las miniaturas con `app.core.thumbnails.generate`. Avanza por
+id, así que las comidas que fallan no bloquean el resto; se reintentan en la
+siguiente ejecución.
+"""
+import argparse
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.core import storage, thumbnails
+from app.core.clients import get_supabase_admin
+
+
+def _pending_batch(after_id, batch_size: int) -> List[Dict[str, Any]]:
+    query = (
+        get_supabase_admin().table("meals")
+        .select("id,img_url")
+        .is_("thumb_url", "null")
+        .order("id")
+        .limit(batch_size)
+    )
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    return query.execute().data or []
+
+
+def _process(meal: Dict[str, Any]) -> str:
+    path = storage.object_path(meal.get("img_url"))
+    if not path:
+        return "skipped"
+    try:
+        thumbnails.generate(meal["id"], path, io.BytesIO(storage.download(path)))
+        return "ok"
+    except Exception as e:
+        logging.warning(f"Comida {meal['id']}: {e}")
+        return "failed"
+
+
+def run(batch_size: int = 100, workers: int = 4, limit: Optional[int] = None, dry_run: bool = False) -> Dict[str, int]:
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    after_id = None
+    seen = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while limit is None or seen < limit:
+            batch = _pending_batch(after_id, batch_size if limit is None else min(batch_size, limit - seen))
+            if not batch:
+                break
+            after_id = batch[-1]["id"]
+            seen += len(batch)
+            if dry_run:
+                counts["skipped"] += len(batch)
+                continue
+            for outcome in pool.map(_process, batch):
+                counts[outcome] += 1
+            logging.info(f"backfill hasta id={after_id}: {counts}")
+    return counts
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Genera miniaturas de comidas sin thumb_url")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de comidas a procesar")
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta las comidas pendientes")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    counts = run(args.batch_size, args.workers, args.limit, args.dry_run)
+    label = "pendientes" if args.dry_run else "procesadas"
+    print(f"{label}: {sum(counts.values())}  ok={counts['ok']}  failed={counts['failed']}  skipped={counts['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
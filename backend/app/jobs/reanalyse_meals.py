@@ -0,0 +1,303 @@
+"""
+Re-análisis offline de las imágenes guardadas para comparar un modelo o prompt nuevo.
+
+    python -m app.jobs.reanalyse_meals --run-id prompt-v2 --model gpt-5-mini --concurrency 4
+    python -m app.jobs.reanalyse_meals --run-id prompt-v2 --limit 200      # retoma donde quedó
+    python -m app.jobs.reanalyse_meals --run-id prompt-v2 --report-only --compare prompt-v1
+
+Recorre `meals` por id, descarga la imagen de Storage y la vuelve a analizar con
+`analyze_image` (el mismo camino que /analyse_meal, con reintentos y ledger). A
+lo sumo `--concurrency` comidas en curso: las descargas van al threadpool y las
+llamadas al modelo son async.
+
+Todo queda en `<out-dir>/<run-id>/`:
+- results.jsonl: una línea por comida con el análisis nuevo, los meal_items
+  guardados (baseline), la latencia y el resultado (ok / failed / skipped).
+- checkpoint.json: último id de lote terminado. Al relanzar con el mismo
+  run-id se sigue desde ahí y se saltan las comidas que ya están en results.jsonl,
+  así una interrupción a mitad de lote no repite llamadas (las fallidas sí se reintentan).
+- report.json: precisión contra meal_items (error de calorías y macros,
+  precision/recall de alimentos) y latencia; con `--compare` también la
+  diferencia con otra corrida sobre las mismas comidas.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import mimetypes
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.core import storage
+from app.core.clients import get_supabase_admin
+from app.routes import analyse
+
+DEFAULT_OUT_DIR = os.getenv("REANALYSIS_DIR", "reanalysis")
+MACROS = (("calorias", "calories_kcal"), ("proteinas_g", "protein_g"),
+          ("carbohidratos_g", "carbs_g"), ("grasas_g", "fat_g"))
+
+
+# ---------- entrada ----------
+
+def _meals_batch(after_id, batch_size: int, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    query = get_supabase_admin().table("meals").select("id,img_url").order("id").limit(batch_size)
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+    return query.execute().data or []
+
+
+def _meals_by_id(meal_ids: List[Any]) -> List[Dict[str, Any]]:
+    if not meal_ids:
+        return []
+    return (
+        get_supabase_admin().table("meals").select("id,img_url").in_("id", meal_ids).order("id").execute()
+    ).data or []
+
+
+def _baseline_items(meal_ids: List[Any]) -> Dict[Any, List[Dict[str, Any]]]:
+    if not meal_ids:
+        return {}
+    rows = (
+        get_supabase_admin().table("meal_items")
+        .select("meal_id,name,weight_grams,calories_kcal,protein_g,carbs_g,fat_g")
+        .in_("meal_id", meal_ids)
+        .execute()
+    ).data or []
+    items: Dict[Any, List[Dict[str, Any]]] = {}
+    for row in rows:
+        items.setdefault(row["meal_id"], []).append({k: v for k, v in row.items() if k != "meal_id"})
+    return items
+
+
+# ---------- corrida ----------
+
+class RunFiles:
+    def __init__(self, out_dir: str, run_id: str):
+        self.dir = os.path.join(out_dir, run_id)
+        self.results = os.path.join(self.dir, "results.jsonl")
+        self.checkpoint = os.path.join(self.dir, "checkpoint.json")
+        self.report = os.path.join(self.dir, "report.json")
+
+    def load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+
+    def save_checkpoint(self, state: Dict[str, Any]) -> None:
+        # escribir y renombrar: una interrupción nunca deja el checkpoint a medias
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(state, fh)
+        os.replace(tmp, self.checkpoint)
+
+    def load_results(self) -> List[Dict[str, Any]]:
+        results = []
+        try:
+            with open(self.results) as fh:
+                for line in fh:
+                    try:
+                        results.append(json.loads(line))
+                    except ValueError:
+                        continue  # última línea cortada por la interrupción
+        except FileNotFoundError:
+            pass
+        return results
+
+
+async def _reanalyse(meal: Dict[str, Any], baseline: List[Dict[str, Any]], sem: asyncio.Semaphore) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"meal_id": meal["id"], "baseline": baseline}
+    path = storage.object_path(meal.get("img_url"))
+    if not path:
+        return {**record, "outcome": "skipped", "error": "img_url fuera del bucket"}
+    async with sem:
+        try:
+            image = await asyncio.to_thread(storage.download, path)
+            content_type = mimetypes.guess_type(path)[0] or "image/jpeg"
+            started = time.perf_counter()
+            result = await analyse.analyze_image(image, content_type)
+            latency_ms = (time.perf_counter() - started) * 1000
+        except Exception as e:
+            logging.warning(f"Comida {meal['id']}: {e}")
+            return {**record, "outcome": "failed", "error": f"{type(e).__name__}: {e}"}
+    return {**record, "outcome": "ok", "latency_ms": round(latency_ms, 1),
+            "items": result.get("alimentos", [])}
+
+
+async def _process(batch: List[Dict[str, Any]], out, sem: asyncio.Semaphore, counts: Dict[str, int]) -> None:
+    baseline = await asyncio.to_thread(_baseline_items, [m["id"] for m in batch])
+    tasks = [_reanalyse(m, baseline.get(m["id"], []), sem) for m in batch]
+    for finished in asyncio.as_completed(tasks):
+        record = await finished
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        counts[record["outcome"]] += 1
+
+
+async def run(
+    run_id: str,
+    out_dir: str = DEFAULT_OUT_DIR,
+    batch_size: int = 50,
+    concurrency: int = 4,
+    limit: Optional[int] = None,
+    user_id: Optional[str] = None,
+) -> Dict[str, int]:
+    files = RunFiles(out_dir, run_id)
+    os.makedirs(files.dir, exist_ok=True)
+    state = files.load_checkpoint()
+    last = {r["meal_id"]: r["outcome"] for r in files.load_results()}
+    done: Set[Any] = {meal_id for meal_id, outcome in last.items() if outcome != "failed"}
+    retry = [meal_id for meal_id, outcome in last.items() if outcome == "failed"]
+    after_id = state.get("after_id")
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    sem = asyncio.Semaphore(concurrency)
+    seen = 0
+
+    with open(files.results, "a+") as out:
+        out.seek(0, os.SEEK_END)
+        if out.tell():
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")  # la interrupción dejó una línea a medias
+        # primero las que fallaron en ejecuciones anteriores
+        if retry:
+            batch = await asyncio.to_thread(_meals_by_id, retry[:limit])
+            await _process(batch, out, sem, counts)
+            seen += len(batch)
+
+        while limit is None or seen < limit:
+            batch = await asyncio.to_thread(_meals_batch, after_id, batch_size, user_id)
+            if not batch:
+                break
+            pending = [m for m in batch if m["id"] not in done and m["id"] not in retry]
+            truncated = limit is not None and len(pending) > limit - seen
+            if truncated:
+                pending = pending[: limit - seen]
+            await _process(pending, out, sem, counts)
+            seen += len(pending)
+            if truncated:
+                break  # --limit cortó el lote: el checkpoint queda antes de lo no procesado
+            after_id = batch[-1]["id"]
+            files.save_checkpoint({"after_id": after_id, "model": analyse.VISION_MODEL,
+                                   "updated_at": time.time()})
+            logging.info(f"reanálisis {run_id} hasta id={after_id}: {counts}")
+    return counts
+
+
+# ---------- reporte ----------
+
+def _norm(name: Any) -> str:
+    return str(name or "").strip().lower()
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 1)
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(sum(values) / len(values), 2) if values else None
+
+
+def summarize(results: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Precisión contra meal_items y latencia de una corrida (solo comidas con baseline para la precisión)."""
+    results = list(results)
+    ok = [r for r in results if r.get("outcome") == "ok"]
+    errors: Dict[str, List[float]] = {key: [] for key, _ in MACROS}
+    calorie_pct: List[float] = []
+    hits = predicted = expected = 0
+    for r in ok:
+        if not r.get("baseline"):
+            continue
+        for key, column in MACROS:
+            new = sum(float(i.get(key) or 0) for i in r.get("items", []))
+            old = sum(float(i.get(column) or 0) for i in r["baseline"])
+            errors[key].append(abs(new - old))
+            if key == "calorias" and old:
+                calorie_pct.append(abs(new - old) / old * 100)
+        new_names = {_norm(i.get("nombre")) for i in r.get("items", [])}
+        old_names = {_norm(i.get("name")) for i in r["baseline"]}
+        hits += len(new_names & old_names)
+        predicted += len(new_names)
+        expected += len(old_names)
+
+    precision = hits / predicted if predicted else None
+    recall = hits / expected if expected else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else None
+    latencies = [float(r["latency_ms"]) for r in ok]
+    return {
+        "meals": len(results),
+        "outcomes": {o: sum(1 for r in results if r.get("outcome") == o) for o in ("ok", "failed", "skipped")},
+        "compared": len(errors["calorias"]),
+        "mae": {key: _mean(values) for key, values in errors.items()},
+        "calories_mape_pct": _mean(calorie_pct),
+        "foods": {
+            "precision": round(precision, 3) if precision is not None else None,
+            "recall": round(recall, 3) if recall is not None else None,
+            "f1": round(f1, 3) if f1 is not None else None,
+        },
+        "latency_ms": {"p50": _percentile(latencies, 0.5), "p95": _percentile(latencies, 0.95),
+                       "mean": _mean(latencies)},
+    }
+
+
+def _diff(current: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    def delta(a, b):
+        return round(a - b, 3) if a is not None and b is not None else None
+
+    return {
+        "mae": {key: delta(current["mae"][key], other["mae"][key]) for key in current["mae"]},
+        "calories_mape_pct": delta(current["calories_mape_pct"], other["calories_mape_pct"]),
+        "foods": {key: delta(current["foods"][key], other["foods"][key]) for key in current["foods"]},
+        "latency_ms": {key: delta(current["latency_ms"][key], other["latency_ms"][key])
+                       for key in current["latency_ms"]},
+    }
+
+
+def report(run_id: str, out_dir: str = DEFAULT_OUT_DIR, compare: Optional[str] = None) -> Dict[str, Any]:
+    files = RunFiles(out_dir, run_id)
+    results = {r["meal_id"]: r for r in files.load_results()}  # la última línea por comida gana
+    data: Dict[str, Any] = {"run_id": run_id, **files.load_checkpoint(), "summary": summarize(results.values())}
+    if compare:
+        others = {r["meal_id"]: r for r in RunFiles(out_dir, compare).load_results()}
+        common = [m for m in results if results[m].get("outcome") == "ok" and others.get(m, {}).get("outcome") == "ok"]
+        current = summarize(results[m] for m in common)
+        previous = summarize(others[m] for m in common)
+        data["compare"] = {"run_id": compare, "meals": len(common), "current": current,
+                           "previous": previous, "diff": _diff(current, previous)}
+    with open(files.report, "w") as fh:
+        json.dump(data, fh, indent=2, ensure_ascii=False)
+    return data
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Vuelve a analizar imágenes guardadas y compara con meal_items")
+    parser.add_argument("--run-id", required=True, help="Nombre de la corrida (carpeta de resultados)")
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--model", default=None, help="Modelo de visión (por defecto OPENAI_VISION_MODEL)")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de comidas en esta ejecución")
+    parser.add_argument("--user", default=None, help="Solo las comidas de este user_id")
+    parser.add_argument("--compare", default=None, help="run-id de otra corrida para el reporte")
+    parser.add_argument("--report-only", action="store_true", help="No analiza; solo regenera report.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if args.model:
+        analyse.VISION_MODEL = args.model
+    if not args.report_only:
+        counts = asyncio.run(run(args.run_id, args.out_dir, args.batch_size, args.concurrency, args.limit, args.user))
+        print(f"procesadas: {sum(counts.values())}  ok={counts['ok']}  failed={counts['failed']}  skipped={counts['skipped']}")
+    data = report(args.run_id, args.out_dir, args.compare)
+    print(json.dumps(data["summary"] if not args.compare else data["compare"]["diff"], indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
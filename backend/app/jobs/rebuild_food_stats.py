@@ -0,0 +1,70 @@
+"""
+Recalcula `user_food_stats` a partir de `meal_items` (datos anteriores al trigger o reparación).
+
+    python -m app.jobs.rebuild_food_stats
+    python -m app.jobs.rebuild_food_stats --user <uuid>
+    python -m app.jobs.rebuild_food_stats --batch-size 500 --limit 1000
+
+Recorre `users` por id y llama a la RPC `rebuild_user_food_stats` usuario por
+usuario: cada llamada es una transacción corta, así los guardados concurrentes
+solo esperan lo que tarda un usuario. Los usuarios que fallan se registran y se
+siguen procesando los demás; volver a ejecutar es seguro (reemplaza las filas).
+"""
+import argparse
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.core.clients import get_supabase_admin
+
+
+def _users_batch(after_id, batch_size: int) -> List[Dict[str, Any]]:
+    query = get_supabase_admin().table("users").select("id").order("id").limit(batch_size)
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    return query.execute().data or []
+
+
+def _rebuild(user_id: str) -> int:
+    res = get_supabase_admin().rpc("rebuild_user_food_stats", {"p_user_id": user_id}).execute()
+    return int(res.data or 0)
+
+
+def run(batch_size: int = 200, limit: Optional[int] = None, user_id: Optional[str] = None) -> Dict[str, int]:
+    counts = {"users": 0, "foods": 0, "failed": 0}
+    if user_id is not None:
+        counts["foods"] = _rebuild(user_id)
+        counts["users"] = 1
+        return counts
+
+    after_id = None
+    while limit is None or counts["users"] + counts["failed"] < limit:
+        seen = counts["users"] + counts["failed"]
+        batch = _users_batch(after_id, batch_size if limit is None else min(batch_size, limit - seen))
+        if not batch:
+            break
+        after_id = batch[-1]["id"]
+        for user in batch:
+            try:
+                counts["foods"] += _rebuild(user["id"])
+                counts["users"] += 1
+            except Exception as e:
+                logging.warning(f"Usuario {user['id']}: {e}")
+                counts["failed"] += 1
+        logging.info(f"food_stats hasta id={after_id}: {counts}")
+    return counts
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Recalcula user_food_stats desde meal_items")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de usuarios a procesar")
+    parser.add_argument("--user", default=None, help="Solo este user_id")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    counts = run(args.batch_size, args.limit, args.user)
+    print(f"usuarios: {counts['users']}  alimentos: {counts['foods']}  failed={counts['failed']}")
+
+
+if __name__ == "__main__":
+    main()
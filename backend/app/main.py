@@ -1,8 +1,41 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import users, analyse, meals
+from app.routes import users, analyse, meals, admin
+from app.core import metrics
+from app.core.instrumentation import TimingMiddleware
+from app.core import loop_monitor, lifecycle, thumbnails
+from app.core.uploads import UploadLimitMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.responses import FastJSONResponse
+from app.core import logs
 
-app = FastAPI()
+# logs JSON por una cola con hilo escritor (ver app/core/logs.py); uno por worker
+logs.setup()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warmup antes de aceptar tráfico: uvicorn no sirve requests hasta que termina el startup
+    await asyncio.to_thread(lifecycle.warmup)
+    lifecycle.install_drain_handler(float(os.getenv("DRAIN_DELAY_S", "0")))
+    loop_monitor.start()
+    lifecycle.mark_ready()
+    yield
+    lifecycle.mark_draining()
+    await asyncio.to_thread(thumbnails.shutdown)
+    await loop_monitor.stop()
+
+# orjson para todas las respuestas JSON (ver app/core/responses.py)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Límite de tamaño de subidas (413); queda dentro de CORS para que el error sea legible
+app.add_middleware(UploadLimitMiddleware)
+
+# gzip/brotli negociado para respuestas JSON >= COMPRESS_MIN_BYTES (historial, día)
+app.add_middleware(CompressionMiddleware)
 
 # 🛡️ Configurar CORS primero
 origins = [
@@ -17,14 +50,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tiempos por etapa: histogramas en /metrics y cabecera Server-Timing
+app.add_middleware(TimingMiddleware)
+
+# Reciclado de workers (solo activo con MAX_REQUESTS > 0, ver app/serve.py)
+app.add_middleware(
+    lifecycle.RecycleMiddleware,
+    max_requests=int(os.getenv("MAX_REQUESTS", "0")),
+    jitter=int(os.getenv("MAX_REQUESTS_JITTER", "0")),
+)
+
+# X-Request-ID y línea de acceso: el más externo, así todo el request lleva su id
+app.add_middleware(logs.RequestIdMiddleware)
+
 app.include_router(users.router, prefix="/api", tags=["users"])
 app.include_router(analyse.router, prefix="/api", tags=["analyse"])
 app.include_router(meals.router, prefix="/api", tags=["meals"])
+app.include_router(admin.router, prefix="/api", tags=["admin"])
 
 @app.get("/")
 def root():
     return {"message": "Welcome to the FastAPI application!"}
 
+@app.get("/healthz", include_in_schema=False)
+def liveness():
+    """Liveness: el proceso responde (no depende de Supabase ni OpenAI)."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+def readiness():
+    """Readiness: warmup terminado y el worker no está drenando."""
+    return JSONResponse(status_code=200 if lifecycle.is_ready() else 503, content=lifecycle.status())
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
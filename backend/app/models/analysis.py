@@ -0,0 +1,76 @@
+from pydantic import BaseModel, field_validator
+from typing import List
+import re
+
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+
+
+class Alimento(BaseModel):
+    nombre: str
+    cantidad_estimada_gramos: int = 0
+    calorias: int = 0
+    proteinas_g: int = 0
+    carbohidratos_g: int = 0
+    grasas_g: int = 0
+
+    @field_validator("nombre", mode="before")
+    @classmethod
+    def _normalize_name(cls, v):
+        if not isinstance(v, str) or not v.strip():
+            raise ValueError("nombre vacío")
+        return v.strip().lower()
+
+    @field_validator(
+        "cantidad_estimada_gramos", "calorias", "proteinas_g", "carbohidratos_g", "grasas_g",
+        mode="before",
+    )
+    @classmethod
+    def _coerce_number(cls, v):
+        # el modelo a veces devuelve 12.5, "150 g" o null
+        if v is None or isinstance(v, bool):
+            return 0
+        if isinstance(v, (int, float)):
+            return max(int(round(v)), 0)
+        if isinstance(v, str):
+            match = _NUMBER_RE.search(v)
+            if match:
+                return max(int(round(float(match.group(0).replace(",", ".")))), 0)
+            return 0
+        raise ValueError(f"valor numérico inválido: {v!r}")
+
+
+class AnalysisResult(BaseModel):
+    alimentos: List[Alimento]
+
+
+# JSON Schema para structured outputs (modo strict: todo requerido, sin propiedades extra)
+ANALYSIS_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "alimentos": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "nombre": {"type": "string"},
+                    "cantidad_estimada_gramos": {"type": "integer"},
+                    "calorias": {"type": "integer"},
+                    "proteinas_g": {"type": "integer"},
+                    "carbohidratos_g": {"type": "integer"},
+                    "grasas_g": {"type": "integer"},
+                },
+                "required": [
+                    "nombre",
+                    "cantidad_estimada_gramos",
+                    "calorias",
+                    "proteinas_g",
+                    "carbohidratos_g",
+                    "grasas_g",
+                ],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["alimentos"],
+    "additionalProperties": False,
+}
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+
+
+class MealRelog(BaseModel):
+    # porción respecto a la comida original (0.5 = media, 2 = doble)
+    scale: float = Field(default=1.0, gt=0, le=10)
@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, Literal
 
+from app.core.timezones import is_valid_tz
+
 class UserProfileInput(BaseModel):
     age: int
     height_cm: int
@@ -11,6 +13,15 @@ class UserProfileInput(BaseModel):
 
 class UserCreate(UserProfileInput):
     name: str
+    # zona IANA para el día local (/meals/day, export); si no se envía se conserva la guardada
+    timezone: Optional[str] = Field(default=None, max_length=64)
+
+    @field_validator("timezone")
+    @classmethod
+    def _known_timezone(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and not is_valid_tz(value):
+            raise ValueError("Timezone IANA desconocido (ej. America/Lima)")
+        return value
     
 class UserUpdate(BaseModel):
     name: Optional[str] = None
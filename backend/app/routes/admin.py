@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Header, Depends, Query
+from typing import Optional
+import hmac
+import os
+
+from app.core import ledger, storage
+from app.core.clients import get_supabase_admin
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Protege endpoints internos con ADMIN_TOKEN; si no está configurado, no existen."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/admin/model_usage", dependencies=[Depends(require_admin)])
+def model_usage(days: int = Query(default=7, ge=1, le=90)):
+    """p50/p95 de latencia, tokens y costo por modelo y día (UTC)."""
+    return {"days": days, "report": ledger.summarize(days)}
+
+
+@router.get("/admin/storage_dedup", dependencies=[Depends(require_admin)])
+def storage_dedup():
+    """Deduplicación de imágenes: blobs únicos vs referencias, ratio y bytes ahorrados."""
+    return storage.dedup_stats(get_supabase_admin())
@@ -1,40 +1,53 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Form
+from typing import Optional
 from fastapi.responses import JSONResponse
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
+import asyncio
 import base64
+import math
 import json
-import re
-from ..core.supabase import supabase
+import time
+from ..core.clients import LazyClient, get_openai, get_supabase_admin
+from ..core.model_client import call_model, CircuitOpenError
+from ..core import metrics
+from ..core.instrumentation import span
+from ..core import ledger
+from ..core.uploads import storage_source, upload_bytes
+from ..core import storage, thumbnails, timezones
+from ..core import admission, etags, events, idempotency
+from ..models.analysis import ANALYSIS_JSON_SCHEMA
+from ..utils.analysis_parser import AnalysisParseError, extract_json_block, is_strict_json, parse_analysis
 import logging
 from datetime import datetime, timezone
 import os, json, uuid
-from supabase import create_client, Client
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
 
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Structured outputs: el modelo de visión responde con JSON restringido al esquema de 'alimentos'
+STRUCTURED_OUTPUT = os.getenv("OPENAI_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+VISION_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-5-mini")
+REPAIR_MODEL = os.getenv("OPENAI_REPAIR_MODEL", "gpt-4o-mini")
+REPAIR_ATTEMPTS = int(os.getenv("ANALYSIS_REPAIR_ATTEMPTS", "1"))
+
+parse_total = metrics.counter("analysis_parse_total", "Resultados del parseo de la respuesta de visión (ok, repaired, model_repaired, failed)")
+repair_calls_total = metrics.counter("analysis_repair_calls_total", "Llamadas de reparación de JSON (solo texto)")
 
-if SUPABASE_URL is None or SUPABASE_SERVICE_ROLE_KEY is None:
-    print("SUPABASE_URL", SUPABASE_URL)
-    print("SUPABASE_SERVICE_ROLE_KEY", SUPABASE_SERVICE_ROLE_KEY)
-    raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY environment variables must be set")
-supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# clientes perezosos: openai y supabase se importan y crean en el primer request
+client = LazyClient(get_openai)
+supabase_admin = LazyClient(get_supabase_admin)
 
 router = APIRouter()
 
 @router.post("/analyse_meal")
-async def analyse_meal(image: UploadFile = File(...), authorization: str = Header(...)) -> JSONResponse:
+async def analyse_meal(
+    image: UploadFile = File(...),
+    authorization: str = Header(...),
+    idempotency_key: Optional[str] = Header(None),
+) -> JSONResponse:
     logging.info("analyse_meal() exec[][]")
    
     if not authorization or not authorization.lower().startswith("bearer "):
@@ -42,7 +55,8 @@ async def analyse_meal(image: UploadFile = File(...), authorization: str = Heade
     token = authorization.split(" ", 1)[1]
 
     try:
-        user_resp = supabase_admin.auth.get_user(jwt=token)
+        with span("auth"):
+            user_resp = supabase_admin.auth.get_user(jwt=token)
         user_id = (
             getattr(getattr(user_resp, "user", None), "id", None)
             or (user_resp.get("user", {}) if isinstance(user_resp, dict) else {}).get("id")
@@ -55,23 +69,64 @@ async def analyse_meal(image: UploadFile = File(...), authorization: str = Heade
     if not image.content_type or not image.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image file")
 
+    # un reintento con la misma Idempotency-Key no paga otra llamada al modelo; la huella
+    # es el sha256 de la imagen (los pickers de RN repiten nombres de archivo)
+    fp = await _image_fingerprint(idempotency_key, image)
+    return await idempotency.run(idempotency_key, user_id, "analyse_meal", fp, lambda: _analyse(user_id, image))
+
+async def _image_fingerprint(idempotency_key: Optional[str], image: UploadFile, *parts) -> str:
+    """Huella para Idempotency-Key: contenido de la imagen, no su nombre ni tamaño."""
+    if not idempotency_key:
+        return ""
+    digest, size = await asyncio.to_thread(storage.content_hash, image.file)
+    return idempotency.fingerprint(*parts, digest, size, image.content_type)
+
+async def _analyse(user_id: str, image: UploadFile) -> JSONResponse:
+    """Análisis de la imagen + recomendación (cuerpo de analyse_meal)."""
+    # token bucket por usuario + cupo global con cola justa (429 si no hay sitio)
+    async with admission.admit(user_id, "analyse_meal"):
+        try:
+            # el payload base64 para el modelo necesita la imagen entera; el tamaño ya lo acota UploadLimitMiddleware
+            content = await image.read()
+            upload_bytes.observe(len(content), route="analyse_meal")
+            result = await analyze_image(content, image.content_type)
+            recommendation = await get_recomendation(result, user_id)
+
+            return JSONResponse(status_code=200, content={"analysis": result, "recommendation": recommendation})
+
+        except CircuitOpenError as e:
+            # lo que le queda abierto al circuito (en half_open con la sonda en curso, 1 s)
+            raise HTTPException(
+                status_code=503, detail=str(e), headers={"Retry-After": str(max(1, math.ceil(e.retry_after_s)))}
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+async def _complete(purpose: str, image_bytes: int = 0, **kwargs):
+    """Llama al modelo vía call_model y registra tokens/latencia/costo en el ledger."""
+    model = kwargs.get("model", "unknown")
+    started = time.perf_counter()
     try:
-        content = await image.read()
-        result = await analyze_image(content, image.content_type)
-        recommendation = await get_recomendation(result, user_id)
-        
-        return JSONResponse(status_code=200, content={"analysis": result, "recommendation": recommendation})
-        
+        response = await call_model(client.chat.completions.create, **kwargs)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    
+        ledger.record(ledger.ModelCallRecord.from_response(
+            purpose, model, (time.perf_counter() - started) * 1000,
+            outcome=type(e).__name__, image_bytes=image_bytes,
+        ))
+        raise
+    ledger.record(ledger.ModelCallRecord.from_response(
+        purpose, model, (time.perf_counter() - started) * 1000, response, image_bytes=image_bytes,
+    ))
+    return response
+
 async def get_recomendation(analysis: dict, user_id: str) -> str:
     logging.info("get_recomendation() exec[][]")
     
     if analysis is None or "alimentos" not in analysis or not isinstance(analysis["alimentos"], list):
         raise ValueError("Análisis inválido o sin alimentos.")
 
-    info_user = supabase_admin.table("users").select("*").eq("id", user_id).limit(1).execute()
+    with span("db"):
+        info_user = supabase_admin.table("users").select("*").eq("id", user_id).limit(1).execute()
     user_data = info_user.data
     
     prompt = f"""
@@ -96,7 +151,8 @@ async def get_recomendation(analysis: dict, user_id: str) -> str:
     No uses markdown.
     """
 
-    response = client.chat.completions.create(
+    response = await _complete(
+        "recommendation",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": prompt},
@@ -149,8 +205,17 @@ async def analyze_image(image_bytes: bytes, content_type: str) -> dict:
     """
 
 
-    response = client.chat.completions.create(
-        model="gpt-5-mini",
+    extra = {}
+    if STRUCTURED_OUTPUT:
+        extra["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": "analisis_comida", "strict": True, "schema": ANALYSIS_JSON_SCHEMA},
+        }
+
+    response = await _complete(
+        "vision",
+        image_bytes=len(image_bytes),
+        model=VISION_MODEL,
         messages=[
             {"role": "system", "content": prompt},
             {
@@ -164,51 +229,62 @@ async def analyze_image(image_bytes: bytes, content_type: str) -> dict:
                     }
                 ]
             }
-        ]
+        ],
+        **extra,
     )
 
     content = response.choices[0].message.content
     
     if content is None:
+        parse_total.inc(outcome="failed")
         raise ValueError("Model response content is None and cannot be parsed as JSON.")
-    try:
-        cleaned_content = extract_json_block(content)
-        return json.loads(cleaned_content)
-    except Exception as e:
-        raise ValueError(f"Failed to parse JSON from model response: {e}\nResponse content: {content}")
-    
-def extract_json_block(text: str) -> str:
-    """
-    Extrae el contenido JSON de un bloque Markdown como ```json ... ```
-    """
-    match = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
-    if match:
-        return match.group(1).strip()
-    return text.strip()
-
-from datetime import datetime, date as date_cls, time as time_cls, timedelta, timezone
-
-try:
-    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError  # Py3.9+
-except Exception:  # ultra-robusto
-    ZoneInfo = None
-    ZoneInfoNotFoundError = Exception
 
-def resolve_tz(tz_name: str):
-    """
-    Devuelve tzinfo robusto:
-    - Intenta ZoneInfo(tz_name)
-    - Si falla y es Lima: -05:00 fijo
-    - Si falla cualquier otra: UTC
-    """
-    if ZoneInfo is not None:
+    try:
+        result = parse_analysis(content)
+        parse_total.inc(outcome="ok" if is_strict_json(content) else "repaired")
+        return result.model_dump()
+    except AnalysisParseError as e:
+        last_error = e
+
+    # Solo se reintenta la reparación (texto, modelo barato), nunca la llamada de visión
+    for _ in range(REPAIR_ATTEMPTS):
+        repair_calls_total.inc()
         try:
-            return ZoneInfo(tz_name)
-        except ZoneInfoNotFoundError:
-            pass
-    if tz_name == "America/Lima":
-        return timezone(timedelta(hours=-5))
-    return timezone.utc
+            repaired = await _repair_analysis_json(content)
+            result = parse_analysis(repaired)
+            parse_total.inc(outcome="model_repaired")
+            return result.model_dump()
+        except Exception as e:
+            last_error = e
+
+    parse_total.inc(outcome="failed")
+    raise ValueError(f"Failed to parse JSON from model response: {last_error}\nResponse content: {content}")
+
+
+async def _repair_analysis_json(raw: str) -> str:
+    """Pide a un modelo de texto que convierta la respuesta cruda al esquema de 'alimentos'."""
+    response = await _complete(
+        "repair",
+        model=REPAIR_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "Convierte el siguiente texto en JSON válido con la forma "
+                    '{"alimentos": [{"nombre", "cantidad_estimada_gramos", "calorias", '
+                    '"proteinas_g", "carbohidratos_g", "grasas_g"}]}. '
+                    "No inventes alimentos; usa solo los que aparecen en el texto."
+                ),
+            },
+            {"role": "user", "content": raw},
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "analisis_comida", "strict": True, "schema": ANALYSIS_JSON_SCHEMA},
+        },
+    )
+    return response.choices[0].message.content or ""
+
 
 @router.post("/save_analysis")
 async def save_analysis(
@@ -216,6 +292,7 @@ async def save_analysis(
     analysis: str = Form(...),
     recommendation: str = Form(""),
     authorization: str = Header(None),
+    idempotency_key: Optional[str] = Header(None),
 ) -> JSONResponse:
     logging.info("save_analysis() exec[][]")
 
@@ -225,7 +302,8 @@ async def save_analysis(
     token = authorization.split(" ", 1)[1]
 
     try:
-        user_resp = supabase_admin.auth.get_user(jwt=token)
+        with span("auth"):
+            user_resp = supabase_admin.auth.get_user(jwt=token)
         user_id = (
             getattr(getattr(user_resp, "user", None), "id", None)
             or (user_resp.get("user", {}) if isinstance(user_resp, dict) else {}).get("id")
@@ -234,7 +312,16 @@ async def save_analysis(
             raise ValueError("No se pudo obtener el user_id")
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Token inválido: {e}")
-    
+
+    # reintentos de la app con la misma Idempotency-Key devuelven la comida ya guardada
+    fp = await _image_fingerprint(idempotency_key, image, analysis, recommendation)
+    return await idempotency.run(
+        idempotency_key, user_id, "save_analysis", fp,
+        lambda: _store_analysis(user_id, image, analysis, recommendation),
+    )
+
+async def _store_analysis(user_id: str, image: UploadFile, analysis: str, recommendation: str) -> JSONResponse:
+    """Sube la imagen y guarda la comida con sus items (cuerpo de save_analysis)."""
     try:
         payload = json.loads(analysis)
     except Exception:
@@ -247,92 +334,100 @@ async def save_analysis(
         raise HTTPException(400, "analysis.alimentos está vacío o mal formado.")
     
     recommendation = recommendation.strip()
-    totals = _compute_totals(alimentos)
-
-    # --- Ruta destino: meals/<uid>/YYYYMMDD/<uuid>.<ext> ---
-    ext = (image.filename or "jpg").split(".")[-1].lower()
-    now = datetime.now(timezone.utc)
-    stored_name = f"{uuid.uuid4().hex}.{ext}"
-    path = f"meals/{user_id}/{now.strftime('%Y%m%d')}/{stored_name}"
-    logging.info(f"Storing image at path: {path}")
 
-    # --- Subida a Storage con Service Role (RLS no aplica) ---
+    # --- Subida a Storage direccionada por contenido (Service Role, RLS no aplica) ---
+    # clave blobs/<ab>/<sha256>.<ext>: la misma foto no se sube dos veces; image_blobs lleva el refcount.
+    # Se hashea y sube desde el spool del UploadFile (sin copiarlo entero a memoria) en el threadpool.
+    content_type = image.content_type or "application/octet-stream"
     try:
-        content = await image.read()
-
         if not SUPABASE_BUCKET:
-            print("SUPABASE_BUCKET", SUPABASE_BUCKET)
             raise HTTPException(status_code=500, detail="SUPABASE_BUCKET no está configurado.")
 
-        storage = supabase_admin.storage.from_(SUPABASE_BUCKET)
-        storage.upload(
-            path=path,
-            file=content,
-            file_options={
-                "content-type": image.content_type or "application/octet-stream",
-                "upsert": "false",
-                "cache-control": "3600",
-            },
-        )
+        upload_bytes.observe(image.size or 0, route="save_analysis")
+        bucket_api = supabase_admin.storage.from_(SUPABASE_BUCKET)
+        blob = await asyncio.to_thread(storage.put_blob, bucket_api, image.file, content_type)
+        logging.info(f"Image stored at path: {blob.path} (dedup={not blob.uploaded})")
+        await asyncio.to_thread(storage.acquire_blob, supabase_admin, bucket_api, blob, image.file)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Upload failed: {e}")
         raise HTTPException(status_code=500, detail=f"No se pudo subir a Supabase Storage: {e}")
+    path = blob.path
 
     # --- URL de retorno ---
     if not SUPABASE_URL:
         raise HTTPException(status_code=500, detail="SUPABASE_URL no está configurado.")
     
-    public_url = f"{SUPABASE_URL.rstrip('/')}/storage/v1/object/public/{SUPABASE_BUCKET}/{path}"\
+    # URL pública, o la ruta del objeto con bucket privado (STORAGE_URL_MODE=signed)
+    img_ref = storage.stored_ref(path)
+
+    # una foto ya guardada reusa sus miniaturas
+    thumbs = None if blob.uploaded else await asyncio.to_thread(thumbnails.existing_urls, bucket_api, path)
     
     meal_row = {
         "user_id": user_id,
-        "img_url": public_url,            # guarda ruta; public_url solo si tu bucket es público
+        "img_url": img_ref,
         "recommendation": recommendation,
-        "total_calories": totals["calorias"],
-        "total_protein_g": totals["proteinas_g"],
-        "total_carbs_g": totals["carbohidratos_g"],
-        "total_fat_g": totals["grasas_g"],
-        "date_creation": datetime.now(resolve_tz("America/Lima")).isoformat(),
+        "date_creation": timezones.now_utc_iso(),
+        "image_hash": blob.hash,
     }
+    if thumbs:
+        meal_row["thumbnails"] = thumbs
+        meal_row["thumb_url"] = thumbs.get(str(thumbnails.DEFAULT_SIZE))
 
-    try:
-        ins_meal = supabase_admin.table("meals").insert(meal_row).execute()
-        row = ins_meal.data[0] if ins_meal.data and isinstance(ins_meal.data, list) else None
-        meal_id = row.get("id") if row else None
-    except Exception as e:
-        logging.exception("Fallo insert meals")
-        raise HTTPException(500, f"No se pudo guardar la comida: {e}")
-    
-    # --- 5) Insert en meal_items (bulk) ---
-    items_rows = []
-    for it in alimentos:
-        items_rows.append({
-            "meal_id": meal_id,
+    items_rows = [
+        {
             "name": it["nombre"],
             "weight_grams": it.get("cantidad_estimada_gramos"),
             "calories_kcal": it.get("calorias"),
             "protein_g": it.get("proteinas_g"),
             "carbs_g": it.get("carbohidratos_g"),
             "fat_g": it.get("grasas_g"),
-        })
+        }
+        for it in alimentos
+    ]
 
+    # --- meals + meal_items en una transacción (RPC save_meal_with_items, sql/003) ---
+    # los totales los calcula la función a partir de los items
     try:
-        if items_rows:
-            supabase_admin.table("meal_items").insert(items_rows).execute()
+        with span("db"):
+            saved = supabase_admin.rpc(
+                "save_meal_with_items", {"p_meal": meal_row, "p_items": items_rows}
+            ).execute()
+        row = saved.data[0] if isinstance(saved.data, list) and saved.data else saved.data
+        meal_id = row["meal_id"]
     except Exception as e:
-        logging.exception("Fallo insert meal_items; limpiando meal")
-        # rollback best-effort (PostgREST no hace transacciones multi tabla en una llamada)
+        logging.exception("Fallo save_meal_with_items")
+        await asyncio.to_thread(storage.release_image, supabase_admin, blob.hash)
+        raise HTTPException(500, f"No se pudo guardar la comida: {e}")
+    etags.bump(user_id)
+    await events.publish_async(user_id, "meals")
+
+    totals = {
+        "calorias": float(row.get("total_calories") or 0),
+        "proteinas_g": float(row.get("total_protein_g") or 0),
+        "carbohidratos_g": float(row.get("total_carbs_g") or 0),
+        "grasas_g": float(row.get("total_fat_g") or 0),
+    }
+
+    # --- Miniaturas en segundo plano (no retrasan la respuesta) ---
+    if not thumbs:
         try:
-            supabase.table("meals").delete().eq("id", meal_id).execute()
-        finally:
-            raise HTTPException(500, f"No se pudieron guardar los items: {e}")
+            await asyncio.to_thread(thumbnails.submit, meal_id, path, image.file)
+        except Exception as e:
+            logging.warning(f"No se pudieron encolar las miniaturas: {e}")
+
+    image_url = img_ref
+    if storage.url_mode() == "signed":
+        image_url = (await asyncio.to_thread(storage.sign, [path])).get(path, path)
 
     return JSONResponse(
         status_code=201,
         content={
             "meal_id": meal_id,
-            "image_path": public_url,
-            "public_url": public_url,  # si bucket público
+            "image_path": img_ref,
+            "public_url": image_url,  # firmada si el bucket es privado
             "totals": totals,
         }
     )
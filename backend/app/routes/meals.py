@@ -1,13 +1,24 @@
 
-from fastapi import APIRouter, HTTPException, Header, Depends, Query, Response
+from fastapi import APIRouter, Body, HTTPException, Header, Depends, Query, Request, Response
 from app.utils.nutrition import calculate_nutrition_targets
 from app.core.supabase import verify_token, supabase
+from app.core.instrumentation import span
+from app.core import etags, events, lifecycle, singleflight, storage, timezones
 from app.models.user import UserCreate
+from app.models.meal import MealRelog
+from app.core.clients import get_supabase_admin
+from app.core.responses import dumps
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from postgrest.exceptions import APIError
 
-from typing import Optional
-from datetime import datetime, date as date_cls, time as time_cls, timedelta, timezone
-from zoneinfo import ZoneInfo
+import asyncio
+import base64
+import os
+import time
+from typing import Optional, Tuple
+from datetime import datetime
 
 router = APIRouter()
 
@@ -17,96 +28,273 @@ def get_current_user_id(authorization: str = Header(...)) -> str:
 
 
 @router.get("/history_meals")
-def get_meal_history(user_id: str = Depends(get_current_user_id)):
+def get_meal_history(request: Request, user_id: str = Depends(get_current_user_id)):
+    def load():
+        try:
+            with span("db"):
+                history = supabase.table("meals").select("*").eq("user_id", user_id).order("date_creation", desc=True).execute()
+            return storage.sign_rows(history.data)
+        except APIError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    # con bucket privado las URLs firmadas cambian por ventana: parte del ETag
+    return etags.conditional(
+        request, user_id, "history_meals", lambda: singleflight.read(user_id, "history_meals", load),
+        storage.url_window(),
+    )
+
+
+CHANGES_PAGE_SIZE = int(os.getenv("MEAL_CHANGES_PAGE_SIZE", "200"))
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("MEAL_TOMBSTONE_RETENTION_DAYS", "30"))
+
+
+def _changes_token(cursor: Tuple[int, int]) -> str:
+    # "<change_xid>.<change_seq>.<emitido en epoch s>": la fecha permite detectar lápidas ya purgadas
+    return f"{cursor[0]}.{cursor[1]}.{int(time.time())}"
+
+
+def _parse_changes_token(since: Optional[str]) -> Tuple[int, int]:
+    if not since:
+        return 0, 0
     try:
-        history = supabase.table("meals").select("*").eq("user_id", user_id).order("date_creation", desc=True).execute()
-        return history.data
-    except APIError as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    
-    
+        parts = [int(part) for part in since.split(".")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Token 'since' inválido.")
+    # los tokens "<change_seq>.<emitido>" anteriores no traen xid: sincronización completa
+    if len(parts) != 3 or parts[2] < time.time() - TOMBSTONE_RETENTION_DAYS * 86400:
+        raise HTTPException(status_code=410, detail="Token 'since' vencido: sincroniza el historial completo.")
+    return parts[0], parts[1]
+
+
+def _after_cursor(query, cursor: Tuple[int, int], horizon: int):
+    # (change_xid, change_seq) > cursor y change_xid < horizonte, en orden de cursor
+    xid, seq = cursor
+    return (
+        query.or_(f"change_xid.gt.{xid},and(change_xid.eq.{xid},change_seq.gt.{seq})")
+        .lt("change_xid", horizon)
+        .order("change_xid").order("change_seq")
+    )
+
+
+@router.get("/history_meals/changes")
+def get_meal_history_changes(
+    since: Optional[str] = Query(default=None, description="next_since de la respuesta anterior; vacío = todo"),
+    limit: int = Query(default=CHANGES_PAGE_SIZE, ge=1, le=1000),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Delta-sync del historial (sql/004_meal_changes.sql):
+    - upserted: comidas creadas o modificadas después de `since` (filas completas)
+    - deleted: ids de comidas borradas después de `since`
+    - next_since: token para la próxima llamada; has_more: quedan cambios (pedir otra página)
+
+    Sin `since` devuelve el historial desde el principio (sin borrados). 410 si el
+    token es más viejo que la retención de lápidas: hay que volver a sincronizar todo.
+
+    Las filas se recorren por (change_xid, change_seq) y solo hasta el horizonte de
+    transacciones terminadas: una escritura que confirma tarde no queda detrás del token.
+    Sin ETag: cada respuesta trae un token nuevo (con su fecha de emisión) y estando al
+    día las consultas ya son un index scan vacío.
+    """
+    cursor = _parse_changes_token(since)
+
+    def load():
+        try:
+            with span("db"):
+                horizon = int(get_supabase_admin().rpc("meal_changes_horizon", {}).execute().data)
+            with span("db"):
+                upserted = _after_cursor(
+                    supabase.table("meals").select("*").eq("user_id", user_id), cursor, horizon
+                ).limit(limit).execute().data or []
+            deleted = []
+            if since:
+                with span("db"):
+                    deleted = _after_cursor(
+                        supabase.table("meal_tombstones").select("meal_id,change_xid,change_seq")
+                        .eq("user_id", user_id), cursor, horizon
+                    ).limit(limit).execute().data or []
+        except APIError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        # una sola página ordenada por cursor: todo lo <= next_since quedó entregado
+        page = sorted(
+            [((int(m["change_xid"]), m["change_seq"]), "upserted", m) for m in upserted]
+            + [((int(t["change_xid"]), t["change_seq"]), "deleted", t["meal_id"]) for t in deleted],
+            key=lambda change: change[0],
+        )[:limit]
+        # una lista llena, o las dos juntas más largas que la página (se cortó al mezclar)
+        has_more = len(upserted) == limit or len(deleted) == limit or len(upserted) + len(deleted) > limit
+        return {
+            "upserted": storage.sign_rows([value for _, kind, value in page if kind == "upserted"]),
+            "deleted": [value for _, kind, value in page if kind == "deleted"],
+            "next_since": _changes_token(page[-1][0] if page else cursor),
+            "has_more": has_more,
+        }
+
+    return singleflight.read(user_id, "history_meals_changes", load, cursor, limit)
+
+
 @router.get("/history_meals/{meal_id}")
-def get_meal_detail(meal_id: str, user_id: str = Depends(get_current_user_id)):
+def get_meal_detail(meal_id: str, request: Request, user_id: str = Depends(get_current_user_id)):
+    def load():
+        try:
+            with span("db"):
+                meal = supabase.table("meals").select("*").eq("id", meal_id).eq("user_id", user_id).execute()
+            with span("db"):
+                meal_items = supabase.table("meal_items").select("*").eq("meal_id", meal_id).execute()
+            if not meal.data:
+                raise HTTPException(status_code=404, detail="Meal not found")
+            return {"meal": storage.sign_rows(meal.data)[0], "items": meal_items.data}
+        except APIError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return etags.conditional(
+        request, user_id, "history_meal_detail",
+        lambda: singleflight.read(user_id, "history_meal_detail", load, meal_id),
+        storage.url_window(),
+    )
+
+@router.post("/meals/{meal_id}/relog", status_code=201)
+def relog_meal(
+    meal_id: int,
+    body: MealRelog = Body(default_factory=MealRelog),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Registra de nuevo una comida anterior (mismo plato, ahora) sin foto ni llamada al modelo.
+
+    Una sola RPC (sql/005_relog_meal.sql): copia la comida y sus items escalados por
+    `scale`, recalcula los totales a partir de los items y reusa la imagen (refcount).
+    """
     try:
-        meal = supabase.table("meals").select("*").eq("id", meal_id).eq("user_id", user_id).execute()
-        meal_items = supabase.table("meal_items").select("*").eq("meal_id", meal_id).execute()
-        if not meal.data:
-            raise HTTPException(status_code=404, detail="Meal not found")
-        return {"meal": meal.data[0], "items": meal_items.data}
+        with span("db"):
+            res = get_supabase_admin().rpc("relog_meal", {
+                "p_user_id": user_id,
+                "p_meal_id": meal_id,
+                "p_scale": body.scale,
+                "p_date_creation": timezones.now_utc_iso(),
+            }).execute()
     except APIError as e:
+        if e.code == "P0002":
+            raise HTTPException(status_code=404, detail="Meal not found")
         raise HTTPException(status_code=500, detail=str(e))
+    row = res.data[0] if isinstance(res.data, list) and res.data else res.data
+    etags.bump(user_id)
+    events.publish(user_id, "meals")
+    return {
+        "meal_id": row["meal_id"],
+        "source_meal_id": meal_id,
+        "scale": body.scale,
+        "totals": {
+            "calorias": float(row.get("total_calories") or 0),
+            "proteinas_g": float(row.get("total_protein_g") or 0),
+            "carbohidratos_g": float(row.get("total_carbs_g") or 0),
+            "grasas_g": float(row.get("total_fat_g") or 0),
+        },
+    }
+
+
+SEARCH_PAGE_SIZE = int(os.getenv("MEAL_SEARCH_PAGE_SIZE", "20"))
+
+
+def _search_cursor(row: dict) -> str:
+    # "<date_creation>|<meal_id>" de la última fila: la página siguiente empieza justo antes
+    raw = f"{row['date_creation']}|{row['meal_id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _parse_search_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    if not cursor:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        before_date, before_id = raw.rsplit("|", 1)
+        datetime.fromisoformat(before_date.replace("Z", "+00:00"))
+        return before_date, int(before_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+
+@router.get("/meals/search")
+def search_meals(
+    request: Request,
+    q: str = Query(..., min_length=3, max_length=64, description="Texto a buscar en los alimentos de la comida"),
+    limit: int = Query(default=SEARCH_PAGE_SIZE, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="next_cursor de la página anterior"),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Comidas del usuario con algún alimento cuyo nombre contiene `q`, de la más reciente
+    a la más antigua. RPC search_meals (sql/006_food_search.sql): recorre las comidas
+    desde el cursor keyset y se detiene al llenar la página; los matched_items se arman
+    solo para las filas devueltas. Mínimo 3 caracteres: con menos no hay trigrama y el
+    índice de meal_items.name no sirve.
+    """
+    query = q.strip().lower()
+    if len(query) < 3:
+        raise HTTPException(status_code=422, detail="La búsqueda necesita al menos 3 caracteres.")
+    before_date, before_id = _parse_search_cursor(cursor)
+
+    def load():
+        try:
+            with span("db"):
+                res = get_supabase_admin().rpc("search_meals", {
+                    "p_user_id": user_id,
+                    "p_query": query,
+                    "p_limit": limit,
+                    "p_before_date": before_date,
+                    "p_before_id": before_id,
+                }).execute()
+        except APIError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        rows = res.data or []
+        return {
+            "results": storage.sign_rows(rows),
+            "next_cursor": _search_cursor(rows[-1]) if len(rows) == limit else None,
+        }
+
+    return etags.conditional(
+        request, user_id, "meals_search",
+        lambda: singleflight.read(user_id, "meals_search", load, query, limit, cursor),
+        query, limit, cursor, storage.url_window(),
+    )
+
 
 @router.delete("/delete_meal/{meal_id}")
 def delete_meal(meal_id: str, user_id: str = Depends(get_current_user_id)):
     try:
-        meal = supabase.table("meals").select("*").eq("id", meal_id).eq("user_id", user_id).execute()
+        with span("db"):
+            meal = supabase.table("meals").select("*").eq("id", meal_id).eq("user_id", user_id).execute()
         if not meal.data:
             raise HTTPException(status_code=404, detail="Meal not found")
-        supabase.table("meal_items").delete().eq("meal_id", meal_id).execute()
-        supabase.table("meals").delete().eq("id", meal_id).eq("user_id", user_id).execute()
+        with span("db"):
+            supabase.table("meal_items").delete().eq("meal_id", meal_id).execute()
+        with span("db"):
+            supabase.table("meals").delete().eq("id", meal_id).eq("user_id", user_id).execute()
+        etags.bump(user_id)
+        events.publish(user_id, "meals")
+        # la imagen se borra solo si ninguna otra comida usa el mismo blob
+        # (release_image_blob solo la puede ejecutar el service role)
+        storage.release_image(get_supabase_admin(), meal.data[0].get("image_hash"))
         return {"detail": "Meal deleted successfully"}
     except APIError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 
-from typing import Optional, Tuple
-from datetime import datetime, date as date_cls, time as time_cls, timedelta, timezone
-
-try:
-    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
-except Exception:
-    ZoneInfo = None
-    ZoneInfoNotFoundError = Exception
-
-def resolve_tz(tz_name: str):
-    """
-    Devuelve tzinfo robusto:
-    - Intenta ZoneInfo(tz_name)
-    - Si falla y es Lima: -05:00 fijo (Perú no usa DST)
-    - Si falla cualquier otra: UTC
-    """
-    if ZoneInfo is not None:
-        try:
-            return ZoneInfo(tz_name)
-        except ZoneInfoNotFoundError:
-            pass
-    if tz_name == "America/Lima":
-        return timezone(timedelta(hours=-5))
-    return timezone.utc
-
-def _day_range_utc(date_str: Optional[str], tz_name: str = "America/Lima") -> tuple[str, str, str]:
-    """
-    Convierte una fecha local (YYYY-MM-DD) a rango UTC [start, end) ISO8601.
-    Si no se pasa fecha, usa la fecha “hoy” en la TZ indicada.
-    """
-    tz = resolve_tz(tz_name)
-
-    if date_str:
-        target_date = date_cls.fromisoformat(date_str)
-    else:
-        target_date = datetime.now(tz).date()
-
-    start_local = datetime.combine(target_date, time_cls.min).replace(tzinfo=tz)
-    end_local   = start_local + timedelta(days=1)
-
-    start_utc = start_local.astimezone(timezone.utc).isoformat()
-    end_utc   = end_local.astimezone(timezone.utc).isoformat()
-    return (target_date.isoformat(), start_utc, end_utc)
-
 import io
 import csv
-from openpyxl import Workbook
 
 @router.get("/meals/day")
 def get_meals_and_summary_for_day(
+    request: Request,
     date: Optional[str] = Query(
         default=None,
-        description="Fecha en formato YYYY-MM-DD. Por defecto, la fecha actual en America/Lima."
+        description="Fecha en formato YYYY-MM-DD. Por defecto, la fecha actual en la zona del usuario."
     ),
-    tz: str = Query(
-        default="America/Lima",
-        description="Timezone IANA para calcular el día local (ej. America/Lima)."
+    tz: Optional[str] = Query(
+        default=None,
+        description="Timezone IANA para calcular el día local (ej. America/Lima). Por defecto, el del perfil."
     ),
     user_id: str = Depends(get_current_user_id),
 ):
@@ -118,24 +306,147 @@ def get_meals_and_summary_for_day(
     - totals: sumatoria consumida en el día (cal, prot, carb, fat)
     - meals_count: número de comidas del día
     - meals: lista de comidas del día (para listar/depurar/thumbnail)
+
+    Con ETag: sin `date` el contenido cambia a medianoche, así que el día local
+    resuelto (y la zona, si sale del perfil) forma parte del validador.
+    """
+    # la zona del perfil se lee dentro de `load`: un 304 no paga la lectura del perfil
+    zone_parts = _day_zone_parts(user_id, tz, date)
+
+    def load():
+        zone = tz or timezones.user_timezone(user_id)
+        # varias pantallas piden el mismo día a la vez al abrir la app: una sola consulta
+        return singleflight.read(
+            user_id, "meals_day", lambda: _meals_and_summary_for_day(date, zone, user_id),
+            date, zone, date or timezones.today(zone),
+        )
+
+    return etags.conditional(request, user_id, "meals_day", load, *zone_parts, storage.url_window())
+
+
+def _day_zone_parts(user_id: str, tz: Optional[str], date: Optional[str]) -> tuple:
     """
+    Partes del validador de /meals/day que dependen de la zona, sin leer el perfil.
+
+    - `tz` explícito: la zona y el día local.
+    - Zona del perfil en caché: la zona, su vencimiento (otro worker pudo
+      cambiarla; al recargarse la caché cambia el ETag) y el día local.
+    - Sin caché: no se sabe cuándo es medianoche para el usuario, así que sin
+      `date` se usa el cuarto de hora UTC, que cambia en toda medianoche local.
+    """
+    if tz:
+        return tz, date or timezones.today(tz)
+    cached = timezones.cached_user_timezone(user_id)
+    if cached is not None:
+        zone, expires_at = cached
+        return zone, expires_at, date or timezones.today(zone)
+    return ("profile", date or timezones.quarter_hour())
+
+
+STREAM_HEARTBEAT_S = float(os.getenv("EVENTS_HEARTBEAT_S", "15"))
+STREAM_MAX_PER_USER = int(os.getenv("EVENTS_MAX_STREAMS_PER_USER", "5"))
+# cada cuánto se revisa drenado/desconexión/cambio de día aunque no lleguen eventos
+STREAM_TICK_S = min(1.0, STREAM_HEARTBEAT_S)
+
+
+def _sse(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+@router.get("/meals/day/stream")
+async def stream_day_summary(
+    request: Request,
+    date: Optional[str] = Query(default=None, description="YYYY-MM-DD; sin fecha sigue al día actual"),
+    tz: Optional[str] = Query(default=None, description="Timezone IANA; por defecto, el del perfil."),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Server-Sent Events con el resumen del día (mismo cuerpo que /meals/day).
+
+    Envía `event: day_summary` al conectar y otra vez cada vez que cambian las
+    comidas, miniaturas o el perfil del usuario (app/core/events.py); una ráfaga
+    de cambios se coalesce en un solo recálculo. Sin `date` sigue al día local y
+    empuja el resumen nuevo a medianoche. Cada EVENTS_HEARTBEAT_S manda un
+    comentario `: ping` para que proxies y el cliente no corten la conexión.
+    El stream termina al desconectarse el cliente o al drenar el worker (el
+    cliente reconecta a otro). 429 con más de EVENTS_MAX_STREAMS_PER_USER
+    streams abiertos del usuario en el worker.
+    """
+    broker = events.get_broker()
+    if broker.subscribers(user_id) >= STREAM_MAX_PER_USER:
+        raise HTTPException(status_code=429, detail="Demasiados streams abiertos.", headers={"Retry-After": "30"})
+
+    def load():
+        # sin `tz` se relee la zona del perfil en cada recálculo: un cambio de zona se aplica al momento
+        zone = tz or timezones.user_timezone(user_id)
+        return singleflight.read(
+            user_id, "meals_day", lambda: _meals_and_summary_for_day(date, zone, user_id), date, zone,
+            date or timezones.today(zone),
+        )
+
+    # suscribirse antes de la primera lectura: un cambio intermedio no se pierde
+    subscription = broker.subscribe(user_id)
+    try:
+        summary = await run_in_threadpool(load)
+    except BaseException:
+        broker.unsubscribe(subscription)
+        raise
+
+    async def body():
+        nonlocal summary
+        try:
+            yield b"retry: 5000\n\n" + _sse("day_summary", summary)
+            last_sent = time.monotonic()
+            while not lifecycle.is_draining():
+                event = await subscription.get(STREAM_TICK_S)
+                if event is None:
+                    if await request.is_disconnected():
+                        return
+                    if date is None and timezones.today(summary["timezone"]) != summary["date"]:
+                        event = {"kind": "day_changed"}
+                    elif time.monotonic() - last_sent >= STREAM_HEARTBEAT_S:
+                        yield b": ping\n\n"
+                        last_sent = time.monotonic()
+                        continue
+                    else:
+                        continue
+                if any(e is events.CLOSE for e in [event, *subscription.drain()]):
+                    return
+                summary = await run_in_threadpool(load)
+                yield _sse("day_summary", summary)
+                last_sent = time.monotonic()
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: que nginx no acumule el stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # por si el cliente se va antes del primer chunk (el generador nunca arranca)
+        background=BackgroundTask(broker.unsubscribe, subscription),
+    )
+
+
+def _meals_and_summary_for_day(date: Optional[str], tz: str, user_id: str):
     try:
         # Rango del día en UTC (robusto vs date(date_creation) = ...)
-        local_date, start_utc, end_utc = _day_range_utc(date, tz)
+        local_date, start_utc, end_utc = timezones.day_range_utc(date, tz)
 
         # 1) Traer comidas del día del usuario
-        meals_res = (
-            supabase.table("meals")
-            .select(
-                "id,user_id,date_creation,img_url,recommendation,"
-                "total_calories,total_carbs_g,total_fat_g,total_protein_g"
+        with span("db"):
+            meals_res = (
+                supabase.table("meals")
+                .select(
+                    "id,user_id,date_creation,img_url,thumb_url,recommendation,"
+                    "total_calories,total_carbs_g,total_fat_g,total_protein_g"
+                )
+                .eq("user_id", user_id)
+                .gte("date_creation", start_utc)
+                .lt("date_creation", end_utc)
+                .order("date_creation", desc=False)
+                .execute()
             )
-            .eq("user_id", user_id)
-            .gte("date_creation", start_utc)
-            .lt("date_creation", end_utc)
-            .order("date_creation", desc=False)
-            .execute()
-        )
         meals = meals_res.data or []
 
         # 2) Sumar totales
@@ -154,15 +465,16 @@ def get_meals_and_summary_for_day(
 
         # 3) Traer objetivos del usuario para las barras (y header “bonito”)
         #    Usamos columnas ya calculadas si existen en tu tabla users.
-        user_res = (
-            supabase.table("users")
-            .select(
-                "required_calories,required_protein_g,required_fat_g,required_carbs_g,"
-                "objective_id,activity_level_id"
+        with span("db"):
+            user_res = (
+                supabase.table("users")
+                .select(
+                    "required_calories,required_protein_g,required_fat_g,required_carbs_g,"
+                    "objective_id,activity_level_id"
+                )
+                .eq("id", user_id)
+                .execute()
             )
-            .eq("id", user_id)
-            .execute()
-        )
         user_row = (user_res.data or [{}])[0]
 
         targets = {
@@ -180,7 +492,7 @@ def get_meals_and_summary_for_day(
             "targets": targets,
             "totals": totals,
             "meals_count": len(meals),
-            "meals": meals,
+            "meals": storage.sign_rows(meals),
         }
 
     except APIError as e:
@@ -193,56 +505,6 @@ def get_meals_and_summary_for_day(
         )
         
 
-def _range_utc(
-    from_date: Optional[str],
-    to_date: Optional[str],
-    tz_name: str,
-) -> Optional[tuple[str, str]]:
-    """
-    Convierte un rango local [from_date, to_date] a rango UTC [start, end).
-
-    - from_date/to_date: YYYY-MM-DD
-    - Si ambos son None: devuelve None → se interpreta como "todo".
-    - Si solo from_date: to_date = from_date.
-
-    Devuelve (start_utc_iso, end_utc_iso).
-    """
-    if not from_date and not to_date:
-        return None  # sin filtro por fecha
-
-    tz = resolve_tz(tz_name)
-
-    if not from_date and to_date:
-        # si solo llega to_date, usamos ese día como único día
-        from_date = to_date
-
-    # Asegurar a los type checkers que from_date ya no es None
-    assert from_date is not None
-
-    start_date = date_cls.fromisoformat(from_date)
-    end_date = date_cls.fromisoformat(to_date) if to_date else start_date
-
-    if end_date < start_date:
-        raise ValueError("to_date no puede ser anterior a from_date")
-
-    start_local = datetime.combine(start_date, time_cls.min).replace(tzinfo=tz)
-    end_local = datetime.combine(end_date + timedelta(days=1), time_cls.min).replace(tzinfo=tz)
-
-    start_utc = start_local.astimezone(timezone.utc).isoformat()
-    end_utc = end_local.astimezone(timezone.utc).isoformat()
-    return start_utc, end_utc
-
-
-def _local_date_time(iso_str: str, tz_name: str) -> tuple[str, str]:
-    """
-    Convierte date_creation ISO (UTC u offset) a (fecha_local, hora_local) en tz_name.
-    """
-    tz = resolve_tz(tz_name)
-    dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
-    dt_local = dt.astimezone(tz)
-    return dt_local.date().isoformat(), dt_local.strftime("%H:%M")
-
-
 @router.get("/meals/export_history")
 def export_meals_history(
     from_date: Optional[str] = Query(
@@ -258,9 +520,9 @@ def export_meals_history(
         regex="^(csv|xlsx)$",
         description="Formato de exportación: csv o xlsx"
     ),
-    tz: str = Query(
-        default="America/Lima",
-        description="Timezone IANA para mostrar fecha/hora (ej. America/Lima)."
+    tz: Optional[str] = Query(
+        default=None,
+        description="Timezone IANA para mostrar fecha/hora (ej. America/Lima). Por defecto, el del perfil."
     ),
     user_id: str = Depends(get_current_user_id),
 ):
@@ -270,6 +532,7 @@ def export_meals_history(
     - Si NO se envían from_date/to_date -> TODO el historial.
     - Si se envía from_date (y opcional to_date) -> comidas solo en ese rango local.
     """
+    tz = tz or timezones.user_timezone(user_id)
     try:
         # 1) Construir query base
         query = (
@@ -282,14 +545,17 @@ def export_meals_history(
         )
 
         # 2) Aplicar rango si corresponde
-        range_utc = _range_utc(from_date, to_date, tz)
+        range_utc = timezones.range_utc(from_date, to_date, tz)
         if range_utc is not None:
             start_utc, end_utc = range_utc
             query = query.gte("date_creation", start_utc).lt("date_creation", end_utc)
 
         # 3) Ejecutar query
-        meals_res = query.order("date_creation", desc=False).execute()
+        with span("db"):
+            meals_res = query.order("date_creation", desc=False).execute()
         meals = meals_res.data or []
+        # fecha/hora local de toda la columna de una vez (tabla de días, no tz por fila)
+        local_times = timezones.local_date_times([m["date_creation"] for m in meals], tz)
 
         # 4) Metadata para el archivo
         if from_date or to_date:
@@ -314,8 +580,7 @@ def export_meals_history(
                 "Grasas (g)",
             ])
 
-            for m in meals:
-                fecha_local, hora_local = _local_date_time(m["date_creation"], tz)
+            for m, (fecha_local, hora_local) in zip(meals, local_times):
                 writer.writerow([
                     fecha_local,
                     hora_local,
@@ -335,7 +600,9 @@ def export_meals_history(
                 },
             )
 
-        # 6) XLSX
+        # 6) XLSX (openpyxl se importa solo aquí: pesa ~100 ms en el arranque)
+        from openpyxl import Workbook
+
         wb = Workbook()
         ws = wb.active
         ws.title = "Historial comidas"
@@ -359,8 +626,7 @@ def export_meals_history(
             ws.cell(row=header_row, column=col, value=h)
 
         row = header_row + 1
-        for m in meals:
-            fecha_local, hora_local = _local_date_time(m["date_creation"], tz)
+        for m, (fecha_local, hora_local) in zip(meals, local_times):
             ws.cell(row=row, column=1, value=fecha_local)
             ws.cell(row=row, column=2, value=hora_local)
             ws.cell(row=row, column=3, value=m["id"])
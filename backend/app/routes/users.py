@@ -1,12 +1,13 @@
-from fastapi import APIRouter, HTTPException, Header, Depends, Query
+from fastapi import APIRouter, HTTPException, Header, Depends, Query, Request
 from app.utils.nutrition import calculate_nutrition_targets
 from app.core.supabase import verify_token, supabase
+from app.core.instrumentation import span
+from app.core import etags, events, singleflight, timezones
 from app.models.user import UserCreate
 from postgrest.exceptions import APIError
 
+import logging
 from typing import Optional
-from datetime import datetime, date as date_cls, time as time_cls, timedelta, timezone
-from zoneinfo import ZoneInfo
 
 router = APIRouter()
 
@@ -17,18 +18,20 @@ def get_current_user_id(authorization: str = Header(...)) -> str:
 
 @router.post("/users")
 def create_user(user: UserCreate, user_id: str = Depends(get_current_user_id)):
-    print(f"Creating user with ID: {user_id}")
-    user_data = user.model_dump()
+    logging.info("Creating user", extra={"user_id": user_id})
+    user_data = user.model_dump(exclude_none=True)  # sin timezone: se conserva el guardado
     user_data["id"] = user_id
     
-    print(user_data)
-    
     macros = calculate_nutrition_targets(user)
     
     full_user = {**user_data, **macros}
     
     try:
-        result = supabase.table("users").upsert(full_user).execute()
+        with span("db"):
+            result = supabase.table("users").upsert(full_user).execute()
+        etags.bump(user_id)
+        timezones.forget_user(user_id)
+        events.publish(user_id, "profile")
         return result.data
     except APIError as e:
         raise HTTPException(
@@ -38,20 +41,24 @@ def create_user(user: UserCreate, user_id: str = Depends(get_current_user_id)):
         
 @router.put("/users/edit_profile")
 def update_user(user: UserCreate, user_id: str = Depends(get_current_user_id)):
-    print(f"Updating user with ID: {user_id}")
-    user_data = user.model_dump()
+    logging.info("Updating user", extra={"user_id": user_id})
+    user_data = user.model_dump(exclude_none=True)  # sin timezone: se conserva el guardado
     
     macros = calculate_nutrition_targets(user)
     
     full_user = {**user_data, **macros}
     
     try:
-        result = (
-            supabase.table("users")
-            .update(full_user)
-            .eq("id", user_id)
-            .execute()
-        )
+        with span("db"):
+            result = (
+                supabase.table("users")
+                .update(full_user)
+                .eq("id", user_id)
+                .execute()
+            )
+        etags.bump(user_id)
+        timezones.forget_user(user_id)
+        events.publish(user_id, "profile")
         return result.data
     except APIError as e:
         raise HTTPException(
@@ -60,24 +67,31 @@ def update_user(user: UserCreate, user_id: str = Depends(get_current_user_id)):
         )
     
 @router.get("/users/me")
-def get_current_user(user_id: str = Depends(get_current_user_id)):
+def get_current_user(request: Request, user_id: str = Depends(get_current_user_id)):
+    return etags.conditional(
+        request, user_id, "users_me", lambda: singleflight.read(user_id, "users_me", lambda: _load_user(user_id))
+    )
+
+
+def _load_user(user_id: str):
     try:
         # Embeds: usa las FKs users.activity_level_id -> activity_levels.id
         # y users.objective_id -> objectives.id
-        res = (
-            supabase.table("users")
-            .select(
-                "id,name,age,height_cm,weight_kg,gender,"
-                "required_calories,required_protein_g,required_fat_g,required_carbs_g,"
-                "activity_levels_id:activity_level_id(id),"
-                "activity_levels:activity_level_id(name),"
-                "objectives_id:objective_id(id),"
-                "objectives:objective_id(name)"
+        with span("db"):
+            res = (
+                supabase.table("users")
+                .select(
+                    "id,name,age,height_cm,weight_kg,gender,"
+                    "required_calories,required_protein_g,required_fat_g,required_carbs_g,timezone,"
+                    "activity_levels_id:activity_level_id(id),"
+                    "activity_levels:activity_level_id(name),"
+                    "objectives_id:objective_id(id),"
+                    "objectives:objective_id(name)"
+                )
+                .eq("id", user_id)
+                .single()
+                .execute()
             )
-            .eq("id", user_id)
-            .single()
-            .execute()
-        )
 
         if res.data is None:
             raise HTTPException(status_code=404, detail="User not found")
@@ -102,6 +116,7 @@ def get_current_user(user_id: str = Depends(get_current_user_id)):
             "objective_id": (row.get("objectives_id") or {}).get("id"),
             "activity_level": (row.get("activity_levels") or {}).get("name"),
             "objective": (row.get("objectives") or {}).get("name"),
+            "timezone": row.get("timezone") or timezones.DEFAULT_TZ,
         }
         
         return payload
@@ -112,4 +127,61 @@ def get_current_user(user_id: str = Depends(get_current_user_id)):
             detail=f"Error fetching user: {e.message or 'Unknown error'}"
         )
         
-        
\ No newline at end of file
+        
+
+FOOD_STATS_SORT = {"frequent": "item_count", "recent": "last_seen"}
+
+
+@router.get("/users/me/food_stats")
+def get_food_stats(
+    request: Request,
+    sort: str = Query(default="frequent", pattern="^(frequent|recent)$"),
+    limit: int = Query(default=20, ge=1, le=200),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Alimentos del usuario con cuántas veces aparecen, la porción y macros promedio
+    y la última vez que los comió. Lee user_food_stats (sql/007_user_food_stats.sql),
+    que un trigger mantiene al guardar y borrar comidas.
+    """
+    def load():
+        try:
+            with span("db"):
+                res = (
+                    supabase.table("user_food_stats")
+                    .select("*")
+                    .eq("user_id", user_id)
+                    .order(FOOD_STATS_SORT[sort], desc=True)
+                    .limit(limit)
+                    .execute()
+                )
+        except APIError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching food stats: {e.message or 'Unknown error'}"
+            )
+        return {"foods": [_food_stats_row(row) for row in res.data or []]}
+
+    return etags.conditional(
+        request, user_id, "food_stats",
+        lambda: singleflight.read(user_id, "food_stats", load, sort, limit),
+    )
+
+
+def _food_stats_row(row: dict) -> dict:
+    # La tabla guarda sumas (para poder restar al borrar); aquí se pasan a promedios
+    count = int(row.get("item_count") or 0)
+
+    def avg(column: str) -> float:
+        return round(float(row.get(column) or 0) / count, 2) if count else 0.0
+
+    return {
+        "name": row.get("name"),
+        "count": count,
+        "avg_grams": avg("total_grams"),
+        "avg_calories": avg("total_calories"),
+        "avg_protein_g": avg("total_protein_g"),
+        "avg_carbs_g": avg("total_carbs_g"),
+        "avg_fat_g": avg("total_fat_g"),
+        "last_seen": row.get("last_seen"),
+    }
@@ -0,0 +1,88 @@
+"""
+Entrypoint de producción: `python -m app.serve`.
+
+Pre-forkea N workers uvicorn detrás del supervisor de procesos de uvicorn (que
+reinicia los workers que terminan). Cada worker hace warmup antes de aceptar
+tráfico y se recicla tras MAX_REQUESTS (+ jitter) requests (ver app.core.lifecycle).
+
+Variables de entorno:
+    PORT                  puerto (Railway lo inyecta), por defecto 8000
+    WEB_CONCURRENCY       número de workers; si no se define se calcula por CPU
+    MAX_WORKERS           tope para el cálculo automático (por defecto 8)
+    MAX_REQUESTS          reciclar el worker tras N requests (0 = nunca)
+    MAX_REQUESTS_JITTER   requests extra aleatorios por worker (por defecto N/10)
+    GRACEFUL_TIMEOUT      segundos para terminar requests en curso al drenar
+    DRAIN_DELAY_S         segundos con readiness en 503 antes de cerrar el socket
+"""
+import math
+import os
+from typing import Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """Límite de CPU del contenedor (cgroup v2 o v1), si existe."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as fh:
+            quota, period = fh.read().split()
+            if quota != "max":
+                return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as fh:
+            quota = int(fh.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as fh:
+            period = int(fh.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def worker_count() -> int:
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(int(configured), 1)
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(math.ceil(limit), 1))
+    return max(1, min(cpus, int(os.getenv("MAX_WORKERS", "8"))))
+
+
+def main() -> None:
+    workers = worker_count()
+    max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+    # los workers leen estas variables (spawn hereda el entorno del padre)
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    os.environ["MAX_REQUESTS"] = str(max_requests)
+    os.environ.setdefault("MAX_REQUESTS_JITTER", str(max_requests // 10))
+
+    config = uvicorn.Config(
+        "app.main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE", "5")),
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        log_level=os.getenv("LOG_LEVEL", "info"),
+        # la línea de acceso la escribe app.core.logs (JSON, con request_id y muestreo)
+        access_log=False,
+    )
+    server = uvicorn.Server(config)
+    sock = config.bind_socket()
+    # supervisor incluso con 1 worker: así el reciclado por MAX_REQUESTS no tumba el contenedor
+    Multiprocess(config, target=server.run, sockets=[sock]).run()
+
+
+if __name__ == "__main__":
+    main()
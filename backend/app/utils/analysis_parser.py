@@ -0,0 +1,172 @@
+"""
+Parser tolerante para la respuesta del modelo de visión.
+
+Acepta JSON dentro de bloques ```json```, con texto alrededor, comentarios `//`,
+comas colgantes o truncado (se cierran strings/llaves abiertas y, si hace falta,
+se descarta el último elemento incompleto). El resultado se valida contra
+AnalysisResult; los alimentos mal formados se descartan en vez de fallar todo.
+"""
+import json
+import re
+from typing import Any, Iterator, List, Optional
+
+from pydantic import ValidationError
+
+from app.models.analysis import Alimento, AnalysisResult
+
+# Cuántos cortes hacia atrás (por comas) se prueban al reparar un JSON truncado
+MAX_TRUNCATION_CANDIDATES = 8
+
+
+class AnalysisParseError(ValueError):
+    """La respuesta del modelo no pudo convertirse en un análisis válido."""
+
+
+def extract_json_block(text: str) -> str:
+    """
+    Extrae el contenido JSON de un bloque Markdown como ```json ... ```
+    """
+    match = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    # bloque abierto pero nunca cerrado (respuesta truncada)
+    match = re.search(r"```(?:json)?\s*(.*)", text, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    return text.strip()
+
+
+def _clean(text: str) -> str:
+    """Quita comentarios `//` y `/* */` y comas colgantes fuera de strings."""
+    out: List[str] = []
+    i, n = 0, len(text)
+    in_str = esc = False
+    while i < n:
+        ch = text[i]
+        if in_str:
+            out.append(ch)
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            i += 1
+            continue
+        if ch == '"':
+            in_str = True
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        elif ch in "}]":
+            # coma colgante: ", }" -> " }"
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _closing_candidates(text: str) -> Iterator[str]:
+    """Genera versiones cerradas de un JSON posiblemente truncado."""
+    stack: List[str] = []
+    cuts = []  # (posición de una coma, cierres necesarios en ese punto)
+    in_str = esc = False
+    for i, ch in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch == "{":
+            stack.append("}")
+        elif ch == "[":
+            stack.append("]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+        elif ch == "," and stack:
+            cuts.append((i, "".join(reversed(stack))))
+
+    yield text + ('"' if in_str else "") + "".join(reversed(stack))
+    for i, closers in reversed(cuts[-MAX_TRUNCATION_CANDIDATES:]):
+        yield text[:i] + closers
+
+
+def _loads_tolerant(text: str) -> Any:
+    body = extract_json_block(text)
+    start = min((i for i in (body.find("{"), body.find("[")) if i != -1), default=-1)
+    if start == -1:
+        raise AnalysisParseError("No se encontró JSON en la respuesta del modelo")
+    body = body[start:]
+
+    try:
+        return json.loads(body)
+    except json.JSONDecodeError:
+        pass
+
+    # texto extra después del JSON: raw_decode se queda con el primer valor completo
+    try:
+        value, _ = json.JSONDecoder().raw_decode(body)
+        return value
+    except json.JSONDecodeError:
+        pass
+
+    cleaned = _clean(body)
+    for candidate in _closing_candidates(cleaned):
+        try:
+            return json.loads(_clean(candidate))
+        except json.JSONDecodeError:
+            continue
+    raise AnalysisParseError("JSON irreparable en la respuesta del modelo")
+
+
+def _validate(data: Any) -> AnalysisResult:
+    if isinstance(data, list):
+        data = {"alimentos": data}
+    if not isinstance(data, dict):
+        raise AnalysisParseError("La respuesta del modelo no es un objeto JSON")
+    raw_items = data.get("alimentos")
+    if not isinstance(raw_items, list):
+        raise AnalysisParseError("La respuesta del modelo no contiene 'alimentos'")
+
+    alimentos = []
+    for raw in raw_items:
+        if not isinstance(raw, dict):
+            continue
+        try:
+            alimentos.append(Alimento.model_validate(raw))
+        except ValidationError:
+            continue
+    if raw_items and not alimentos:
+        raise AnalysisParseError("Ningún alimento válido en la respuesta del modelo")
+    return AnalysisResult(alimentos=alimentos)
+
+
+def parse_analysis(text: Optional[str]) -> AnalysisResult:
+    """Convierte la respuesta cruda del modelo en un AnalysisResult validado."""
+    if text is None or not text.strip():
+        raise AnalysisParseError("Respuesta vacía del modelo")
+    return _validate(_loads_tolerant(text))
+
+
+def is_strict_json(text: str) -> bool:
+    """True si la respuesta ya era JSON limpio (sin reparación)."""
+    try:
+        json.loads(text)
+        return True
+    except (json.JSONDecodeError, TypeError):
+        return False
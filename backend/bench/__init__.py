@@ -0,0 +1,7 @@
+"""
+Suite de benchmarks y pruebas de carga locales.
+
+Levanta la app contra servidores falsos de Supabase (PostgREST, Storage, Auth)
+y de OpenAI con latencias configurables, para medir throughput y latencia sin
+depender de servicios externos. Ver `python -m bench.run --help`.
+"""
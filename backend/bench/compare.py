@@ -0,0 +1,57 @@
+"""
+Compara dos resultados guardados por bench.run (base vs candidato).
+
+    python -m bench.compare bench/results/load-A.json bench/results/load-B.json
+"""
+import argparse
+import json
+
+from bench import report
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def _delta(base, new) -> str:
+    if not base:
+        return "n/a"
+    return f"{(new - base) / base * 100:+.1f}%"
+
+
+def compare(base: dict, new: dict):
+    rows = []
+    for name in sorted(set(base["endpoints"]) | set(new["endpoints"])):
+        b = base["endpoints"].get(name, {})
+        n = new["endpoints"].get(name, {})
+        row = {"endpoint": name}
+        for metric in METRICS:
+            row[metric] = f"{b.get(metric, 0)} -> {n.get(metric, 0)} ({_delta(b.get(metric, 0), n.get(metric, 0))})"
+        rows.append(row)
+    total = {"endpoint": "TOTAL", "rps": f"{base['rps']} -> {new['rps']} ({_delta(base['rps'], new['rps'])})"}
+    for metric in METRICS[1:]:
+        b, n = base["overall"].get(metric, 0), new["overall"].get(metric, 0)
+        total[metric] = f"{b} -> {n} ({_delta(b, n)})"
+    rows.append(total)
+    return rows
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compara dos corridas de bench.run")
+    parser.add_argument("base")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+    with open(args.base, encoding="utf-8") as fh:
+        base = json.load(fh)
+    with open(args.candidate, encoding="utf-8") as fh:
+        new = json.load(fh)
+    print(f"base: {base.get('name')} ({base.get('git')})  candidato: {new.get('name')} ({new.get('git')})")
+    print(report.format_table(compare(base, new), ["endpoint", *METRICS]))
+    lag_b, lag_n = base.get("event_loop_lag", {}), new.get("event_loop_lag", {})
+    print(f"event loop lag p99: {lag_b.get('p99_ms')} -> {lag_n.get('p99_ms')} ms")
+    mem_b, mem_n = base.get("memory", {}), new.get("memory", {})
+    if mem_b or mem_n:
+        print(f"memoria pico: {mem_b.get('peak_mb')} -> {mem_n.get('peak_mb')} MB  "
+              f"por request: {mem_b.get('peak_per_request_mb')} -> {mem_n.get('peak_per_request_mb')} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Servidor falso de OpenAI (/v1/chat/completions) con latencia configurable.
+
+    FAKE_OPENAI_LATENCY=lognormal:2.5:0.5 uvicorn bench.fake_openai:app --port 54322
+
+Si el mensaje incluye una imagen responde con el JSON de 'alimentos'; si no,
+con un texto de recomendación. FAKE_OPENAI_ERROR_RATE inyecta 503 aleatorios.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from bench.latency import parse_latency
+
+VISION_LATENCY = parse_latency(os.getenv("FAKE_OPENAI_LATENCY", "0"))
+TEXT_LATENCY = parse_latency(os.getenv("FAKE_OPENAI_TEXT_LATENCY", os.getenv("FAKE_OPENAI_LATENCY", "0")))
+ERROR_RATE = float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0"))
+
+ANALYSIS = {
+    "alimentos": [
+        {"nombre": "arroz blanco", "cantidad_estimada_gramos": 150, "calorias": 195,
+         "proteinas_g": 4, "carbohidratos_g": 42, "grasas_g": 0},
+        {"nombre": "pollo a la plancha", "cantidad_estimada_gramos": 120, "calorias": 198,
+         "proteinas_g": 37, "carbohidratos_g": 0, "grasas_g": 4},
+        {"nombre": "ensalada", "cantidad_estimada_gramos": 80, "calorias": 20,
+         "proteinas_g": 1, "carbohidratos_g": 4, "grasas_g": 0},
+    ]
+}
+RECOMMENDATION = "Buena fuente de proteína; agrega 50 g de verduras y reduce el arroz en 30 g."
+
+calls = {"vision": 0, "text": 0}
+
+
+def _has_image(messages) -> bool:
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+            return True
+    return False
+
+
+async def chat_completions(request: Request) -> Response:
+    body = await request.json()
+    vision = _has_image(body.get("messages", []))
+    calls["vision" if vision else "text"] += 1
+    await asyncio.sleep((VISION_LATENCY if vision else TEXT_LATENCY)())
+
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        return JSONResponse({"error": {"message": "overloaded", "type": "server_error"}}, status_code=503)
+
+    content = json.dumps(ANALYSIS) if vision else RECOMMENDATION
+    prompt_tokens = 1200 if vision else 450
+    completion_tokens = 180 if vision else 70
+    return JSONResponse({
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    })
+
+
+async def stats(request: Request) -> Response:
+    return JSONResponse(calls)
+
+
+async def health(request: Request) -> Response:
+    return JSONResponse({"ok": True})
+
+
+app = Starlette(routes=[
+    Route("/__health", health),
+    Route("/__stats", stats),
+    Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+])
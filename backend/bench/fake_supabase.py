@@ -0,0 +1,654 @@
+"""
+Servidor falso de Supabase en memoria: PostgREST (/rest/v1), Storage (/storage/v1)
+y Auth (/auth/v1/user), con latencia configurable por servicio.
+
+    FAKE_DB_LATENCY=lognormal:0.008:0.5 FAKE_STORAGE_LATENCY=lognormal:0.06:0.6 \
+        uvicorn bench.fake_supabase:app --port 54321
+
+Los tokens de usuario tienen la forma `user-<n>`; el id del usuario se deriva
+del token de forma determinística. `POST /__seed` carga usuarios y comidas.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from bench.latency import parse_latency
+
+DB_LATENCY = parse_latency(os.getenv("FAKE_DB_LATENCY", "0"))
+STORAGE_LATENCY = parse_latency(os.getenv("FAKE_STORAGE_LATENCY", "0"))
+AUTH_LATENCY = parse_latency(os.getenv("FAKE_AUTH_LATENCY", "0"))
+
+# FKs usadas en los embeds de PostgREST (tabla, columna) -> tabla referenciada
+FOREIGN_KEYS = {
+    ("users", "activity_level_id"): "activity_levels",
+    ("users", "objective_id"): "objectives",
+    ("meal_items", "meal_id"): "meals",
+}
+PRIMARY_KEYS = {"users": "id"}
+
+
+class Store:
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.objects: Dict[str, bytes] = {}
+        self.ids = itertools.count(1)
+        self.change_seq = itertools.count(1)  # public.meal_change_seq
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.tables = {
+                "users": [],
+                "meals": [],
+                "meal_items": [],
+                "activity_levels": [{"id": i, "name": n} for i, n in enumerate(
+                    ["sedentario", "ligera", "moderada", "intensa", "muy intensa"], start=1)],
+                "objectives": [{"id": i, "name": n} for i, n in enumerate(
+                    ["ganar músculo", "perder grasa", "mantener"], start=1)],
+            }
+            self.objects = {}
+
+    def table(self, name: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(name, [])
+
+    def insert(self, name: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = dict(row)
+        if name not in PRIMARY_KEYS and "id" not in row:
+            row["id"] = next(self.ids)
+        if name in ("meals", "meal_tombstones"):
+            self.bump_change(row)
+        if name == "meal_items" and row.get("user_id") is None:
+            # trigger meal_items_set_user_id (sql/006_food_search.sql)
+            meal = next((m for m in reversed(self.table("meals")) if m["id"] == row.get("meal_id")), None)
+            row["user_id"] = meal and meal.get("user_id")
+        self.table(name).append(row)
+        if name == "meal_items":
+            self.food_stats_apply(row, 1)
+        return row
+
+    # Equivalentes de los triggers de sql/004_meal_changes.sql
+    def bump_change(self, row: Dict[str, Any]) -> None:
+        # cada escritura es su propia transacción ya confirmada: el xid es el mismo número
+        row["change_seq"] = next(self.change_seq)
+        row["change_xid"] = row["change_seq"]
+
+    def after_update(self, name: str, rows: List[Dict[str, Any]]) -> None:
+        if name == "meals":
+            for row in rows:
+                self.bump_change(row)
+
+    def after_delete(self, name: str, rows: List[Dict[str, Any]]) -> None:
+        if name == "meal_items":
+            for row in rows:
+                self.food_stats_apply(row, -1)
+        if name == "meals":
+            deleted_at = datetime.now(timezone.utc).isoformat()
+            for row in rows:
+                self.insert("meal_tombstones", {
+                    "meal_id": row["id"], "user_id": row["user_id"], "deleted_at": deleted_at,
+                })
+
+
+    # Equivalente de food_stats_apply (sql/007_user_food_stats.sql); solo insert y delete
+    def food_stats_apply(self, item: Dict[str, Any], sign: int) -> None:
+        key = str(item.get("name") or "").strip().lower()
+        if not item.get("user_id") or not key:
+            return
+        meal = next((m for m in reversed(self.table("meals")) if m["id"] == item.get("meal_id")), None)
+        seen = _coerce(meal.get("date_creation")) if meal and meal.get("date_creation") else None
+        stats = self.table("user_food_stats")
+        row = next((s for s in stats if s["user_id"] == item["user_id"] and s["name"] == key), None)
+        if row is None:
+            if sign < 0:
+                return
+            row = {"user_id": item["user_id"], "name": key, "item_count": 0, "last_seen": None,
+                   **{column: 0.0 for column, _ in FOOD_STATS_SUMS}}
+            stats.append(row)
+        row["item_count"] += sign
+        for column, item_key in FOOD_STATS_SUMS:
+            row[column] += sign * float(item.get(item_key) or 0)
+        if row["item_count"] <= 0:
+            stats.remove(row)
+        elif sign > 0:
+            if seen is not None and (row["last_seen"] is None or seen > _coerce(row["last_seen"])):
+                row["last_seen"] = seen.isoformat()
+        elif seen is None or row["last_seen"] is None or _coerce(row["last_seen"]) <= seen:
+            # se borró la aparición más reciente: buscar la anterior
+            meal_ids = {i["meal_id"] for i in self.table("meal_items") if i is not item
+                        and i.get("user_id") == item["user_id"] and str(i.get("name") or "").strip().lower() == key}
+            dates = [_coerce(m["date_creation"]) for m in self.table("meals")
+                     if m["id"] in meal_ids and m.get("date_creation")]
+            row["last_seen"] = max(dates).isoformat() if dates else None
+
+
+FOOD_STATS_SUMS = (("total_grams", "weight_grams"), ("total_calories", "calories_kcal"),
+                   ("total_protein_g", "protein_g"), ("total_carbs_g", "carbs_g"), ("total_fat_g", "fat_g"))
+
+store = Store()
+
+# Funciones RPC disponibles en /rest/v1/rpc/<nombre>: fn(store, params) -> resultado JSON
+RPC_FUNCTIONS: Dict[str, Callable[[Store, Dict[str, Any]], Any]] = {}
+
+
+def rpc(name: str):
+    def register(fn):
+        RPC_FUNCTIONS[name] = fn
+        return fn
+    return register
+
+
+def user_id_for_token(token: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"nutri-bench/{token}"))
+
+
+# ---------- PostgREST ----------
+
+def _coerce(value: Any) -> Any:
+    if isinstance(value, str):
+        if len(value) >= 19 and value[4] == "-" and value[10] in "T ":
+            try:
+                dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+                return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+            except ValueError:
+                return value
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    return value
+
+
+def _match(row: Dict[str, Any], column: str, expr: str) -> bool:
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    op, _, raw = expr.partition(".")
+    current = row.get(column)
+
+    if op == "is":
+        result = current is None if raw == "null" else str(current).lower() == raw
+    elif op == "in":
+        options = [v.strip().strip('"') for v in raw.strip("()").split(",") if v.strip()]
+        result = str(current) in options
+    elif op in ("like", "ilike"):
+        pattern = raw.replace("*", "%")
+        text = str(current or "")
+        if op == "ilike":
+            pattern, text = pattern.lower(), text.lower()
+        needle = pattern.strip("%")
+        if pattern.startswith("%") and pattern.endswith("%"):
+            result = needle in text
+        elif pattern.endswith("%"):
+            result = text.startswith(needle)
+        elif pattern.startswith("%"):
+            result = text.endswith(needle)
+        else:
+            result = text == needle
+    else:
+        if current is None:
+            return negate
+        a, b = _coerce(current), _coerce(raw)
+        try:
+            result = {
+                "eq": lambda: a == b or str(current) == raw,
+                "neq": lambda: not (a == b or str(current) == raw),
+                "gt": lambda: a > b,
+                "gte": lambda: a >= b,
+                "lt": lambda: a < b,
+                "lte": lambda: a <= b,
+            }[op]()
+        except (KeyError, TypeError):
+            result = False
+    return not result if negate else result
+
+
+def matches_any(row: Dict[str, Any], expr: str, combine=any) -> bool:
+    """Filtro `or=(a.gt.1,and(a.eq.1,b.gt.2))` de PostgREST (con and/or anidados)."""
+    results = []
+    for part in _split_top_level(expr[1:-1]):
+        if part.startswith(("and(", "or(")):
+            head, _, inner = part.partition("(")
+            results.append(matches_any(row, "(" + inner, all if head == "and" else any))
+        else:
+            column, _, condition = part.partition(".")
+            results.append(_match(row, column, condition))
+    return combine(results)
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _project(table: str, row: Dict[str, Any], select: str) -> Dict[str, Any]:
+    if not select or select == "*":
+        return dict(row)
+    out: Dict[str, Any] = {}
+    for item in _split_top_level(select):
+        if "(" in item:
+            head, _, inner = item.partition("(")
+            inner = inner[:-1]
+            alias, _, fk = head.partition(":")
+            fk = fk or alias
+            target = FOREIGN_KEYS.get((table, fk)) or fk
+            ref_value = row.get(fk)
+            ref = next((r for r in store.table(target) if str(r.get("id")) == str(ref_value)), None)
+            out[alias] = _project(target, ref, inner) if ref else None
+        elif item == "*":
+            out.update(row)
+        else:
+            alias, _, column = item.partition(":")
+            column = column or alias
+            out[alias] = row.get(column)
+    return out
+
+
+def _filtered(table: str, params) -> List[Dict[str, Any]]:
+    reserved = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+    rows = store.table(table)
+    for key, value in params.multi_items():
+        if key in reserved:
+            continue
+        if key == "or":
+            rows = [r for r in rows if matches_any(r, value)]
+            continue
+        rows = [r for r in rows if _match(r, key, value)]
+    return rows
+
+
+def _ordered(rows: List[Dict[str, Any]], order: Optional[str]) -> List[Dict[str, Any]]:
+    if not order:
+        return rows
+    for spec in reversed(order.split(",")):
+        column, *mods = spec.split(".")
+        desc = "desc" in mods
+        present = [r for r in rows if r.get(column) is not None]
+        missing = [r for r in rows if r.get(column) is None]
+        present.sort(key=lambda r: _coerce(r.get(column)), reverse=desc)
+        rows = present + missing
+    return rows
+
+
+def _pgrst_response(request: Request, rows: List[Dict[str, Any]], status: int = 200) -> Response:
+    if "vnd.pgrst.object" in request.headers.get("accept", ""):
+        if len(rows) != 1:
+            return JSONResponse(
+                {"code": "PGRST116", "details": f"The result contains {len(rows)} rows",
+                 "hint": None, "message": "JSON object requested, multiple (or no) rows returned"},
+                status_code=406,
+            )
+        return JSONResponse(rows[0], status_code=status)
+    return JSONResponse(rows, status_code=status)
+
+
+async def rest_table(request: Request) -> Response:
+    await asyncio.sleep(DB_LATENCY())
+    table = request.path_params["table"]
+    params = request.query_params
+    select = params.get("select", "*")
+    # el body se lee antes de tomar el lock (no se puede esperar I/O con el lock tomado)
+    raw = await request.body() if request.method in ("POST", "PATCH") else b""
+    body = json.loads(raw) if raw else None
+
+    with store.lock:
+        if request.method == "GET":
+            rows = _ordered(_filtered(table, params), params.get("order"))
+            offset = int(params.get("offset", 0))
+            if "limit" in params:
+                rows = rows[offset: offset + int(params["limit"])]
+            elif offset:
+                rows = rows[offset:]
+            return _pgrst_response(request, [_project(table, r, select) for r in rows])
+
+        if request.method == "POST":
+            payload = body if isinstance(body, list) else [body]
+            prefer = request.headers.get("prefer", "")
+            created = []
+            for item in payload:
+                pk = PRIMARY_KEYS.get(table, "id")
+                existing = None
+                if "merge-duplicates" in prefer and pk in item:
+                    existing = next((r for r in store.table(table) if str(r.get(pk)) == str(item[pk])), None)
+                if existing is not None:
+                    existing.update(item)
+                    created.append(existing)
+                else:
+                    created.append(store.insert(table, item))
+            return _pgrst_response(request, [_project(table, r, select) for r in created], status=201)
+
+        if request.method == "PATCH":
+            rows = _filtered(table, params)
+            for r in rows:
+                r.update(body)
+            store.after_update(table, rows)
+            return _pgrst_response(request, [_project(table, r, select) for r in rows])
+
+        if request.method == "DELETE":
+            rows = _filtered(table, params)
+            ids = {id(r) for r in rows}
+            store.tables[table] = [r for r in store.table(table) if id(r) not in ids]
+            store.after_delete(table, rows)
+            return _pgrst_response(request, [_project(table, r, select) for r in rows])
+
+    return Response(status_code=405)
+
+
+async def rest_rpc(request: Request) -> Response:
+    await asyncio.sleep(DB_LATENCY())
+    fn = RPC_FUNCTIONS.get(request.path_params["fn"])
+    if fn is None:
+        return JSONResponse({"code": "PGRST202", "message": "function not found", "details": None, "hint": None}, status_code=404)
+    body = await request.body()
+    params = json.loads(body) if body else {}
+    with store.lock:
+        try:
+            result = fn(store, params)
+        except ValueError as e:
+            return JSONResponse({"code": "P0001", "message": str(e), "details": None, "hint": None}, status_code=400)
+        except LookupError as e:  # raise ... using errcode = 'P0002'
+            return JSONResponse({"code": "P0002", "message": str(e), "details": None, "hint": None}, status_code=404)
+    return JSONResponse(result)
+
+
+# Equivalentes en memoria de las funciones de backend/sql/ (mismo nombre y parámetros)
+
+@rpc("acquire_image_blob")
+def _acquire_image_blob(store: Store, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    blob = next((b for b in store.table("image_blobs") if b["hash"] == params["p_hash"]), None)
+    if blob is not None:
+        blob["refcount"] += 1
+        return [{"refcount": blob["refcount"], "created": False}]
+    store.table("image_blobs").append({
+        "hash": params["p_hash"], "path": params["p_path"], "size_bytes": params["p_size"],
+        "content_type": params.get("p_content_type"), "refcount": 1,
+    })
+    return [{"refcount": 1, "created": True}]
+
+
+@rpc("release_image_blob")
+def _release_image_blob(store: Store, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    blobs = store.table("image_blobs")
+    blob = next((b for b in blobs if b["hash"] == params["p_hash"]), None)
+    if blob is None:
+        return []
+    blob["refcount"] = max(blob["refcount"] - 1, 0)
+    if blob["refcount"] == 0:
+        blobs.remove(blob)
+    return [{"refcount": blob["refcount"], "path": blob["path"]}]
+
+
+@rpc("save_meal_with_items")
+def _save_meal_with_items(store: Store, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    items = params.get("p_items") or []
+    if not items:
+        raise ValueError("p_items debe ser un arreglo no vacío")
+    totals = {
+        column: sum(float(i.get(item_key) or 0) for i in items)
+        for column, item_key in (("total_calories", "calories_kcal"), ("total_protein_g", "protein_g"),
+                                 ("total_carbs_g", "carbs_g"), ("total_fat_g", "fat_g"))
+    }
+    meal = store.insert("meals", {**params["p_meal"], **totals})
+    for item in items:
+        store.insert("meal_items", {**item, "meal_id": meal["id"]})
+    return [{"meal_id": meal["id"], **totals}]
+
+
+@rpc("relog_meal")
+def _relog_meal(store: Store, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    scale = float(params.get("p_scale") or 1)
+    if not 0 < scale <= 10:
+        raise ValueError("p_scale debe estar entre 0 y 10")
+    source = next((m for m in store.table("meals") if str(m["id"]) == str(params["p_meal_id"])
+                   and m.get("user_id") == params["p_user_id"]), None)
+    if source is None:
+        raise LookupError("Meal not found")
+    items = [i for i in store.table("meal_items") if str(i["meal_id"]) == str(source["id"])]
+    keys = (("total_calories", "calories_kcal"), ("total_protein_g", "protein_g"),
+            ("total_carbs_g", "carbs_g"), ("total_fat_g", "fat_g"))
+    if items:
+        totals = {col: sum(round(float(i.get(k) or 0) * scale, 2) for i in items) for col, k in keys}
+    else:
+        totals = {col: round(float(source.get(col) or 0) * scale, 2) for col, _ in keys}
+    copied = {k: source.get(k) for k in ("user_id", "img_url", "thumb_url", "thumbnails", "image_hash", "recommendation")}
+    meal = store.insert("meals", {**copied, **totals, "date_creation": params.get("p_date_creation")})
+    for item in items:
+        scaled = {k: round(float(item.get(k) or 0) * scale, 2)
+                  for k in ("weight_grams", "calories_kcal", "protein_g", "carbs_g", "fat_g")}
+        store.insert("meal_items", {"meal_id": meal["id"], "name": item.get("name"), **scaled})
+    blob = next((b for b in store.table("image_blobs") if b["hash"] == source.get("image_hash")), None)
+    if blob is not None:
+        blob["refcount"] += 1
+    return [{"meal_id": meal["id"], **totals}]
+
+
+@rpc("search_meals")
+def _search_meals(store: Store, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    user_id, query = params["p_user_id"], str(params["p_query"]).lower()
+    matched: Dict[Any, set] = {}
+    for item in store.table("meal_items"):
+        if item.get("user_id") == user_id and query in str(item.get("name") or "").lower():
+            matched.setdefault(item["meal_id"], set()).add(item["name"])
+    before = None
+    if params.get("p_before_date") is not None:
+        before = (_coerce(params["p_before_date"]), int(params["p_before_id"]))
+    rows = []
+    for meal in store.table("meals"):
+        if meal["id"] not in matched or meal.get("user_id") != user_id:
+            continue
+        key = (_coerce(meal.get("date_creation")), meal["id"])
+        if before is None or key < before:
+            rows.append((key, meal))
+    rows.sort(key=lambda r: r[0], reverse=True)
+    limit = min(max(int(params.get("p_limit") or 20), 1), 100)
+    return [{
+        "meal_id": meal["id"], "date_creation": meal.get("date_creation"),
+        "img_url": meal.get("img_url"), "thumb_url": meal.get("thumb_url"),
+        **{k: meal.get(k) for k in ("total_calories", "total_protein_g", "total_carbs_g", "total_fat_g")},
+        "matched_items": sorted(matched[meal["id"]]),
+    } for _, meal in rows[:limit]]
+
+
+@rpc("rebuild_user_food_stats")
+def _rebuild_user_food_stats(store: Store, params: Dict[str, Any]) -> int:
+    user_id = params.get("p_user_id")
+    store.tables["user_food_stats"] = [
+        s for s in store.table("user_food_stats") if user_id is not None and s["user_id"] != user_id
+    ]
+    before = len(store.table("user_food_stats"))
+    for item in store.table("meal_items"):
+        if user_id is None or item.get("user_id") == user_id:
+            store.food_stats_apply(item, 1)
+    return len(store.table("user_food_stats")) - before
+
+
+@rpc("meal_changes_horizon")
+def _meal_changes_horizon(store: Store, params: Dict[str, Any]) -> int:
+    # sin transacciones abiertas: todo lo escrito ya está por debajo del horizonte
+    return max((r.get("change_xid", 0) for name in ("meals", "meal_tombstones") for r in store.table(name)),
+               default=0) + 1
+
+
+@rpc("image_dedup_stats")
+def _image_dedup_stats(store: Store, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    blobs = store.table("image_blobs")
+    return [{
+        "blobs": len(blobs),
+        "references_count": sum(b["refcount"] for b in blobs),
+        "stored_bytes": sum(b["size_bytes"] for b in blobs),
+        "logical_bytes": sum(b["size_bytes"] * b["refcount"] for b in blobs),
+    }]
+
+
+# ---------- Storage ----------
+
+async def storage_upload(request: Request) -> Response:
+    await asyncio.sleep(STORAGE_LATENCY())
+    bucket, path = request.path_params["bucket"], request.path_params["path"]
+    key = f"{bucket}/{path}"
+    form = await request.form()
+    upload = form.get("file")
+    data = await upload.read() if hasattr(upload, "read") else await request.body()
+    upsert = request.headers.get("x-upsert", "false") == "true"
+    with store.lock:
+        if key in store.objects and not upsert:
+            return JSONResponse({"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"}, status_code=409)
+        store.objects[key] = data
+    return JSONResponse({"Key": key, "Id": str(uuid.uuid4())})
+
+
+async def storage_object(request: Request) -> Response:
+    await asyncio.sleep(STORAGE_LATENCY())
+    key = f"{request.path_params['bucket']}/{request.path_params['path']}"
+    data = store.objects.get(key)
+    if data is None:
+        return JSONResponse({"statusCode": "404", "error": "not_found", "message": "Object not found"}, status_code=404)
+    if request.method == "HEAD":
+        return Response(status_code=200, headers={"content-length": str(len(data))})
+    return Response(data, media_type="application/octet-stream")
+
+
+async def storage_remove(request: Request) -> Response:
+    await asyncio.sleep(STORAGE_LATENCY())
+    bucket = request.path_params["bucket"]
+    body = await request.json()
+    removed = []
+    with store.lock:
+        for path in body.get("prefixes", []):
+            if store.objects.pop(f"{bucket}/{path}", None) is not None:
+                removed.append({"name": path, "bucket_id": bucket})
+    return JSONResponse(removed)
+
+
+async def storage_sign(request: Request) -> Response:
+    await asyncio.sleep(STORAGE_LATENCY())
+    bucket = request.path_params["bucket"]
+    body = await request.json()
+    expires = int(body.get("expiresIn", 60))
+    token = uuid.uuid4().hex
+    if "path" in request.path_params:  # create_signed_url: una sola ruta
+        path = request.path_params["path"]
+        return JSONResponse({"signedURL": f"/object/sign/{bucket}/{path}?token={token}&exp={expires}"})
+    return JSONResponse([
+        {"path": p, "error": None, "signedURL": f"/object/sign/{bucket}/{p}?token={token}&exp={expires}"}
+        for p in body.get("paths", [])
+    ])
+
+
+# ---------- Auth ----------
+
+async def auth_user(request: Request) -> Response:
+    await asyncio.sleep(AUTH_LATENCY())
+    auth = request.headers.get("authorization", "")
+    token = auth.split(" ", 1)[1] if " " in auth else ""
+    if not token.startswith("user-"):
+        return JSONResponse({"code": 401, "error_code": "bad_jwt", "msg": "invalid JWT"}, status_code=401)
+    return JSONResponse({
+        "id": user_id_for_token(token),
+        "aud": "authenticated",
+        "role": "authenticated",
+        "email": f"{token}@bench.local",
+        "app_metadata": {},
+        "user_metadata": {},
+        "created_at": "2024-01-01T00:00:00+00:00",
+    })
+
+
+# ---------- Seed ----------
+
+# JPEG mínimo para las imágenes sembradas (el fake de OpenAI no lo decodifica)
+SEED_IMAGE = b"\xff\xd8\xff\xe0" + bytes(2048) + b"\xff\xd9"
+
+
+def seed(users: int, meals_per_user: int, items_per_meal: int = 3, days: int = 60,
+         images: bool = False) -> Dict[str, Any]:
+    """
+    Crea usuarios `user-<n>` con perfil y un historial de comidas repartido en `days` días.
+    Con `images` también guarda en Storage la imagen de cada comida (para re-analizarlas).
+    """
+    store.reset()
+    now = datetime.now(timezone.utc)
+    foods = ["arroz blanco", "pollo a la plancha", "ensalada", "quinua", "huevo", "pan integral", "palta", "lentejas"]
+    with store.lock:
+        for n in range(users):
+            uid = user_id_for_token(f"user-{n}")
+            store.insert("users", {
+                "id": uid, "name": f"Bench {n}", "age": 30, "height_cm": 170, "weight_kg": 70.0,
+                "gender": "male", "activity_level_id": 2, "objective_id": 3,
+                "required_calories": 2400, "required_protein_g": 112.0,
+                "required_fat_g": 63.0, "required_carbs_g": 345.0, "timezone": "America/Lima",
+            })
+            for m in range(meals_per_user):
+                created = now - timedelta(minutes=int(m * days * 24 * 60 / max(meals_per_user, 1)))
+                meal = store.insert("meals", {
+                    "user_id": uid,
+                    "img_url": f"http://bench.local/storage/v1/object/public/meals/meals/{uid}/{m}.jpg",
+                    "recommendation": "Buena comida",
+                    "total_calories": 600.0, "total_protein_g": 35.0,
+                    "total_carbs_g": 70.0, "total_fat_g": 18.0,
+                    "date_creation": created.isoformat(),
+                })
+                if images:
+                    store.objects[f"meals/meals/{uid}/{m}.jpg"] = SEED_IMAGE
+                for i in range(items_per_meal):
+                    store.insert("meal_items", {
+                        "meal_id": meal["id"], "user_id": uid, "name": foods[(m + i) % len(foods)], "weight_grams": 150,
+                        "calories_kcal": 200, "protein_g": 12, "carbs_g": 23, "fat_g": 6,
+                    })
+    return {"users": users, "meals": users * meals_per_user}
+
+
+async def seed_endpoint(request: Request) -> Response:
+    body = await request.json()
+    return JSONResponse(seed(
+        int(body.get("users", 10)),
+        int(body.get("meals_per_user", 100)),
+        int(body.get("items_per_meal", 3)),
+        int(body.get("days", 60)),
+        bool(body.get("images", False)),
+    ))
+
+
+async def health(request: Request) -> Response:
+    return JSONResponse({"ok": True})
+
+
+app = Starlette(routes=[
+    Route("/__health", health),
+    Route("/__seed", seed_endpoint, methods=["POST"]),
+    Route("/auth/v1/user", auth_user),
+    Route("/rest/v1/rpc/{fn}", rest_rpc, methods=["POST", "GET"]),
+    Route("/rest/v1/{table}", rest_table, methods=["GET", "POST", "PATCH", "DELETE"]),
+    Route("/storage/v1/object/sign/{bucket}", storage_sign, methods=["POST"]),
+    Route("/storage/v1/object/sign/{bucket}/{path:path}", storage_sign, methods=["POST"]),
+    Route("/storage/v1/object/public/{bucket}/{path:path}", storage_object, methods=["GET", "HEAD"]),
+    Route("/storage/v1/object/{bucket}/{path:path}", storage_upload, methods=["POST", "PUT"]),
+    Route("/storage/v1/object/{bucket}/{path:path}", storage_object, methods=["GET", "HEAD"]),
+    Route("/storage/v1/object/{bucket}", storage_remove, methods=["DELETE"]),
+])
@@ -0,0 +1,36 @@
+"""
+Distribuciones de latencia para los servidores falsos.
+
+Formato de la especificación (segundos):
+    "0"                       sin latencia
+    "fixed:0.02"              constante
+    "uniform:0.01:0.05"       uniforme entre min y max
+    "lognormal:0.8:0.4"       lognormal con mediana 0.8 y sigma 0.4 (cola larga)
+"""
+import math
+import random
+from typing import Callable
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    spec = (spec or "0").strip()
+    kind, _, rest = spec.partition(":")
+    args = [float(x) for x in rest.split(":")] if rest else []
+
+    if kind in ("0", "none", ""):
+        return lambda: 0.0
+    if kind == "fixed":
+        value = args[0]
+        return lambda: value
+    if kind == "uniform":
+        low, high = args
+        return lambda: random.uniform(low, high)
+    if kind == "lognormal":
+        median, sigma = args
+        mu = math.log(median)
+        return lambda: random.lognormvariate(mu, sigma)
+    try:
+        value = float(spec)
+        return lambda: value
+    except ValueError:
+        raise ValueError(f"Especificación de latencia inválida: {spec!r}")
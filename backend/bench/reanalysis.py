@@ -0,0 +1,96 @@
+"""
+Corrida de punta a punta del re-análisis offline contra los servidores falsos.
+
+    python -m bench.reanalysis --meals 200 --concurrency 8
+
+Siembra comidas con imagen en el fake de Supabase, lanza
+`python -m app.jobs.reanalyse_meals` con el fake de OpenAI como modelo, lo mata
+(SIGKILL) a mitad de camino, lo relanza con el mismo run-id y comprueba que cada
+comida quedó analizada una sola vez. Imprime el reporte de precisión y latencia
+y lo guarda en bench/results/ igual que bench.run.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench import report, servers
+
+
+def _lines(path: str) -> int:
+    try:
+        with open(path) as fh:
+            return sum(1 for _ in fh)
+    except FileNotFoundError:
+        return 0
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default="reanalysis")
+    parser.add_argument("--meals", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--openai-latency", default="lognormal:0.3:0.4")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="reanalysis-")
+    run_dir = os.path.join(work, "bench")
+    cmd = [sys.executable, "-m", "app.jobs.reanalyse_meals", "--run-id", "bench", "--out-dir", work,
+           "--concurrency", str(args.concurrency), "--batch-size", str(args.batch_size)]
+    try:
+        with servers.fakes({"openai": args.openai_latency, "storage": "fixed:0.005"}) as urls:
+            httpx.post(f"{urls['supabase_url']}/__seed",
+                       json={"users": 4, "meals_per_user": args.meals // 4, "images": True}).raise_for_status()
+            env = {**os.environ, **servers.app_env(urls["supabase_url"], urls["openai_url"], {
+                "MODEL_LEDGER_PATH": os.path.join(work, "ledger.sqlite3"),
+            })}
+
+            started = time.monotonic()
+            proc = subprocess.Popen(cmd, cwd=servers.BACKEND_DIR, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            results = os.path.join(run_dir, "results.jsonl")
+            while _lines(results) < args.meals // 3 and proc.poll() is None:
+                time.sleep(0.05)
+            proc.send_signal(signal.SIGKILL)
+            proc.wait()
+            before_kill = _lines(results)
+
+            resumed = subprocess.run(cmd, cwd=servers.BACKEND_DIR, env=env, capture_output=True, text=True)
+            elapsed = time.monotonic() - started
+            if resumed.returncode != 0:
+                raise RuntimeError(resumed.stderr[-2000:])
+
+        with open(results) as fh:
+            ids = [json.loads(line)["meal_id"] for line in fh if line.strip()]
+        with open(os.path.join(run_dir, "report.json")) as fh:
+            data = json.load(fh)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    result = {
+        "name": args.name,
+        "git": report.git_revision(),
+        "meals": args.meals,
+        "concurrency": args.concurrency,
+        "lines_before_kill": before_kill,
+        "lines_total": len(ids),
+        "distinct_meals": len(set(ids)),
+        "wall_s": round(elapsed, 2),
+        "report": data["summary"],
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    path = report.save_result(result, args.out, args.name)
+    print(f"resultado guardado en {path}")
+
+
+if __name__ == "__main__":
+    main()
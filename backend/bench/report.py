@@ -0,0 +1,115 @@
+"""Utilidades de reporte: percentiles, parseo de histogramas de /metrics y guardado de resultados."""
+import json
+import os
+import re
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+([-+0-9.eEinfINFaN]+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize_latencies(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 0.50), 2),
+        "p95_ms": round(1000 * percentile(values, 0.95), 2),
+        "p99_ms": round(1000 * percentile(values, 0.99), 2),
+        "max_ms": round(1000 * max(values), 2) if values else 0.0,
+    }
+
+
+def parse_metrics(text: str) -> List[Tuple[str, Dict[str, str], float]]:
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE_RE.match(line.strip())
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        samples.append((name, dict(_LABEL_RE.findall(labels or "")), float(value)))
+    return samples
+
+
+def histogram_buckets(samples, name: str, **labels) -> Dict[float, float]:
+    """Suma los buckets acumulados de un histograma filtrando por etiquetas."""
+    buckets: Dict[float, float] = {}
+    for sample_name, sample_labels, value in samples:
+        if sample_name != f"{name}_bucket":
+            continue
+        if any(sample_labels.get(k) != v for k, v in labels.items()):
+            continue
+        le = sample_labels.get("le", "+Inf")
+        bound = float("inf") if le == "+Inf" else float(le)
+        buckets[bound] = buckets.get(bound, 0.0) + value
+    return buckets
+
+
+def diff_buckets(after: Dict[float, float], before: Dict[float, float]) -> Dict[float, float]:
+    return {b: after[b] - before.get(b, 0.0) for b in after}
+
+
+def bucket_quantile(buckets: Dict[float, float], q: float) -> Optional[float]:
+    """Cuantil aproximado (interpolación lineal dentro del bucket, como histogram_quantile)."""
+    if not buckets:
+        return None
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    if total <= 0:
+        return None
+    rank = q * total
+    prev_bound, prev_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return prev_bound
+            if count == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+        prev_bound, prev_count = bound, count
+    return bounds[-2] if len(bounds) > 1 else None
+
+
+def gauge_value(samples, name: str) -> Optional[float]:
+    values = [v for n, _, v in samples if n == name]
+    return max(values) if values else None
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def save_result(result: Dict[str, Any], out_dir: str, name: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(out_dir, f"{name}-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(result, fh, indent=2, ensure_ascii=False)
+    return path
+
+
+def format_table(rows: Iterable[Dict[str, Any]], columns: List[str]) -> str:
+    rows = list(rows)
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) if rows else len(c) for c in columns}
+    lines = ["  ".join(c.rjust(widths[c]) for c in columns)]
+    lines.append("  ".join("-" * widths[c] for c in columns))
+    for r in rows:
+        lines.append("  ".join(str(r.get(c, "")).rjust(widths[c]) for c in columns))
+    return "\n".join(lines)
@@ -0,0 +1,262 @@
+"""
+Prueba de carga de la API contra los servidores falsos.
+
+    python -m bench.run --duration 30 --concurrency 32 \
+        --mix analyse_meal=1,save_analysis=1,meals_day=5,history=3,export=0.5 \
+        --openai-latency lognormal:2.5:0.5 --db-latency lognormal:0.01:0.5
+
+Reporta RPS, p50/p95/p99 por endpoint y lag del event loop de la app, y guarda
+el resultado en bench/results/ para compararlo con `python -m bench.compare`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from bench import report, servers
+
+DEFAULT_MIX = "analyse_meal=1,save_analysis=1,meals_day=5,history=3,export=0.5"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+ANALYSIS = json.dumps({
+    "alimentos": [
+        {"nombre": "arroz blanco", "cantidad_estimada_gramos": 150, "calorias": 195,
+         "proteinas_g": 4, "carbohidratos_g": 42, "grasas_g": 0},
+        {"nombre": "pollo a la plancha", "cantidad_estimada_gramos": 120, "calorias": 198,
+         "proteinas_g": 37, "carbohidratos_g": 0, "grasas_g": 4},
+    ]
+})
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(REQUESTS)
+    if unknown:
+        raise SystemExit(f"Endpoints desconocidos en --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def _image(size: int) -> bytes:
+    # bytes aleatorios con cabecera JPEG: el backend no decodifica la imagen al analizar
+    return b"\xff\xd8\xff\xe0" + os.urandom(max(size - 4, 0))
+
+
+async def _analyse_meal(client: httpx.AsyncClient, headers, ctx) -> httpx.Response:
+    files = {"image": ("meal.jpg", ctx["image"], "image/jpeg")}
+    return await client.post("/api/analyse_meal", files=files, headers=headers)
+
+
+async def _save_analysis(client, headers, ctx) -> httpx.Response:
+    files = {"image": ("meal.jpg", _image(len(ctx["image"])), "image/jpeg")}
+    data = {"analysis": ANALYSIS, "recommendation": "Buena comida"}
+    return await client.post("/api/save_analysis", files=files, data=data, headers=headers)
+
+
+async def _meals_day(client, headers, ctx) -> httpx.Response:
+    return await client.get("/api/meals/day", headers=headers)
+
+
+async def _history(client, headers, ctx) -> httpx.Response:
+    return await client.get("/api/history_meals", headers=headers)
+
+
+async def _export(client, headers, ctx) -> httpx.Response:
+    fmt = random.choice(("csv", "xlsx"))
+    return await client.get(f"/api/meals/export_history?format={fmt}", headers=headers)
+
+
+REQUESTS = {
+    "analyse_meal": _analyse_meal,
+    "save_analysis": _save_analysis,
+    "meals_day": _meals_day,
+    "history": _history,
+    "export": _export,
+}
+
+
+async def drive(app_url: str, mix: Dict[str, float], users: int, concurrency: int,
+                duration: float, warmup: float, image_bytes: int) -> Tuple[List[Tuple[str, int, float]], float]:
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    ctx = {"image": _image(image_bytes)}
+    samples: List[Tuple[str, int, float]] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=120.0, limits=limits) as client:
+        async def worker(stop_at: float, record: bool) -> None:
+            while time.perf_counter() < stop_at:
+                name = random.choices(names, weights)[0]
+                headers = {"Authorization": f"Bearer user-{random.randrange(users)}"}
+                start = time.perf_counter()
+                try:
+                    resp = await REQUESTS[name](client, headers, ctx)
+                    status = resp.status_code
+                except httpx.HTTPError:
+                    status = 0
+                if record:
+                    samples.append((name, status, time.perf_counter() - start))
+
+        if warmup > 0:
+            await asyncio.gather(*(worker(time.perf_counter() + warmup, False) for _ in range(concurrency)))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(started + duration, True) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+class MemorySampler:
+    """Muestrea el RSS de la app durante la corrida (VmHWM incluye el arranque)."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid, self.interval = pid, interval
+        self.baseline = servers.memory_mb(pid).get("VmRSS")
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            rss = servers.memory_mb(self.pid).get("VmRSS")
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def __enter__(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def result(self, concurrency: int) -> Dict[str, Any]:
+        if self.baseline is None or self.peak is None:
+            return {}
+        growth = self.peak - self.baseline
+        return {
+            "baseline_mb": self.baseline,
+            "peak_mb": self.peak,
+            # aproximación: el crecimiento del pico repartido entre los requests concurrentes
+            "peak_per_request_mb": round(growth / max(concurrency, 1), 2),
+        }
+
+
+def loop_lag(before: str, after: str) -> Dict[str, Any]:
+    b, a = report.parse_metrics(before), report.parse_metrics(after)
+    buckets = report.diff_buckets(
+        report.histogram_buckets(a, "event_loop_lag_seconds"),
+        report.histogram_buckets(b, "event_loop_lag_seconds"),
+    )
+    max_lag = report.gauge_value(a, "event_loop_lag_max_seconds")
+    out = {}
+    for label, q in (("p50_ms", 0.5), ("p99_ms", 0.99)):
+        value = report.bucket_quantile(buckets, q)
+        if value is not None and max_lag is not None:
+            value = min(value, max_lag)  # la interpolación por buckets puede pasarse del máximo real
+        out[label] = round(value * 1000, 2) if value is not None else None
+    out["max_ms"] = round(max_lag * 1000, 2) if max_lag is not None else None
+    return out
+
+
+def build_result(args, samples, elapsed, lag, memory=None) -> Dict[str, Any]:
+    per_endpoint: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    for name, status, latency in samples:
+        per_endpoint.setdefault(name, []).append(latency)
+        if status == 0 or status >= 400:
+            errors[name] = errors.get(name, 0) + 1
+
+    endpoints = {}
+    for name, values in sorted(per_endpoint.items()):
+        endpoints[name] = {**report.summarize_latencies(values), "errors": errors.get(name, 0),
+                           "rps": round(len(values) / elapsed, 2)}
+
+    return {
+        "name": args.name,
+        "git": report.git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        "elapsed_s": round(elapsed, 2),
+        "requests": len(samples),
+        "errors": sum(errors.values()),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "overall": report.summarize_latencies([s[2] for s in samples]),
+        "endpoints": endpoints,
+        "event_loop_lag": lag,
+        "memory": memory or {},
+    }
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    rows = [{"endpoint": name, **stats} for name, stats in result["endpoints"].items()]
+    print(report.format_table(rows, ["endpoint", "count", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"]))
+    print()
+    print(f"total: {result['requests']} requests, {result['errors']} errores, {result['rps']} req/s")
+    lag = result["event_loop_lag"]
+    print(f"event loop lag: p50={lag.get('p50_ms')} ms  p99={lag.get('p99_ms')} ms  max={lag.get('max_ms')} ms")
+    mem = result.get("memory") or {}
+    if mem:
+        print(f"memoria app: base={mem['baseline_mb']} MB  pico={mem['peak_mb']} MB  "
+              f"pico por request concurrente≈{mem['peak_per_request_mb']} MB")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default="load")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--meals-per-user", type=int, default=200)
+    parser.add_argument("--image-kb", type=int, default=300)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--db-latency", default="lognormal:0.008:0.5")
+    parser.add_argument("--storage-latency", default="lognormal:0.05:0.6")
+    parser.add_argument("--auth-latency", default="lognormal:0.01:0.4")
+    parser.add_argument("--openai-latency", default="lognormal:2.0:0.5")
+    parser.add_argument("--openai-text-latency", default="lognormal:1.0:0.4")
+    parser.add_argument("--openai-error-rate", default="0")
+    parser.add_argument("--app-arg", action="append", default=[], help="Argumento extra para uvicorn (repetible)")
+    parser.add_argument("--app-env", action="append", default=[], help="KEY=VALUE extra para la app (repetible)")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    latencies = {
+        "db": args.db_latency,
+        "storage": args.storage_latency,
+        "auth": args.auth_latency,
+        "openai": args.openai_latency,
+        "openai_text": args.openai_text_latency,
+        "openai_error_rate": args.openai_error_rate,
+    }
+    app_env = dict(kv.split("=", 1) for kv in args.app_env)
+
+    with servers.stack(latencies, app_env, args.app_arg) as stack:
+        httpx.post(f"{stack['supabase_url']}/__seed", json={
+            "users": args.users, "meals_per_user": args.meals_per_user,
+        }, timeout=120.0).raise_for_status()
+
+        before = httpx.get(f"{stack['app_url']}/metrics").text
+        with MemorySampler(stack["app_proc"].pid) as memory:
+            samples, elapsed = asyncio.run(drive(
+                stack["app_url"], mix, args.users, args.concurrency, args.duration, args.warmup, args.image_kb * 1024,
+            ))
+        after = httpx.get(f"{stack['app_url']}/metrics").text
+
+    result = build_result(args, samples, elapsed, loop_lag(before, after), memory.result(args.concurrency))
+    print_result(result)
+    path = report.save_result(result, args.out, args.name)
+    print(f"\nresultado guardado en {path}")
+
+
+if __name__ == "__main__":
+    main()
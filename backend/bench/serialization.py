@@ -0,0 +1,128 @@
+"""
+Micro-benchmark de serialización y compresión de un historial largo.
+
+    python -m bench.serialization --meals 1000 --runs 50
+
+Con filas como las de `select *` de `meals`, mide (mediana de --runs):
+- encode_ms: el camino por defecto de FastAPI (jsonable_encoder + json.dumps)
+  frente a `app.core.responses.dumps` (orjson)
+- bytes en el cable y ms de compresión: identity, gzip (niveles 1/5/9) y
+  brotli (si el paquete Brotli está instalado)
+
+Guarda el resultado en bench/results/ igual que bench.run.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+from bench import report
+from app.core import compression
+from app.core.responses import dumps
+
+RECOMMENDATIONS = [
+    "Buen aporte de proteína; acompaña con verduras para sumar fibra.",
+    "Alta en carbohidratos: reduce la porción de arroz o añade ensalada.",
+    "Equilibrada. Mantén el agua y evita bebidas azucaradas con esta comida.",
+    "Grasas elevadas por la fritura; prueba a hornear la próxima vez.",
+]
+
+
+def history_rows(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        digest = "%064x" % rng.getrandbits(256)
+        base = "https://example.supabase.co/storage/v1/object/public/meals"
+        rows.append({
+            "id": i + 1,
+            "user_id": user_id,
+            "date_creation": (start + timedelta(hours=7 * i)).isoformat(),
+            "img_url": f"{base}/blobs/{digest[:2]}/{digest}.jpg",
+            "thumb_url": f"{base}/thumbs/{digest[:2]}/{digest}_320.webp",
+            "thumbnails": {str(s): f"{base}/thumbs/{digest[:2]}/{digest}_{s}.webp" for s in (160, 320, 640)},
+            "image_hash": digest,
+            "recommendation": rng.choice(RECOMMENDATIONS) * rng.randint(2, 5),
+            "total_calories": round(rng.uniform(150, 1200), 2),
+            "total_protein_g": round(rng.uniform(5, 60), 2),
+            "total_carbs_g": round(rng.uniform(10, 150), 2),
+            "total_fat_g": round(rng.uniform(2, 60), 2),
+        })
+    return rows
+
+
+def fastapi_default(content: Any) -> bytes:
+    # serialize_response + JSONResponse.render de Starlette
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _median_ms(fn: Callable[[], Any], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(report.percentile(samples, 0.5) * 1000, 3)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default="serialization")
+    parser.add_argument("--meals", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    args = parser.parse_args(argv)
+
+    rows = history_rows(args.meals)
+    encoders = {"fastapi_default": fastapi_default, "orjson": dumps}
+    encode = []
+    for name, fn in encoders.items():
+        encode.append({"encoder": name, "encode_ms": _median_ms(lambda: fn(rows), args.runs), "bytes": len(fn(rows))})
+
+    body = dumps(rows)
+    codecs: Dict[str, Callable[[bytes], bytes]] = {"identity": lambda b: b}
+    for level in (1, 5, 9):
+        codecs[f"gzip-{level}"] = lambda b, level=level: gzip.compress(b, compresslevel=level, mtime=0)
+    if compression.brotli is not None:
+        for quality in (4, 11):
+            codecs[f"br-{quality}"] = lambda b, q=quality: compression.brotli.compress(b, quality=q)
+    wire = []
+    for name, fn in codecs.items():
+        size = len(fn(body))
+        wire.append({
+            "encoding": name,
+            "compress_ms": _median_ms(lambda: fn(body), args.runs),
+            "bytes": size,
+            "ratio": round(len(body) / size, 2),
+        })
+
+    result = {
+        "name": args.name,
+        "git": report.git_revision(),
+        "meals": args.meals,
+        "runs": args.runs,
+        "encode": encode,
+        "wire": wire,
+    }
+    print(report.format_table(encode, ["encoder", "encode_ms", "bytes"]))
+    print()
+    print(report.format_table(wire, ["encoding", "compress_ms", "bytes", "ratio"]))
+    if compression.brotli is None:
+        print("\n(Brotli no instalado: solo gzip)")
+    path = report.save_result(result, args.out, args.name)
+    print(f"resultado guardado en {path}")
+
+
+if __name__ == "__main__":
+    main()
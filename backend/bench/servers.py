@@ -0,0 +1,128 @@
+"""Arranque de los servidores falsos y de la app como subprocesos uvicorn."""
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Clave con forma de JWT para que los clientes de Supabase la acepten
+FAKE_JWT = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.bench"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} no respondió en {timeout:g}s")
+
+
+def start_uvicorn(target: str, port: int, env: Dict[str, str], extra: Optional[List[str]] = None) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning", "--no-access-log", *(extra or [])]
+    # BENCH_VERBOSE=1 deja ver los logs de los servidores (por defecto se silencian)
+    output = None if os.getenv("BENCH_VERBOSE") else subprocess.DEVNULL
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=output, stderr=output)
+
+
+def stop(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    """RSS actual y pico (VmHWM) del proceso en MB; vacío fuera de Linux."""
+    out = {}
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    out[key] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return out
+
+
+def app_env(supabase_url: str, openai_url: str, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    env = {
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_KEY": FAKE_JWT,
+        "SUPABASE_SERVICE_ROLE_KEY": FAKE_JWT,
+        "SUPABASE_BUCKET": "meals",
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "MODEL_LEDGER_PATH": os.path.join(BACKEND_DIR, "data", "bench_model_calls.sqlite3"),
+        # el bench mide capacidad: sin límite por usuario (el cupo global con cola justa se mantiene)
+        "ADMISSION_RATE_PER_MIN": "0",
+    }
+    env.update(extra or {})
+    return env
+
+
+@contextmanager
+def fakes(latencies: Dict[str, str]) -> Iterator[Dict[str, str]]:
+    """Levanta solo fake Supabase + fake OpenAI; devuelve sus URLs."""
+    sb_port, oa_port = free_port(), free_port()
+    procs = []
+    try:
+        procs.append(start_uvicorn("bench.fake_supabase:app", sb_port, {
+            "FAKE_DB_LATENCY": latencies.get("db", "0"),
+            "FAKE_STORAGE_LATENCY": latencies.get("storage", "0"),
+            "FAKE_AUTH_LATENCY": latencies.get("auth", "0"),
+        }))
+        procs.append(start_uvicorn("bench.fake_openai:app", oa_port, {
+            "FAKE_OPENAI_LATENCY": latencies.get("openai", "0"),
+            "FAKE_OPENAI_TEXT_LATENCY": latencies.get("openai_text", latencies.get("openai", "0")),
+            "FAKE_OPENAI_ERROR_RATE": latencies.get("openai_error_rate", "0"),
+        }))
+        urls = {
+            "supabase_url": f"http://127.0.0.1:{sb_port}",
+            "openai_url": f"http://127.0.0.1:{oa_port}",
+        }
+        wait_ready(f"{urls['supabase_url']}/__health")
+        wait_ready(f"{urls['openai_url']}/__health")
+        yield urls
+    finally:
+        for proc in reversed(procs):
+            stop(proc)
+
+
+@contextmanager
+def stack(
+    latencies: Dict[str, str],
+    app_extra_env: Optional[Dict[str, str]] = None,
+    app_args: Optional[List[str]] = None,
+    app_target: str = "app.main:app",
+) -> Iterator[Dict[str, object]]:
+    """Levanta fake Supabase + fake OpenAI + app; devuelve URLs y procesos."""
+    with fakes(latencies) as urls:
+        app_port = free_port()
+        env = app_env(urls["supabase_url"], urls["openai_url"], app_extra_env)
+        app_proc = start_uvicorn(app_target, app_port, env, app_args)
+        try:
+            app_url = f"http://127.0.0.1:{app_port}"
+            wait_ready(f"{app_url}/")
+            yield {**urls, "app_url": app_url, "app_proc": app_proc}
+        finally:
+            stop(app_proc)
@@ -0,0 +1,126 @@
+"""
+Benchmark de arranque en frío de la app.
+
+    python -m bench.startup --runs 5
+
+Mide, en procesos nuevos:
+- import_ms: `import app.main` (y qué librerías pesadas quedaron cargadas)
+- ready_ms: desde lanzar uvicorn hasta que /readyz responde 200
+- first_*_ms / warm_*_ms: primer request y el siguiente del mismo endpoint
+  (el primero paga la creación perezosa de clientes)
+
+Guarda el resultado en bench/results/ igual que bench.run.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from bench import report, servers
+from bench.run import _image
+
+HEAVY_MODULES = ("openai", "supabase", "openpyxl", "postgrest", "storage3", "gotrue", "httpx")
+
+IMPORT_PROBE = f"""
+import json, sys, time
+t = time.perf_counter()
+import app.main
+ms = (time.perf_counter() - t) * 1000
+print(json.dumps({{"ms": ms, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(env: Dict[str, str]) -> Dict[str, Any]:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=servers.BACKEND_DIR,
+        env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _poll_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} no estuvo listo en {timeout:g}s")
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn().raise_for_status()
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def measure_cold_start(env: Dict[str, str]) -> Dict[str, float]:
+    port = servers.free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = servers.start_uvicorn("app.main:app", port, env)
+    try:
+        _poll_ready(f"{url}/readyz")
+        result = {"ready_ms": round((time.perf_counter() - start) * 1000, 1)}
+        headers = {"Authorization": "Bearer user-0"}
+        image = _image(100 * 1024)
+        with httpx.Client(base_url=url, timeout=60.0) as client:
+            history = lambda: client.get("/api/history_meals", headers=headers)
+            analyse = lambda: client.post(
+                "/api/analyse_meal", headers=headers, files={"image": ("meal.jpg", image, "image/jpeg")},
+            )
+            export = lambda: client.get("/api/meals/export_history?format=xlsx", headers=headers)
+            for name, fn in (("history", history), ("analyse", analyse), ("export_xlsx", export)):
+                result[f"first_{name}_ms"] = _timed(fn)
+                result[f"warm_{name}_ms"] = _timed(fn)
+        return result
+    finally:
+        servers.stop(proc)
+
+
+def _median(values: List[float]) -> float:
+    return round(report.percentile(values, 0.5), 1)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default="startup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    args = parser.parse_args(argv)
+
+    imports, starts = [], []
+    with servers.fakes({}) as urls:
+        httpx.post(f"{urls['supabase_url']}/__seed", json={"users": 1, "meals_per_user": 50}).raise_for_status()
+        env = servers.app_env(urls["supabase_url"], urls["openai_url"])
+        for _ in range(args.runs):
+            imports.append(measure_import(env))
+            starts.append(measure_cold_start(env))
+
+    summary = {"import_ms": _median([r["ms"] for r in imports])}
+    for key in starts[0]:
+        summary[key] = _median([r[key] for r in starts])
+
+    result = {
+        "name": args.name,
+        "git": report.git_revision(),
+        "runs": args.runs,
+        "loaded_at_import": imports[-1]["loaded"],
+        "median": summary,
+        "samples": {"import": imports, "cold_start": starts},
+    }
+    print(report.format_table([{"metric": k, "median_ms": v} for k, v in summary.items()], ["metric", "median_ms"]))
+    print(f"\nlibrerías pesadas cargadas al importar app.main: {', '.join(result['loaded_at_import']) or '-'}")
+    path = report.save_result(result, args.out, args.name)
+    print(f"resultado guardado en {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Micro-benchmark de la conversión de fechas del export y de los rangos de día.
+
+    python -m bench.timezones --rows 100000 --runs 5
+
+Con --rows timestamps ISO como los de `meals.date_creation` (dos años, orden
+ascendente), mide (mediana de --runs) por zona horaria:
+- per_row_ms: la conversión anterior, fila a fila (resolve_tz + fromisoformat
+  + astimezone + strftime por fila)
+- bulk_ms: `app.core.timezones.local_date_times` (tabla de días + bisect)
+- day_range_us: `_day_range_utc` anterior frente a `timezones.day_range_utc`
+  (memoizado), por llamada
+
+Comprueba además que ambas conversiones dan exactamente lo mismo. Guarda el
+resultado en bench/results/ igual que bench.run.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, datetime, time as time_cls, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+from bench import report
+from app.core import timezones
+
+ZONES = ["America/Lima", "America/New_York", "Europe/Madrid", "Asia/Kolkata"]
+
+
+def legacy_resolve_tz(tz_name: str):
+    try:
+        return ZoneInfo(tz_name)
+    except Exception:
+        return timezone.utc
+
+
+def legacy_local_date_time(iso_str: str, tz_name: str) -> Tuple[str, str]:
+    tz = legacy_resolve_tz(tz_name)
+    dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
+    dt_local = dt.astimezone(tz)
+    return dt_local.date().isoformat(), dt_local.strftime("%H:%M")
+
+
+def legacy_day_range_utc(date_str: str, tz_name: str) -> Tuple[str, str, str]:
+    tz = legacy_resolve_tz(tz_name)
+    target_date = date.fromisoformat(date_str)
+    start_local = datetime.combine(target_date, time_cls.min).replace(tzinfo=tz)
+    end_local = start_local + timedelta(days=1)
+    return (
+        target_date.isoformat(),
+        start_local.astimezone(timezone.utc).isoformat(),
+        end_local.astimezone(timezone.utc).isoformat(),
+    )
+
+
+def timestamps(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    seconds = sorted(rng.randrange(2 * 365 * 86400) for _ in range(count))
+    return [(start + timedelta(seconds=s, microseconds=rng.randrange(10**6))).isoformat() for s in seconds]
+
+
+def median_ms(fn: Callable[[], object], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default="timezones")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    args = parser.parse_args(argv)
+
+    values = timestamps(args.rows)
+    days = [(date(2024, 1, 1) + timedelta(days=i)).isoformat() for i in range(30)]
+    zones: Dict[str, Dict[str, float]] = {}
+    for tz_name in ZONES:
+        expected = [legacy_local_date_time(v, tz_name) for v in values]
+        if timezones.local_date_times(values, tz_name) != expected:
+            raise AssertionError(f"{tz_name}: la conversión en bloque no coincide con la fila a fila")
+
+        per_row = median_ms(lambda: [legacy_local_date_time(v, tz_name) for v in values], args.runs)
+        bulk = median_ms(lambda: timezones.local_date_times(values, tz_name), args.runs)
+        calls = 100 * len(days)
+        legacy_range = median_ms(lambda: [legacy_day_range_utc(d, tz_name) for d in days * 100], args.runs)
+        cached_range = median_ms(lambda: [timezones.day_range_utc(d, tz_name) for d in days * 100], args.runs)
+        zones[tz_name] = {
+            "per_row_ms": per_row,
+            "bulk_ms": bulk,
+            "speedup": round(per_row / bulk, 1) if bulk else None,
+            "day_range_us_legacy": round(legacy_range * 1000 / calls, 2),
+            "day_range_us_cached": round(cached_range * 1000 / calls, 2),
+        }
+
+    result = {"name": args.name, "git": report.git_revision(), "rows": args.rows, "runs": args.runs, "zones": zones}
+    print(f"{'zona':<18} {'fila a fila ms':>15} {'en bloque ms':>13} {'x':>6} {'rango µs antes/ahora':>22}")
+    for tz_name, row in zones.items():
+        print(f"{tz_name:<18} {row['per_row_ms']:>15} {row['bulk_ms']:>13} {row['speedup']:>6} "
+              f"{row['day_range_us_legacy']:>11}/{row['day_range_us_cached']}")
+    path = report.save_result(result, args.out, args.name)
+    print(f"resultado guardado en {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+-- Miniaturas WebP de las fotos de comidas (ver app/core/thumbnails.py).
+-- thumbnails: {"160": url, "320": url, "640": url}; thumb_url: tamaño usado por las listas.
+alter table public.meals
+    add column if not exists thumb_url text,
+    add column if not exists thumbnails jsonb;
+
+-- El backfill recorre por id las comidas que aún no tienen miniatura
+create index if not exists meals_missing_thumb_idx
+    on public.meals (id)
+    where thumb_url is null;
@@ -0,0 +1,74 @@
+-- Imágenes direccionadas por contenido (ver app/core/storage.py).
+-- Cada foto se guarda una sola vez en blobs/<ab>/<sha256>.<ext>; image_blobs cuenta
+-- cuántas comidas la referencian y el blob se borra al llegar a cero.
+create table if not exists public.image_blobs (
+    hash         text primary key,
+    path         text not null,
+    size_bytes   bigint not null,
+    content_type text,
+    refcount     integer not null default 0 check (refcount >= 0),
+    created_at   timestamptz not null default now()
+);
+
+alter table public.image_blobs enable row level security;  -- solo se accede vía service role / RPCs
+
+alter table public.meals add column if not exists image_hash text;
+create index if not exists meals_image_hash_idx on public.meals (image_hash);
+
+-- Suma una referencia (crea la fila si no existe). created = true si la fila es nueva.
+create or replace function public.acquire_image_blob(
+    p_hash text, p_path text, p_size bigint, p_content_type text
+)
+returns table (refcount integer, created boolean)
+language sql
+security definer
+set search_path = public
+as $$
+    insert into image_blobs as b (hash, path, size_bytes, content_type, refcount)
+    values (p_hash, p_path, p_size, p_content_type, 1)
+    on conflict (hash) do update set refcount = b.refcount + 1
+    returning b.refcount, (b.xmax = 0);
+$$;
+
+-- Resta una referencia; al llegar a cero borra la fila y devuelve la ruta para borrar el objeto.
+create or replace function public.release_image_blob(p_hash text)
+returns table (refcount integer, path text)
+language plpgsql
+security definer
+set search_path = public
+as $$
+#variable_conflict use_column
+begin
+    return query
+    update image_blobs b
+       set refcount = greatest(b.refcount - 1, 0)
+     where b.hash = p_hash
+    returning b.refcount, b.path;
+
+    delete from image_blobs where hash = p_hash and refcount = 0;
+end;
+$$;
+
+-- Resumen para /api/admin/storage_dedup
+create or replace function public.image_dedup_stats()
+returns table (blobs bigint, references_count bigint, stored_bytes bigint, logical_bytes bigint)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select count(*),
+           coalesce(sum(refcount), 0),
+           coalesce(sum(size_bytes), 0),
+           coalesce(sum(size_bytes * refcount), 0)
+      from image_blobs;
+$$;
+
+-- Postgres da EXECUTE a PUBLIC por defecto: sin quitarlo, anon/authenticated podrían
+-- bajar el refcount de imágenes ajenas. Solo el backend (service role) las llama.
+revoke execute on function public.acquire_image_blob(text, text, bigint, text) from public, anon, authenticated;
+revoke execute on function public.release_image_blob(text) from public, anon, authenticated;
+revoke execute on function public.image_dedup_stats() from public, anon, authenticated;
+grant execute on function public.acquire_image_blob(text, text, bigint, text) to service_role;
+grant execute on function public.release_image_blob(text) to service_role;
+grant execute on function public.image_dedup_stats() to service_role;
@@ -0,0 +1,59 @@
+-- Guardado atómico de una comida con sus items en un solo round trip (ver save_analysis).
+-- Los totales se calculan aquí a partir de los items, así meals y meal_items no pueden divergir.
+create or replace function public.save_meal_with_items(p_meal jsonb, p_items jsonb)
+returns table (
+    meal_id         bigint,
+    total_calories  numeric,
+    total_protein_g numeric,
+    total_carbs_g   numeric,
+    total_fat_g     numeric
+)
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_meal meals%rowtype;
+begin
+    if jsonb_typeof(p_items) is distinct from 'array' or jsonb_array_length(p_items) = 0 then
+        raise exception 'p_items debe ser un arreglo no vacío';
+    end if;
+
+    insert into meals (
+        user_id, img_url, thumb_url, thumbnails, image_hash, recommendation, date_creation,
+        total_calories, total_protein_g, total_carbs_g, total_fat_g
+    )
+    select
+        (p_meal->>'user_id')::uuid,
+        p_meal->>'img_url',
+        p_meal->>'thumb_url',
+        p_meal->'thumbnails',
+        p_meal->>'image_hash',
+        p_meal->>'recommendation',
+        coalesce((p_meal->>'date_creation')::timestamptz, now()),
+        coalesce(sum(i.calories_kcal), 0),
+        coalesce(sum(i.protein_g), 0),
+        coalesce(sum(i.carbs_g), 0),
+        coalesce(sum(i.fat_g), 0)
+    from jsonb_to_recordset(p_items) as i(
+        name text, weight_grams numeric, calories_kcal numeric,
+        protein_g numeric, carbs_g numeric, fat_g numeric
+    )
+    returning * into v_meal;
+
+    insert into meal_items (meal_id, name, weight_grams, calories_kcal, protein_g, carbs_g, fat_g)
+    select v_meal.id, i.name, i.weight_grams, i.calories_kcal, i.protein_g, i.carbs_g, i.fat_g
+    from jsonb_to_recordset(p_items) as i(
+        name text, weight_grams numeric, calories_kcal numeric,
+        protein_g numeric, carbs_g numeric, fat_g numeric
+    );
+
+    return query select v_meal.id::bigint, v_meal.total_calories, v_meal.total_protein_g,
+                        v_meal.total_carbs_g, v_meal.total_fat_g;
+end;
+$$;
+
+-- confía en p_meal->>'user_id': EXECUTE solo para el backend (service role), también
+-- quitado a PUBLIC (Postgres lo concede por defecto a toda función nueva)
+revoke execute on function public.save_meal_with_items(jsonb, jsonb) from public, anon, authenticated;
+grant execute on function public.save_meal_with_items(jsonb, jsonb) to service_role;
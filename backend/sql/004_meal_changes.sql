@@ -0,0 +1,102 @@
+-- Delta-sync del historial (GET /api/history_meals/changes, ver app/routes/meals.py).
+-- Cada alta o cambio de una comida toma un número de meal_change_seq; cada borrado deja
+-- una lápida con su propio número. El cliente guarda el último número visto y pide solo
+-- lo posterior: si ya está al día, las dos consultas son un index scan vacío.
+--
+-- nextval se toma al escribir, no al hacer commit: una transacción puede confirmar un
+-- número menor que otro ya entregado y el cliente no lo vería nunca. Por eso cada fila
+-- guarda también el xid de la transacción que la escribió (change_xid) y el cursor es
+-- (change_xid, change_seq), acotado por meal_changes_horizon(): todo xid menor que el
+-- xmin del snapshot ya terminó, así que por debajo de ese horizonte no aparece nada nuevo.
+create sequence if not exists public.meal_change_seq;
+
+alter table public.meals
+    add column if not exists change_seq bigint not null default nextval('public.meal_change_seq');
+alter table public.meals
+    add column if not exists change_xid bigint not null default (pg_current_xact_id()::text::bigint);
+create index if not exists meals_user_change_seq_idx on public.meals (user_id, change_seq);
+create index if not exists meals_user_change_xid_idx on public.meals (user_id, change_xid, change_seq);
+
+create table if not exists public.meal_tombstones (
+    meal_id    bigint not null,
+    user_id    uuid not null,
+    change_seq bigint not null default nextval('public.meal_change_seq'),
+    deleted_at timestamptz not null default now()
+);
+alter table public.meal_tombstones
+    add column if not exists change_xid bigint not null default (pg_current_xact_id()::text::bigint);
+create index if not exists meal_tombstones_user_change_seq_idx
+    on public.meal_tombstones (user_id, change_seq);
+create index if not exists meal_tombstones_user_change_xid_idx
+    on public.meal_tombstones (user_id, change_xid, change_seq);
+
+alter table public.meal_tombstones enable row level security;
+drop policy if exists "meal_tombstones_select_own" on public.meal_tombstones;
+create policy "meal_tombstones_select_own" on public.meal_tombstones
+    for select using (auth.uid() = user_id);
+
+-- Cualquier update (miniaturas, re-análisis, ...) vuelve a publicar la comida
+create or replace function public.meals_bump_change_seq()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.change_seq := nextval('public.meal_change_seq');
+    new.change_xid := pg_current_xact_id()::text::bigint;
+    return new;
+end;
+$$;
+
+drop trigger if exists meals_bump_change_seq on public.meals;
+create trigger meals_bump_change_seq
+    before update on public.meals
+    for each row execute function public.meals_bump_change_seq();
+
+-- El borrado (delete_meal o cualquier otro) deja su lápida en la misma transacción
+create or replace function public.meals_record_tombstone()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into meal_tombstones (meal_id, user_id) values (old.id, old.user_id);
+    return old;
+end;
+$$;
+
+drop trigger if exists meals_record_tombstone on public.meals;
+create trigger meals_record_tombstone
+    after delete on public.meals
+    for each row execute function public.meals_record_tombstone();
+
+-- Limpieza periódica (p. ej. pg_cron diario). Los tokens más viejos que la retención
+-- reciben 410 y el cliente hace una sincronización completa (MEAL_TOMBSTONE_RETENTION_DAYS).
+create or replace function public.purge_meal_tombstones(p_days integer default 30)
+returns bigint
+language sql
+security definer
+set search_path = public
+as $$
+    with deleted as (
+        delete from meal_tombstones where deleted_at < now() - make_interval(days => p_days)
+        returning 1
+    )
+    select count(*) from deleted;
+$$;
+
+revoke execute on function public.purge_meal_tombstones(integer) from public, anon, authenticated;
+grant execute on function public.purge_meal_tombstones(integer) to service_role;
+
+-- Horizonte del delta-sync: las filas con change_xid menor ya son definitivas (su
+-- transacción terminó). Una transacción larga lo frena: se entrega más tarde, no se pierde.
+create or replace function public.meal_changes_horizon()
+returns bigint
+language sql
+stable
+as $$
+    select pg_snapshot_xmin(pg_current_snapshot())::text::bigint;
+$$;
+
+revoke execute on function public.meal_changes_horizon() from public, anon, authenticated;
+grant execute on function public.meal_changes_horizon() to service_role;
@@ -0,0 +1,76 @@
+-- Volver a registrar una comida anterior sin foto ni modelo (POST /api/meals/{id}/relog).
+-- En una transacción: copia la comida del usuario con fecha nueva, copia sus items
+-- escalando la porción (p_scale), recalcula los totales a partir de los items (igual que
+-- save_meal_with_items) y suma una referencia al blob de la imagen que se reusa.
+create or replace function public.relog_meal(
+    p_user_id uuid,
+    p_meal_id bigint,
+    p_scale numeric default 1,
+    p_date_creation timestamptz default now()
+)
+returns table (
+    meal_id         bigint,
+    total_calories  numeric,
+    total_protein_g numeric,
+    total_carbs_g   numeric,
+    total_fat_g     numeric
+)
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_source meals%rowtype;
+    v_meal   meals%rowtype;
+    v_items  integer;
+begin
+    if p_scale is null or p_scale <= 0 or p_scale > 10 then
+        raise exception 'p_scale debe estar entre 0 y 10';
+    end if;
+
+    select * into v_source from meals where id = p_meal_id and user_id = p_user_id;
+    if not found then
+        raise exception 'Meal not found' using errcode = 'P0002';
+    end if;
+
+    select count(*) into v_items from meal_items where meal_items.meal_id = p_meal_id;
+
+    insert into meals (
+        user_id, img_url, thumb_url, thumbnails, image_hash, recommendation, date_creation,
+        total_calories, total_protein_g, total_carbs_g, total_fat_g
+    )
+    select
+        v_source.user_id, v_source.img_url, v_source.thumb_url, v_source.thumbnails,
+        v_source.image_hash, v_source.recommendation, coalesce(p_date_creation, now()),
+        -- sin items (comidas antiguas) se escalan los totales guardados
+        case when v_items > 0 then coalesce(sum(round(i.calories_kcal * p_scale, 2)), 0)
+             else round(coalesce(v_source.total_calories, 0) * p_scale, 2) end,
+        case when v_items > 0 then coalesce(sum(round(i.protein_g * p_scale, 2)), 0)
+             else round(coalesce(v_source.total_protein_g, 0) * p_scale, 2) end,
+        case when v_items > 0 then coalesce(sum(round(i.carbs_g * p_scale, 2)), 0)
+             else round(coalesce(v_source.total_carbs_g, 0) * p_scale, 2) end,
+        case when v_items > 0 then coalesce(sum(round(i.fat_g * p_scale, 2)), 0)
+             else round(coalesce(v_source.total_fat_g, 0) * p_scale, 2) end
+    from meal_items i
+    where i.meal_id = p_meal_id  -- agregado sin group by: una fila aunque no haya items
+    returning * into v_meal;
+
+    insert into meal_items (meal_id, name, weight_grams, calories_kcal, protein_g, carbs_g, fat_g)
+    select v_meal.id, i.name,
+           round(i.weight_grams * p_scale, 2), round(i.calories_kcal * p_scale, 2),
+           round(i.protein_g * p_scale, 2), round(i.carbs_g * p_scale, 2), round(i.fat_g * p_scale, 2)
+    from meal_items i
+    where i.meal_id = p_meal_id;
+
+    -- la imagen queda compartida: delete_meal de cualquiera de las dos no debe borrar el blob
+    if v_source.image_hash is not null then
+        update image_blobs set refcount = refcount + 1 where hash = v_source.image_hash;
+    end if;
+
+    return query select v_meal.id::bigint, v_meal.total_calories, v_meal.total_protein_g,
+                        v_meal.total_carbs_g, v_meal.total_fat_g;
+end;
+$$;
+
+revoke execute on function public.relog_meal(uuid, bigint, numeric, timestamptz) from public, anon, authenticated;
+grant execute on function public.relog_meal(uuid, bigint, numeric, timestamptz) to service_role;
@@ -0,0 +1,99 @@
+-- Búsqueda de comidas por alimento (GET /api/meals/search, ver app/routes/meals.py).
+-- meal_items lleva el user_id de su comida para que el índice trigram sea por usuario:
+-- gin (user_id, name gin_trgm_ops) solo recorre las entradas del usuario que contienen
+-- los trigramas buscados, así la latencia no crece con el historial de los demás.
+create extension if not exists pg_trgm;
+create extension if not exists btree_gin;
+
+alter table public.meal_items add column if not exists user_id uuid;
+
+update public.meal_items i
+   set user_id = m.user_id
+  from public.meals m
+ where m.id = i.meal_id and i.user_id is null;
+
+-- save_meal_with_items, relog_meal y cualquier insert directo heredan el user_id de la comida
+create or replace function public.meal_items_set_user_id()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.user_id is null then
+        select user_id into new.user_id from meals where id = new.meal_id;
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists meal_items_set_user_id on public.meal_items;
+create trigger meal_items_set_user_id
+    before insert on public.meal_items
+    for each row execute function public.meal_items_set_user_id();
+
+create index if not exists meal_items_user_name_trgm_idx
+    on public.meal_items using gin (user_id, name gin_trgm_ops);
+-- exists / matched_items por comida
+create index if not exists meal_items_meal_id_idx
+    on public.meal_items (meal_id);
+-- orden por recencia y paginación keyset
+create index if not exists meals_user_date_id_idx
+    on public.meals (user_id, date_creation desc, id desc);
+
+-- Comidas del usuario con algún item cuyo nombre contiene p_query (sin distinguir
+-- mayúsculas), de la más reciente a la más antigua. Paginación keyset: pasar la
+-- (date_creation, id) de la última fila recibida en p_before_date / p_before_id.
+-- Se recorre meals por (date_creation, id) desde el cursor y se corta en p_limit; el
+-- exists solo mira los items de cada comida y matched_items se arma solo para las
+-- filas devueltas. p_query de al menos 3 caracteres (un trigrama; lo valida la ruta).
+create or replace function public.search_meals(
+    p_user_id uuid,
+    p_query text,
+    p_limit integer default 20,
+    p_before_date timestamptz default null,
+    p_before_id bigint default null
+)
+returns table (
+    meal_id         bigint,
+    date_creation   timestamptz,
+    img_url         text,
+    thumb_url       text,
+    total_calories  numeric,
+    total_protein_g numeric,
+    total_carbs_g   numeric,
+    total_fat_g     numeric,
+    matched_items   text[]
+)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    with params as (
+        select '%' || replace(replace(replace(p_query, '\', '\\'), '%', '\%'), '_', '\_') || '%' as pattern
+    ), page as (
+        select m.id, m.date_creation, m.img_url, m.thumb_url,
+               m.total_calories, m.total_protein_g, m.total_carbs_g, m.total_fat_g
+          from meals m, params
+         where m.user_id = p_user_id
+           and (p_before_date is null or (m.date_creation, m.id) < (p_before_date, p_before_id))
+           and exists (
+               select 1 from meal_items i
+                where i.meal_id = m.id and i.user_id = p_user_id and i.name ilike params.pattern
+           )
+         order by m.date_creation desc, m.id desc
+         limit least(greatest(p_limit, 1), 100)
+    )
+    select page.id::bigint, page.date_creation, page.img_url, page.thumb_url,
+           page.total_calories, page.total_protein_g, page.total_carbs_g, page.total_fat_g, x.names
+      from page
+     cross join params
+     cross join lateral (
+        select array_agg(distinct i.name order by i.name) as names
+          from meal_items i
+         where i.meal_id = page.id and i.name ilike params.pattern
+     ) x
+     order by page.date_creation desc, page.id desc;
+$$;
+
+revoke execute on function public.search_meals(uuid, text, integer, timestamptz, bigint) from public, anon, authenticated;
+grant execute on function public.search_meals(uuid, text, integer, timestamptz, bigint) to service_role;
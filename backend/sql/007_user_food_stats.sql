@@ -0,0 +1,153 @@
+-- Estadísticas por usuario y alimento ("tus alimentos de siempre", porción habitual).
+-- Un trigger sobre meal_items las mantiene al día en la misma transacción que
+-- save_meal_with_items, relog_meal o el borrado de delete_meal, así
+-- GET /api/users/me/food_stats lee filas ya agregadas en vez de recorrer el historial.
+-- Se guardan sumas (no promedios) para poder restar al borrar; el promedio es suma / item_count.
+create table if not exists public.user_food_stats (
+    user_id         uuid not null,
+    name            text not null,  -- lower(btrim(meal_items.name))
+    item_count      integer not null default 0,
+    total_grams     numeric not null default 0,
+    total_calories  numeric not null default 0,
+    total_protein_g numeric not null default 0,
+    total_carbs_g   numeric not null default 0,
+    total_fat_g     numeric not null default 0,
+    last_seen       timestamptz,
+    primary key (user_id, name)
+);
+create index if not exists user_food_stats_user_count_idx
+    on public.user_food_stats (user_id, item_count desc);
+create index if not exists user_food_stats_user_last_seen_idx
+    on public.user_food_stats (user_id, last_seen desc);
+-- recalcular last_seen al borrar la aparición más reciente de un alimento
+create index if not exists meal_items_user_food_idx
+    on public.meal_items (user_id, (lower(btrim(name))));
+
+alter table public.user_food_stats enable row level security;
+drop policy if exists "user_food_stats_select_own" on public.user_food_stats;
+create policy "user_food_stats_select_own" on public.user_food_stats
+    for select using (auth.uid() = user_id);
+
+create or replace function public.food_stats_apply(p_item meal_items, p_sign integer)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_name  text := lower(btrim(p_item.name));
+    v_date  timestamptz;
+    v_stats user_food_stats%rowtype;
+begin
+    if p_item.user_id is null or v_name is null or v_name = '' then
+        return;
+    end if;
+    select date_creation into v_date from meals where id = p_item.meal_id;
+
+    if p_sign > 0 then
+        insert into user_food_stats as s (
+            user_id, name, item_count, total_grams, total_calories,
+            total_protein_g, total_carbs_g, total_fat_g, last_seen
+        ) values (
+            p_item.user_id, v_name, 1, coalesce(p_item.weight_grams, 0), coalesce(p_item.calories_kcal, 0),
+            coalesce(p_item.protein_g, 0), coalesce(p_item.carbs_g, 0), coalesce(p_item.fat_g, 0), v_date
+        )
+        on conflict (user_id, name) do update set
+            item_count      = s.item_count + 1,
+            total_grams     = s.total_grams + excluded.total_grams,
+            total_calories  = s.total_calories + excluded.total_calories,
+            total_protein_g = s.total_protein_g + excluded.total_protein_g,
+            total_carbs_g   = s.total_carbs_g + excluded.total_carbs_g,
+            total_fat_g     = s.total_fat_g + excluded.total_fat_g,
+            last_seen       = greatest(s.last_seen, excluded.last_seen);
+        return;
+    end if;
+
+    update user_food_stats set
+        item_count      = item_count - 1,
+        total_grams     = total_grams - coalesce(p_item.weight_grams, 0),
+        total_calories  = total_calories - coalesce(p_item.calories_kcal, 0),
+        total_protein_g = total_protein_g - coalesce(p_item.protein_g, 0),
+        total_carbs_g   = total_carbs_g - coalesce(p_item.carbs_g, 0),
+        total_fat_g     = total_fat_g - coalesce(p_item.fat_g, 0)
+    where user_id = p_item.user_id and name = v_name
+    returning * into v_stats;
+
+    if not found then
+        return;
+    elsif v_stats.item_count <= 0 then
+        delete from user_food_stats where user_id = p_item.user_id and name = v_name;
+    elsif v_date is null or v_stats.last_seen <= v_date then
+        -- se borró la aparición más reciente (o su comida ya no está): buscar la anterior
+        update user_food_stats set last_seen = (
+            select max(m.date_creation)
+              from meal_items i
+              join meals m on m.id = i.meal_id
+             where i.user_id = p_item.user_id and lower(btrim(i.name)) = v_name and i.id <> p_item.id
+        )
+        where user_id = p_item.user_id and name = v_name;
+    end if;
+end;
+$$;
+
+-- security definer: food_stats_apply no es ejecutable por anon/authenticated, pero
+-- el trigger corre para cualquiera que escriba en meal_items
+create or replace function public.meal_items_food_stats()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform food_stats_apply(old, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform food_stats_apply(new, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists meal_items_food_stats on public.meal_items;
+create trigger meal_items_food_stats
+    after insert or update or delete on public.meal_items
+    for each row execute function public.meal_items_food_stats();
+
+-- Recalcula desde meal_items (datos anteriores a esta migración o reparación).
+-- p_user_id null = todos los usuarios. Bloquea la tabla mientras tanto: los
+-- triggers de los inserts concurrentes esperan y se aplican sobre el resultado.
+-- Job: python -m app.jobs.rebuild_food_stats
+create or replace function public.rebuild_user_food_stats(p_user_id uuid default null)
+returns bigint
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_rows bigint;
+begin
+    lock table user_food_stats in exclusive mode;
+    delete from user_food_stats where p_user_id is null or user_id = p_user_id;
+    insert into user_food_stats (
+        user_id, name, item_count, total_grams, total_calories,
+        total_protein_g, total_carbs_g, total_fat_g, last_seen
+    )
+    select i.user_id, lower(btrim(i.name)), count(*),
+           coalesce(sum(i.weight_grams), 0), coalesce(sum(i.calories_kcal), 0),
+           coalesce(sum(i.protein_g), 0), coalesce(sum(i.carbs_g), 0), coalesce(sum(i.fat_g), 0),
+           max(m.date_creation)
+      from meal_items i
+      join meals m on m.id = i.meal_id
+     where i.user_id is not null and btrim(coalesce(i.name, '')) <> ''
+       and (p_user_id is null or i.user_id = p_user_id)
+     group by i.user_id, lower(btrim(i.name));
+    get diagnostics v_rows = row_count;
+    return v_rows;
+end;
+$$;
+
+revoke execute on function public.rebuild_user_food_stats(uuid) from public, anon, authenticated;
+revoke execute on function public.food_stats_apply(meal_items, integer) from public, anon, authenticated;
+grant execute on function public.rebuild_user_food_stats(uuid) to service_role;
+grant execute on function public.food_stats_apply(meal_items, integer) to service_role;
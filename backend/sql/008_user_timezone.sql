@@ -0,0 +1,6 @@
+-- Zona horaria del usuario: define su "hoy" en /meals/day y las horas del export
+-- cuando el cliente no manda `tz`. Nombre IANA; la API lo valida al crear o
+-- editar el perfil (POST /api/users, PUT /api/users/edit_profile).
+-- Los usuarios existentes quedan con America/Lima, la zona fija usada hasta ahora.
+alter table public.users
+    add column if not exists timezone text not null default 'America/Lima';
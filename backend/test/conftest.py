@@ -1,11 +1,40 @@
 import os
+import tempfile
+from unittest.mock import MagicMock
+
 import pytest
 from fastapi.testclient import TestClient
 
+# el ledger de modelos escribe en un SQLite temporal durante los tests
+os.environ.setdefault("MODEL_LEDGER_PATH", os.path.join(tempfile.mkdtemp(), "model_calls.sqlite3"))
+# las miniaturas se prueban aparte (test_thumbnails); en el resto las imágenes son bytes falsos
+os.environ.setdefault("THUMBNAILS_ENABLED", "false")
+# credenciales falsas: la suite corre sin .env (algunos módulos las leen al importarse)
+for _name, _value in {
+    "OPENAI_API_KEY": "sk-test",
+    "SUPABASE_URL": "http://supabase.test",
+    "SUPABASE_KEY": "anon-test",
+    "SUPABASE_SERVICE_ROLE_KEY": "service-test",
+    "SUPABASE_BUCKET": "meals",
+}.items():
+    os.environ.setdefault(_name, _value)
+
 from app.main import app
 
 test_client = TestClient(app)
 
 @pytest.fixture()
 def client():
-    return test_client
\ No newline at end of file
+    return test_client
+
+
+@pytest.fixture()
+def admin(monkeypatch):
+    """Cliente service role falso de las rutas de meals (RPCs), autenticado como "u1"."""
+    from app.routes import meals
+
+    fake = MagicMock()
+    monkeypatch.setattr(meals, "get_supabase_admin", lambda: fake)
+    app.dependency_overrides[meals.get_current_user_id] = lambda: "u1"
+    yield fake
+    app.dependency_overrides.pop(meals.get_current_user_id, None)
@@ -126,7 +126,8 @@ def test_successful_image_analysis(mock_table, mock_openai, mock_get_user):
 @patch("app.routes.analyse.supabase_admin.auth.get_user")
 @patch("app.routes.analyse.supabase_admin.storage")
 @patch("app.routes.analyse.supabase_admin.table")
-def test_save_analysis_success(mock_table, mock_storage, mock_get_user):
+@patch("app.routes.analyse.supabase_admin.rpc")
+def test_save_analysis_success(mock_rpc, mock_table, mock_storage, mock_get_user):
     mock_user = MagicMock()
     mock_user.user.id = MOCK_USER_ID
     mock_get_user.return_value = mock_user
@@ -135,6 +136,14 @@ def test_save_analysis_success(mock_table, mock_storage, mock_get_user):
     bucket = MagicMock()
     mock_storage.from_.return_value = bucket
     bucket.upload.return_value = None
+    bucket.exists.return_value = False
+    # RPCs: refcount del blob (image_blobs) y guardado atómico de meal + items
+    rpc_data = {
+        "acquire_image_blob": [{"refcount": 1, "created": True}],
+        "save_meal_with_items": [{"meal_id": "meal123", "total_calories": 350, "total_protein_g": 30,
+                                  "total_carbs_g": 20, "total_fat_g": 10}],
+    }
+    mock_rpc.side_effect = lambda name, params: MagicMock(execute=MagicMock(return_value=MagicMock(data=rpc_data[name])))
     bucket.get_public_url.return_value = {
         "data": {"publicUrl": "https://public.example/meals/test.jpg"}
     }
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import admission
+from app.core.admission import FairLimiter, Rejected, TokenBucket
+
+
+def test_token_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(rate_per_s=1.0, burst=2)
+    assert bucket.take("u1", now=0.0) == 0
+    assert bucket.take("u1", now=0.0) == 0
+    assert bucket.take("u1", now=0.0) == pytest.approx(1.0)
+    assert bucket.take("u1", now=1.5) == 0  # se recargó un token
+    assert bucket.take("u2", now=0.0) == 0  # cada usuario tiene su bucket
+
+
+def test_fair_limiter_serves_users_in_turns():
+    async def scenario():
+        limiter = FairLimiter(limit=2, per_user=2, max_queue=10, max_queued_per_user=2)
+        order = []
+
+        async def job(user, tag):
+            await limiter.acquire(user, timeout=5)
+            order.append(tag)
+            await asyncio.sleep(0.01)
+            limiter.release(user)
+
+        noisy = [asyncio.create_task(job("noisy", f"n{i}")) for i in range(4)]
+        await asyncio.sleep(0)
+        quiet = asyncio.create_task(job("quiet", "q"))
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected) as exc:
+            await limiter.acquire("noisy")  # ya tiene 2 en curso y 2 en su fila
+        assert exc.value.reason == "queue_full"
+        await asyncio.gather(*noisy, quiet)
+        return order, limiter
+
+    order, limiter = asyncio.run(scenario())
+    # el usuario tranquilo entra en el primer cupo libre, antes que la cola del ruidoso
+    assert order[:3] == ["n0", "n1", "q"]
+    assert limiter.active == 0 and limiter.queued == 0
+
+
+def test_queue_timeout_leaves_no_trace():
+    async def scenario():
+        limiter = FairLimiter(limit=1, per_user=1, max_queue=10, max_queued_per_user=5)
+        await limiter.acquire("a")
+        with pytest.raises(Rejected) as exc:
+            await limiter.acquire("b", timeout=0.01)
+        assert exc.value.reason == "timeout" and exc.value.retry_after >= 1
+        assert limiter.queued == 0
+        limiter.release("a")
+        await limiter.acquire("b", timeout=0.01)
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.active == 1
+
+
+def test_admit_rejects_with_429_and_retry_after(monkeypatch):
+    monkeypatch.setattr(admission, "_buckets", TokenBucket(rate_per_s=0.1, burst=1))
+    monkeypatch.setattr(admission, "_limiter", FairLimiter(limit=1))
+
+    async def scenario():
+        async with admission.admit("u1", "analyse_meal"):
+            pass
+        async with admission.admit("u1", "analyse_meal"):
+            pass
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "10"
+    assert admission.admission_rejected_total.value(route="analyse_meal", reason="rate") >= 1
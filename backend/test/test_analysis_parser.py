@@ -0,0 +1,81 @@
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.utils.analysis_parser import AnalysisParseError, parse_analysis
+
+ITEM = {
+    "nombre": "Arroz Blanco",
+    "cantidad_estimada_gramos": 150,
+    "calorias": 195,
+    "proteinas_g": 4,
+    "carbohidratos_g": 42,
+    "grasas_g": 0,
+}
+
+
+def test_parses_clean_json():
+    result = parse_analysis(json.dumps({"alimentos": [ITEM]}))
+    assert result.alimentos[0].nombre == "arroz blanco"
+    assert result.alimentos[0].calorias == 195
+
+
+def test_parses_fenced_json_with_surrounding_text():
+    text = "Aquí tienes:\n```json\n" + json.dumps({"alimentos": [ITEM]}) + "\n```\nBuen provecho"
+    assert len(parse_analysis(text).alimentos) == 1
+
+
+def test_repairs_comments_and_trailing_commas():
+    text = '{"alimentos": [{"nombre": "pollo", "calorias": 250, // aprox\n "grasas_g": 8,},]}'
+    result = parse_analysis(text)
+    assert result.alimentos[0].nombre == "pollo"
+    assert result.alimentos[0].grasas_g == 8
+
+
+def test_repairs_truncated_json_dropping_partial_item():
+    full = json.dumps({"alimentos": [ITEM, {**ITEM, "nombre": "frijoles"}]})
+    truncated = full[: full.index("frijoles") + 20]
+    result = parse_analysis(truncated)
+    assert [a.nombre for a in result.alimentos][0] == "arroz blanco"
+
+
+def test_coerces_numbers_and_skips_invalid_items():
+    text = json.dumps({"alimentos": [
+        {"nombre": "pan", "cantidad_estimada_gramos": "60 g", "calorias": 160.6},
+        {"cantidad_estimada_gramos": 10},
+    ]})
+    result = parse_analysis(text)
+    assert len(result.alimentos) == 1
+    assert result.alimentos[0].cantidad_estimada_gramos == 60
+    assert result.alimentos[0].calorias == 161
+
+
+def test_rejects_text_without_json():
+    with pytest.raises(AnalysisParseError):
+        parse_analysis("No puedo identificar alimentos en la imagen.")
+
+
+def _completion(content):
+    resp = MagicMock()
+    resp.choices[0].message.content = content
+    return resp
+
+
+@patch("app.routes.analyse.client.chat.completions.create")
+def test_analyze_image_repairs_with_text_call_only(mock_create):
+    from app.routes.analyse import analyze_image, parse_total
+
+    mock_create.side_effect = [
+        _completion("Lo siento, veo arroz blanco de unos 150 g."),
+        _completion(json.dumps({"alimentos": [ITEM]})),
+    ]
+    before = parse_total.value(outcome="model_repaired")
+    result = asyncio.run(analyze_image(b"img", "image/jpeg"))
+
+    assert result["alimentos"][0]["nombre"] == "arroz blanco"
+    assert parse_total.value(outcome="model_repaired") - before == 1
+    # la segunda llamada es de reparación: solo texto, sin imagen
+    repair_messages = mock_create.call_args_list[1].kwargs["messages"]
+    assert all(isinstance(m["content"], str) for m in repair_messages)
@@ -0,0 +1,150 @@
+import json
+
+from starlette.testclient import TestClient
+
+from bench import fake_openai, fake_supabase, report
+from bench.latency import parse_latency
+
+
+def test_parse_latency_specs():
+    assert parse_latency("0")() == 0.0
+    assert parse_latency("fixed:0.25")() == 0.25
+    assert 0.01 <= parse_latency("uniform:0.01:0.02")() <= 0.02
+    assert parse_latency("lognormal:0.5:0.3")() > 0
+
+
+def test_fake_postgrest_filters_order_and_embeds():
+    fake_supabase.seed(users=2, meals_per_user=5, items_per_meal=2)
+    client = TestClient(fake_supabase.app)
+    uid = fake_supabase.user_id_for_token("user-0")
+
+    meals = client.get(f"/rest/v1/meals?select=id,date_creation&user_id=eq.{uid}&order=date_creation.desc&limit=3").json()
+    assert len(meals) == 3
+    assert meals[0]["date_creation"] >= meals[1]["date_creation"]
+
+    user = client.get(
+        f"/rest/v1/users?select=id,objectives:objective_id(name)&id=eq.{uid}",
+        headers={"Accept": "application/vnd.pgrst.object+json"},
+    ).json()
+    assert user["objectives"] == {"name": "mantener"}
+
+    missing = client.get("/rest/v1/users?id=eq.nope", headers={"Accept": "application/vnd.pgrst.object+json"})
+    assert missing.status_code == 406
+
+
+def test_fake_auth_and_storage_roundtrip():
+    client = TestClient(fake_supabase.app)
+    assert client.get("/auth/v1/user", headers={"Authorization": "Bearer user-3"}).json()["id"] == \
+        fake_supabase.user_id_for_token("user-3")
+    assert client.get("/auth/v1/user", headers={"Authorization": "Bearer bad"}).status_code == 401
+
+    up = client.post("/storage/v1/object/meals/a/b.jpg", files={"file": ("b.jpg", b"abc", "image/jpeg")})
+    assert up.status_code == 200
+    assert client.get("/storage/v1/object/public/meals/a/b.jpg").content == b"abc"
+
+
+def test_fake_openai_returns_analysis_for_images():
+    client = TestClient(fake_openai.app)
+    body = {"model": "gpt-5-mini", "messages": [
+        {"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,AA=="}}]}
+    ]}
+    data = client.post("/v1/chat/completions", json=body).json()
+    assert "alimentos" in json.loads(data["choices"][0]["message"]["content"])
+    assert data["usage"]["total_tokens"] > 0
+
+
+def test_bucket_quantile_interpolates():
+    buckets = {0.01: 50.0, 0.1: 90.0, float("inf"): 100.0}
+    assert report.bucket_quantile(buckets, 0.5) == 0.01
+    assert abs(report.bucket_quantile(buckets, 0.7) - 0.055) < 1e-9
+
+
+def test_fake_meal_change_seq_and_tombstones():
+    fake_supabase.seed(users=1, meals_per_user=2, items_per_meal=1)
+    client = TestClient(fake_supabase.app)
+    uid = fake_supabase.user_id_for_token("user-0")
+    rows = client.get(f"/rest/v1/meals?select=id,change_seq&user_id=eq.{uid}&order=change_seq").json()
+    first, second = rows
+
+    client.patch(f"/rest/v1/meals?id=eq.{first['id']}", json={"thumb_url": "x"})
+    client.delete(f"/rest/v1/meals?id=eq.{second['id']}")
+
+    bumped = client.get(f"/rest/v1/meals?select=change_seq&id=eq.{first['id']}").json()[0]["change_seq"]
+    tomb = client.get(f"/rest/v1/meal_tombstones?select=meal_id,change_seq&user_id=eq.{uid}").json()
+    assert bumped > second["change_seq"]
+    assert tomb == [{"meal_id": second["id"], "change_seq": bumped + 1}]
+
+    # cursor (change_xid, change_seq) del delta-sync, acotado por el horizonte
+    horizon = client.post("/rest/v1/rpc/meal_changes_horizon", json={}).json()
+    assert horizon == bumped + 2
+    after = client.get(
+        f"/rest/v1/meal_tombstones?select=meal_id&user_id=eq.{uid}"
+        f"&or=(change_xid.gt.{bumped},and(change_xid.eq.{bumped},change_seq.gt.{bumped}))&change_xid=lt.{horizon}"
+    ).json()
+    assert after == [{"meal_id": second["id"]}]
+
+
+def test_fake_relog_meal_scales_items_and_shares_the_blob():
+    fake_supabase.seed(users=2, meals_per_user=1, items_per_meal=2)
+    client = TestClient(fake_supabase.app)
+    uid = fake_supabase.user_id_for_token("user-0")
+    meal = client.get(f"/rest/v1/meals?select=id&user_id=eq.{uid}").json()[0]
+    client.patch(f"/rest/v1/meals?id=eq.{meal['id']}", json={"image_hash": "h1"})
+    fake_supabase.store.table("image_blobs").append({"hash": "h1", "path": "blobs/h1.jpg", "refcount": 1})
+
+    params = {"p_user_id": uid, "p_meal_id": meal["id"], "p_scale": 1.5}
+    row = client.post("/rest/v1/rpc/relog_meal", json=params).json()[0]
+    assert row["total_calories"] == 600.0  # 2 items x 200 kcal x 1.5
+    items = client.get(f"/rest/v1/meal_items?select=calories_kcal&meal_id=eq.{row['meal_id']}").json()
+    assert [i["calories_kcal"] for i in items] == [300.0, 300.0]
+    assert fake_supabase.store.table("image_blobs")[0]["refcount"] == 2
+
+    other = fake_supabase.user_id_for_token("user-1")
+    missing = client.post("/rest/v1/rpc/relog_meal", json={**params, "p_user_id": other})
+    assert missing.status_code == 404 and missing.json()["code"] == "P0002"
+
+
+def test_fake_search_meals_is_per_user_and_paginates_by_recency():
+    fake_supabase.seed(users=2, meals_per_user=8, items_per_meal=2)
+    client = TestClient(fake_supabase.app)
+    uid = fake_supabase.user_id_for_token("user-0")
+
+    params = {"p_user_id": uid, "p_query": "QUIN", "p_limit": 1}
+    first = client.post("/rest/v1/rpc/search_meals", json=params).json()
+    assert [r["matched_items"] for r in first] == [["quinua"]]
+    rest = client.post("/rest/v1/rpc/search_meals", json={
+        **params, "p_limit": 10, "p_before_date": first[0]["date_creation"], "p_before_id": first[0]["meal_id"],
+    }).json()
+    # "quinua" es foods[3]: la comida m la incluye si m o m+1 es 3 (mod 8) -> m = 2, 3
+    assert len(first) + len(rest) == 2
+    dates = [r["date_creation"] for r in first + rest]
+    assert dates == sorted(dates, reverse=True)
+
+    other = fake_supabase.user_id_for_token("user-1")
+    meal_ids = {r["meal_id"] for r in first + rest}
+    owners = {m["user_id"] for m in fake_supabase.store.table("meals") if m["id"] in meal_ids}
+    assert owners == {uid} and other not in owners
+
+
+def test_fake_food_stats_follow_saves_and_deletes_and_match_a_rebuild():
+    fake_supabase.seed(users=1, meals_per_user=4, items_per_meal=2)
+    client = TestClient(fake_supabase.app)
+    uid = fake_supabase.user_id_for_token("user-0")
+
+    def stats():
+        rows = client.get(f"/rest/v1/user_food_stats?select=*&user_id=eq.{uid}&order=name").json()
+        return {r["name"]: (r["item_count"], r["total_calories"], r["last_seen"]) for r in rows}
+
+    meal = client.post("/rest/v1/rpc/save_meal_with_items", json={
+        "p_meal": {"user_id": uid, "date_creation": "2099-01-01T12:00:00+00:00"},
+        "p_items": [{"name": " Quinua ", "weight_grams": 100, "calories_kcal": 120}],
+    }).json()[0]
+    assert stats()["quinua"] == (3, 520.0, "2099-01-01T12:00:00+00:00")
+
+    client.delete(f"/rest/v1/meal_items?meal_id=eq.{meal['meal_id']}")
+    client.delete(f"/rest/v1/meals?id=eq.{meal['meal_id']}")
+    incremental = stats()
+    assert incremental["quinua"][:2] == (2, 400.0) and incremental["quinua"][2] < "2099"
+
+    client.post("/rest/v1/rpc/rebuild_user_food_stats", json={"p_user_id": uid})
+    assert stats() == incremental
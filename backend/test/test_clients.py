@@ -0,0 +1,38 @@
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core import clients
+from app.core.clients import LazyClient
+
+
+def test_lazy_client_creates_on_first_attribute_access_only():
+    factory = MagicMock(return_value=MagicMock(table=MagicMock(return_value="rows")))
+    proxy = LazyClient(factory)
+    factory.assert_not_called()
+
+    assert proxy.table("meals") == "rows"
+    assert factory.call_count == 1
+
+
+def test_patched_attribute_shadows_real_client_until_restored():
+    real = MagicMock()
+    proxy = LazyClient(lambda: real)
+    with patch.object(proxy, "storage", "fake"):
+        assert proxy.storage == "fake"
+    assert proxy.storage is real.storage
+
+
+def test_missing_env_fails_on_first_use_not_on_import(monkeypatch):
+    monkeypatch.delenv("SUPABASE_SERVICE_ROLE_KEY", raising=False)
+    proxy = LazyClient(clients.get_supabase_admin)
+    with pytest.raises(RuntimeError, match="SUPABASE_SERVICE_ROLE_KEY"):
+        proxy.table("meals")
+
+
+def test_app_import_does_not_load_heavy_clients():
+    code = "import sys, app.main; print(','.join(m for m in ('openai', 'openpyxl', 'supabase') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
@@ -0,0 +1,95 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core import compression
+from app.core.compression import CompressionMiddleware
+from app.core.responses import FastJSONResponse, dumps
+
+ROWS = [{"id": i, "recommendation": "Buena fuente de proteína " * 4, "total_calories": 512.5} for i in range(200)]
+
+api = FastAPI(default_response_class=FastJSONResponse)
+api.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+
+@api.get("/big")
+def big():
+    return ROWS
+
+
+@api.get("/small")
+def small():
+    return {"ok": True}
+
+
+@api.get("/tagged")
+def tagged():
+    return FastJSONResponse(ROWS, headers={"ETag": '"abc"'})
+
+
+@api.get("/stream")
+def stream():
+    return StreamingResponse(iter([b"a" * 4096, b"b" * 4096]), media_type="text/csv")
+
+
+@api.get("/binary")
+def binary():
+    return PlainTextResponse(b"x" * 4096, media_type="application/octet-stream")
+
+
+client = TestClient(api)
+
+
+def test_negotiate_respects_q_values_and_wildcards(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert compression.negotiate("gzip, deflate") == "gzip"
+    assert compression.negotiate("br") is None
+    assert compression.negotiate("gzip;q=0") is None
+    assert compression.negotiate("*") == "gzip"
+    assert compression.negotiate(None) is None
+
+    monkeypatch.setattr(compression, "brotli", object())
+    assert compression.negotiate("gzip, br") == "br"
+    assert compression.negotiate("gzip;q=1, br;q=0.5") == "gzip"
+
+
+def test_large_json_is_gzipped_and_round_trips():
+    raw = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert raw.headers["content-encoding"] == "gzip"
+    assert raw.headers["vary"] == "Accept-Encoding"
+    assert raw.json() == ROWS
+    assert int(raw.headers["content-length"]) < len(dumps(ROWS)) / 4
+
+
+def test_small_streaming_and_binary_responses_are_untouched():
+    for path in ("/small", "/stream", "/binary"):
+        r = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in r.headers, path
+    assert client.get("/big", headers={"Accept-Encoding": "identity"}).headers.get("content-encoding") is None
+
+
+def test_vary_on_every_compressible_response():
+    # sin comprimir (chico o sin Accept-Encoding) también: un proxy no debe mezclar encodings
+    assert client.get("/small", headers={"Accept-Encoding": "gzip"}).headers["vary"] == "Accept-Encoding"
+    assert client.get("/big", headers={"Accept-Encoding": "identity"}).headers["vary"] == "Accept-Encoding"
+    assert client.get("/big", headers={"Accept-Encoding": ""}).headers["vary"] == "Accept-Encoding"
+    assert "vary" not in client.get("/binary", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_strong_etag_becomes_weak_when_compressed():
+    r = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["etag"] == 'W/"abc"'
+    assert client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"abc"'
+
+
+def test_fast_json_matches_standard_encoding():
+    from datetime import datetime
+    from decimal import Decimal
+
+    payload = {"when": datetime(2025, 1, 2, 3, 4, 5), "amount": Decimal("1.5"), "name": "ñandú", 1: "x"}
+    assert FastJSONResponse(payload).body.decode() == (
+        '{"when":"2025-01-02T03:04:05","amount":1.5,"name":"ñandú","1":"x"}'
+    )
+    assert gzip.decompress(compression.compress(b"{}" * 100, "gzip")) == b"{}" * 100
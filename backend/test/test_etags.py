@@ -0,0 +1,69 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core import etags
+from app.main import app
+from app.routes import meals
+
+
+@pytest.fixture()
+def history(monkeypatch):
+    db = MagicMock()
+    query = db.table.return_value.select.return_value.eq.return_value.order.return_value
+    query.execute.return_value.data = [{"id": 1, "total_calories": 500}]
+    monkeypatch.setattr(meals, "supabase", db)
+    app.dependency_overrides[meals.get_current_user_id] = lambda: "u-etag"
+    yield db
+    app.dependency_overrides.pop(meals.get_current_user_id, None)
+
+
+def test_matches_uses_weak_comparison_and_lists():
+    assert etags.matches('W/"abc"', '"abc"')
+    assert etags.matches('"x", W/"abc"', 'W/"abc"')
+    assert etags.matches("*", '"abc"')
+    assert not etags.matches('"abd"', '"abc"')
+    assert not etags.matches(None, '"abc"')
+
+
+def test_version_mode_answers_304_without_db_until_a_write(client, history, monkeypatch):
+    monkeypatch.setenv("ETAG_MODE", "version")
+    first = client.get("/api/history_meals", headers={"Authorization": "Bearer t"})
+    assert first.status_code == 200 and first.json() == [{"id": 1, "total_calories": 500}]
+    tag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    history.reset_mock()
+    again = client.get("/api/history_meals", headers={"Authorization": "Bearer t", "If-None-Match": tag})
+    assert again.status_code == 304 and again.content == b""
+    history.table.assert_not_called()
+
+    etags.bump("u-etag")
+    after_write = client.get("/api/history_meals", headers={"Authorization": "Bearer t", "If-None-Match": tag})
+    assert after_write.status_code == 200
+    assert after_write.headers["ETag"] != tag
+
+
+def test_hash_mode_queries_but_skips_the_body(client, history, monkeypatch):
+    monkeypatch.setenv("ETAG_MODE", "hash")
+    first = client.get("/api/history_meals", headers={"Authorization": "Bearer t"})
+    tag = first.headers["ETag"]
+    assert not tag.startswith("W/")
+
+    history.reset_mock()
+    again = client.get("/api/history_meals", headers={"Authorization": "Bearer t", "If-None-Match": tag})
+    assert again.status_code == 304
+    history.table.assert_called()
+
+    # otro contenido, otro ETag
+    query = history.table.return_value.select.return_value.eq.return_value.order.return_value
+    query.execute.return_value.data = []
+    changed = client.get("/api/history_meals", headers={"Authorization": "Bearer t", "If-None-Match": tag})
+    assert changed.status_code == 200 and changed.json() == []
+
+
+def test_version_tag_depends_on_query_and_extra_parts():
+    base = etags.version_tag("u1", "/api/meals/day", "tz=America/Lima", "2025-01-01")
+    assert base == etags.version_tag("u1", "/api/meals/day", "tz=America/Lima", "2025-01-01")
+    assert base != etags.version_tag("u1", "/api/meals/day", "tz=America/Lima", "2025-01-02")
+    assert base != etags.version_tag("u1", "/api/meals/day", "tz=UTC", "2025-01-01")
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.core import events, lifecycle, timezones
+from app.main import app
+from app.routes import meals
+
+
+def test_memory_broker_fans_out_per_user_from_any_thread():
+    async def scenario():
+        broker = events.MemoryBroker()
+        mine, other = broker.subscribe("u1"), broker.subscribe("u2")
+        # las rutas síncronas y las miniaturas publican desde otros hilos
+        threading.Thread(target=broker.publish, args=("u1", "meals")).start()
+        event = await mine.get(1)
+        assert event["kind"] == "meals"
+        assert await other.get(0.05) is None
+
+        broker.unsubscribe(mine)
+        broker.unsubscribe(mine)  # idempotente
+        assert broker.subscribers("u1") == 0 and broker.subscribers("u2") == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_drops_the_oldest_event():
+    async def scenario():
+        broker = events.MemoryBroker()
+        sub = broker.subscribe("u1")
+        sub.queue = asyncio.Queue(2)
+        for kind in ("a", "b", "c"):
+            broker.publish("u1", kind)
+        await asyncio.sleep(0)
+        assert [e["kind"] for e in sub.drain()] == ["b", "c"]
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_broker_delivers_across_instances(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+
+    async def scenario():
+        # dos workers: uno con el stream abierto, el otro recibe la escritura
+        reader, writer = events.SqliteBroker(path, poll_s=0.01), events.SqliteBroker(path)
+        try:
+            sub = reader.subscribe("u1")
+            writer.publish("u2", "meals")
+            writer.publish("u1", "profile")
+            event = await sub.get(2)
+            assert event["kind"] == "profile"
+            assert await sub.get(0.05) is None
+        finally:
+            reader.stop()
+
+    asyncio.run(scenario())
+
+
+def test_publish_async_runs_the_broker_off_the_event_loop(monkeypatch):
+    threads = []
+
+    class Broker:
+        def publish(self, user_id, kind):
+            threads.append(threading.get_ident())
+
+    monkeypatch.setattr(events, "_broker", Broker())
+
+    async def scenario():
+        # el insert de SqliteBroker puede esperar el lock de escritura: fuera del loop
+        await events.publish_async("u1", "meals")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert len(threads) == 1 and threads[0] != loop_thread
+
+
+@pytest.fixture()
+def day(monkeypatch):
+    calls = []
+
+    def fake_day(date, tz, user_id):
+        calls.append(user_id)
+        return {"date": date or "2025-01-01", "timezone": tz, "meals_count": len(calls)}
+
+    monkeypatch.setattr(meals, "_meals_and_summary_for_day", fake_day)
+    monkeypatch.setattr(timezones, "user_timezone", lambda user_id: "America/Lima")
+    monkeypatch.setattr(events, "_broker", events.MemoryBroker())
+    app.dependency_overrides[meals.get_current_user_id] = lambda: "u-stream"
+    yield calls
+    app.dependency_overrides.pop(meals.get_current_user_id, None)
+
+
+async def _open_stream(query: str):
+    """Llama la app ASGI directo: TestClient acumula el cuerpo y un stream no termina."""
+    chunks: asyncio.Queue = asyncio.Queue()
+    disconnected = asyncio.Event()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/meals/day/stream", "raw_path": b"/api/meals/day/stream",
+        "query_string": query.encode(), "root_path": "", "server": ("test", 80), "client": ("test", 1),
+        "headers": [(b"authorization", b"Bearer t"), (b"accept-encoding", b"gzip")],
+    }
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        await chunks.put(message)
+
+    task = asyncio.create_task(app(scope, receive, send))
+    return chunks, disconnected, task
+
+
+def _summaries(body: bytes):
+    return [json.loads(line[len(b"data: "):]) for line in body.split(b"\n") if line.startswith(b"data: ")]
+
+
+def test_stream_pushes_initial_summary_then_updates(day):
+    async def scenario():
+        chunks, disconnected, task = await _open_stream("date=2025-01-01")
+        start = await asyncio.wait_for(chunks.get(), 2)
+        assert start["status"] == 200
+        headers = dict(start["headers"])
+        assert headers[b"content-type"].startswith(b"text/event-stream")
+        assert b"content-encoding" not in headers  # sin compresión ni buffering
+
+        first = await asyncio.wait_for(chunks.get(), 2)
+        assert _summaries(first["body"]) == [{"date": "2025-01-01", "timezone": "America/Lima", "meals_count": 1}]
+        assert events.get_broker().subscribers("u-stream") == 1
+
+        # una ráfaga de escrituras se coalesce en un solo recálculo
+        for _ in range(3):
+            events.publish("u-stream", "meals")
+        update = await asyncio.wait_for(chunks.get(), 2)
+        assert _summaries(update["body"])[0]["meals_count"] == 2
+        assert len(day) == 2
+
+        disconnected.set()
+        await asyncio.wait_for(task, 2)
+        assert events.get_broker().subscribers("u-stream") == 0
+
+    asyncio.run(scenario())
+
+
+def test_stream_ends_when_the_worker_drains(day, monkeypatch):
+    async def scenario():
+        chunks, _, task = await _open_stream("")
+        await asyncio.wait_for(chunks.get(), 2)
+        await asyncio.wait_for(chunks.get(), 2)
+        monkeypatch.setitem(lifecycle._state, "draining", False)
+        lifecycle.mark_draining()
+        await asyncio.wait_for(task, 2)
+        assert events.get_broker().subscribers("u-stream") == 0
+
+    asyncio.run(scenario())
+
+
+def test_stream_limit_per_user(day, client, monkeypatch):
+    monkeypatch.setattr(meals, "STREAM_MAX_PER_USER", 1)
+
+    async def scenario():
+        events.get_broker().subscribe("u-stream")
+
+    asyncio.run(scenario())
+    res = client.get("/api/meals/day/stream", headers={"Authorization": "Bearer t"})
+    assert res.status_code == 429
+    assert res.headers["Retry-After"] == "30"
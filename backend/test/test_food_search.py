@@ -0,0 +1,31 @@
+def _row(meal_id, date):
+    return {"meal_id": meal_id, "date_creation": date, "matched_items": ["quinua"]}
+
+
+def test_search_pages_with_keyset_cursor(client, admin):
+    admin.rpc.return_value.execute.return_value.data = [
+        _row(9, "2025-03-02T12:00:00+00:00"), _row(4, "2025-03-01T12:00:00+00:00"),
+    ]
+    first = client.get("/api/meals/search", params={"q": " Quinua ", "limit": 2})
+    assert first.status_code == 200
+    assert [r["meal_id"] for r in first.json()["results"]] == [9, 4]
+    name, params = admin.rpc.call_args.args
+    assert name == "search_meals"
+    assert params == {"p_user_id": "u1", "p_query": "quinua", "p_limit": 2,
+                      "p_before_date": None, "p_before_id": None}
+
+    cursor = first.json()["next_cursor"]
+    admin.rpc.return_value.execute.return_value.data = [_row(1, "2025-02-01T12:00:00+00:00")]
+    last = client.get("/api/meals/search", params={"q": "quinua", "limit": 2, "cursor": cursor})
+    _, params = admin.rpc.call_args.args
+    assert params["p_before_date"] == "2025-03-01T12:00:00+00:00" and params["p_before_id"] == 4
+    assert last.json()["next_cursor"] is None
+
+
+def test_search_validates_query_and_cursor(client, admin):
+    assert client.get("/api/meals/search", params={"q": "a"}).status_code == 422
+    assert client.get("/api/meals/search", params={"q": "  a "}).status_code == 422
+    # 2 caracteres no forman un trigrama: el índice no sirve
+    assert client.get("/api/meals/search", params={"q": " pa "}).status_code == 422
+    assert client.get("/api/meals/search", params={"q": "arroz", "cursor": "no-es-cursor"}).status_code == 400
+    admin.rpc.assert_not_called()
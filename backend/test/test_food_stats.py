@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.jobs import rebuild_food_stats
+from app.main import app
+from app.routes import users
+
+
+@pytest.fixture()
+def db(monkeypatch):
+    client = MagicMock()
+    monkeypatch.setattr(users, "supabase", client)
+    app.dependency_overrides[users.get_current_user_id] = lambda: "u1"
+    yield client
+    app.dependency_overrides.pop(users.get_current_user_id, None)
+
+
+def test_food_stats_turns_sums_into_averages(client, db):
+    query = db.table.return_value.select.return_value.eq.return_value.order.return_value.limit.return_value
+    query.execute.return_value.data = [{
+        "user_id": "u1", "name": "quinua", "item_count": 4, "total_grams": 600,
+        "total_calories": 720, "total_protein_g": 26, "total_carbs_g": 128, "total_fat_g": 11.5,
+        "last_seen": "2025-03-01T12:00:00+00:00",
+    }]
+    r = client.get("/api/users/me/food_stats", params={"sort": "recent", "limit": 5})
+    assert r.status_code == 200
+    assert r.json() == {"foods": [{
+        "name": "quinua", "count": 4, "avg_grams": 150.0, "avg_calories": 180.0, "avg_protein_g": 6.5,
+        "avg_carbs_g": 32.0, "avg_fat_g": 2.88, "last_seen": "2025-03-01T12:00:00+00:00",
+    }]}
+    db.table.assert_called_with("user_food_stats")
+    db.table.return_value.select.return_value.eq.return_value.order.assert_called_with("last_seen", desc=True)
+    assert client.get("/api/users/me/food_stats", params={"sort": "alfabetico"}).status_code == 422
+
+
+def test_rebuild_job_goes_user_by_user_and_survives_failures():
+    batches = [[{"id": "a"}, {"id": "b"}], [{"id": "c"}], []]
+
+    def rebuild(user_id):
+        if user_id == "b":
+            raise RuntimeError("timeout")
+        return 3
+
+    with patch.object(rebuild_food_stats, "_users_batch", side_effect=lambda after, size: batches.pop(0)), \
+         patch.object(rebuild_food_stats, "_rebuild", side_effect=rebuild) as rpc:
+        counts = rebuild_food_stats.run(batch_size=2)
+    assert counts == {"users": 2, "foods": 6, "failed": 1}
+    assert [c.args[0] for c in rpc.call_args_list] == ["a", "b", "c"]
@@ -0,0 +1,215 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.core import idempotency
+
+
+@pytest.fixture(autouse=True)
+def memory_store(monkeypatch):
+    store = idempotency.MemoryIdempotencyStore()
+    monkeypatch.setattr(idempotency, "_store", store)
+    return store
+
+
+def _handler(calls, status=200, delay=0.0):
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return JSONResponse({"meal_id": len(calls)}, status_code=status)
+    return handler
+
+
+def test_replay_returns_stored_response_without_running_handler():
+    calls = []
+
+    async def scenario():
+        first = await idempotency.run("k1", "u1", "save_analysis", "fp", _handler(calls))
+        second = await idempotency.run("k1", "u1", "save_analysis", "fp", _handler(calls))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert second.body == first.body
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.headers["Idempotency-Hits"] == "1"
+
+
+def test_keys_are_scoped_per_user_and_without_key_always_runs():
+    calls = []
+
+    async def scenario():
+        await idempotency.run("k1", "u1", "save_analysis", "fp", _handler(calls))
+        await idempotency.run("k1", "u2", "save_analysis", "fp", _handler(calls))
+        await idempotency.run(None, "u1", "save_analysis", "fp", _handler(calls))
+
+    asyncio.run(scenario())
+    assert len(calls) == 3
+
+
+def test_concurrent_duplicate_waits_for_the_first():
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(
+            idempotency.run("k1", "u1", "analyse_meal", "fp", _handler(calls, delay=0.05)),
+            idempotency.run("k1", "u1", "analyse_meal", "fp", _handler(calls, delay=0.05)),
+        )
+
+    first, second = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert first.body == second.body
+
+
+def test_same_key_with_different_payload_is_rejected():
+    async def scenario():
+        await idempotency.run("k1", "u1", "save_analysis", "fp-a", _handler([]))
+        await idempotency.run("k1", "u1", "save_analysis", "fp-b", _handler([]))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 422
+
+
+def test_server_errors_release_the_key_and_client_errors_are_stored():
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise HTTPException(status_code=500, detail="boom")
+
+    async def invalid():
+        calls.append(1)
+        raise HTTPException(status_code=400, detail="JSON inválido")
+
+    async def scenario():
+        with pytest.raises(HTTPException):
+            await idempotency.run("k1", "u1", "save_analysis", "fp", failing)
+        retried = await idempotency.run("k1", "u1", "save_analysis", "fp", _handler(calls))
+
+        with pytest.raises(HTTPException):
+            await idempotency.run("k2", "u1", "save_analysis", "fp", invalid)
+        replayed = await idempotency.run("k2", "u1", "save_analysis", "fp", invalid)
+        return retried, replayed
+
+    retried, replayed = asyncio.run(scenario())
+    assert retried.status_code == 200 and "Idempotent-Replayed" not in retried.headers
+    assert replayed.status_code == 400 and replayed.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 3
+
+
+def test_sqlite_store_replays_across_instances(tmp_path, monkeypatch):
+    path = str(tmp_path / "idem.sqlite3")
+    calls = []
+
+    async def scenario():
+        monkeypatch.setattr(idempotency, "_store", idempotency.SqliteIdempotencyStore(path))
+        first = await idempotency.run("k1", "u1", "save_analysis", "fp", _handler(calls))
+        # otro worker: misma base, otra instancia
+        monkeypatch.setattr(idempotency, "_store", idempotency.SqliteIdempotencyStore(path))
+        second = await idempotency.run("k1", "u1", "save_analysis", "fp", _handler(calls))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert second.body == first.body
+    assert second.headers["Idempotency-Hits"] == "1"
+
+
+def test_save_analysis_route_honours_idempotency_key(client, monkeypatch):
+    from app.routes import analyse
+
+    calls = []
+
+    async def fake_store(user_id, image, analysis, recommendation):
+        calls.append(user_id)
+        return JSONResponse({"meal_id": 7})
+
+    admin = MagicMock()
+    admin.auth.get_user.return_value = {"user": {"id": "u1"}}
+    monkeypatch.setattr(analyse, "supabase_admin", admin)
+    monkeypatch.setattr(analyse, "_store_analysis", fake_store)
+    files = {"image": ("meal.jpg", b"fake", "image/jpeg")}
+    data = {"analysis": "{}", "recommendation": ""}
+    headers = {"Authorization": "Bearer t", "Idempotency-Key": "abc"}
+
+    first = client.post("/api/save_analysis", files=files, data=data, headers=headers)
+    second = client.post("/api/save_analysis", files=files, data=data, headers=headers)
+    assert first.json() == second.json() == {"meal_id": 7}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+    # otra foto del mismo tamaño y con el mismo nombre: la huella es el contenido -> 422
+    other = client.post("/api/save_analysis", files={"image": ("meal.jpg", b"otra", "image/jpeg")},
+                        data=data, headers=headers)
+    assert other.status_code == 422
+    assert len(calls) == 1
+
+
+def test_reservation_of_a_dead_worker_expires_after_the_lease(tmp_path, monkeypatch):
+    # solo sqlite: en memoria, si el worker murió la reserva murió con él
+    monkeypatch.setattr(idempotency, "LEASE_S", 0.05)
+    monkeypatch.setattr(idempotency, "_store", idempotency.SqliteIdempotencyStore(str(tmp_path / "i.sqlite3")))
+    calls = []
+
+    async def scenario():
+        # el worker reservó la clave y murió sin complete() ni release()
+        assert (await idempotency.get_store().begin("u1:save_analysis:k1", "fp", "dead"))[0] == "new"
+        await asyncio.sleep(0.1)
+        retried = await idempotency.run("k1", "u1", "save_analysis", "fp", _handler(calls))
+        replayed = await idempotency.run("k1", "u1", "save_analysis", "fp", _handler(calls))
+        return retried, replayed
+
+    retried, replayed = asyncio.run(scenario())
+    assert retried.status_code == 200 and len(calls) == 1
+    # la respuesta guardada dura el TTL, no el lease
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.parametrize("sqlite", [False, True])
+def test_slow_request_keeps_its_reservation_past_the_lease(tmp_path, monkeypatch, sqlite):
+    # un /analyse_meal con cola, reintentos y hedging puede durar más que el lease
+    monkeypatch.setattr(idempotency, "LEASE_S", 0.05)
+    monkeypatch.setattr(idempotency, "WAIT_S", 0.1)
+    if sqlite:
+        monkeypatch.setattr(idempotency, "_store", idempotency.SqliteIdempotencyStore(str(tmp_path / "i.sqlite3")))
+    calls = []
+
+    async def scenario():
+        first = asyncio.create_task(idempotency.run("k1", "u1", "analyse_meal", "fp", _handler(calls, delay=0.3)))
+        await asyncio.sleep(0.15)
+        with pytest.raises(HTTPException) as retry:
+            await idempotency.run("k1", "u1", "analyse_meal", "fp", _handler(calls))
+        await first
+        replayed = await idempotency.run("k1", "u1", "analyse_meal", "fp", _handler(calls))
+        return retry.value, replayed
+
+    retry, replayed = asyncio.run(scenario())
+    assert retry.status_code == 409
+    assert len(calls) == 1
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.parametrize("sqlite", [False, True])
+def test_complete_and_release_only_touch_their_own_reservation(tmp_path, monkeypatch, sqlite):
+    if sqlite:
+        monkeypatch.setattr(idempotency, "_store", idempotency.SqliteIdempotencyStore(str(tmp_path / "i.sqlite3")))
+    store = idempotency.get_store()
+    key = "u1:analyse_meal:k1"
+
+    async def scenario():
+        assert (await store.begin(key, "fp", "old"))[0] == "new"
+        await store.release(key, "old")
+        assert (await store.begin(key, "fp", "new"))[0] == "new"
+        # el request anterior termina tarde: no pisa ni libera la reserva del nuevo
+        await store.complete(key, "old", idempotency.StoredResponse(200, b"viejo"))
+        await store.release(key, "old")
+        assert (await store.begin(key, "fp", "other"))[0] == "in_flight"
+        await store.complete(key, "new", idempotency.StoredResponse(200, b"nuevo"))
+        return await store.begin(key, "fp", "other")
+
+    outcome, stored = asyncio.run(scenario())
+    assert outcome == "replay" and stored.body == b"nuevo"
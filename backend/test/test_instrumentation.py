@@ -0,0 +1,35 @@
+from unittest.mock import MagicMock, patch
+
+from app.core import metrics
+from app.core.instrumentation import server_timing_header, stage_duration
+
+
+def test_server_timing_header_groups_stages():
+    header = server_timing_header([("db", 0.010), ("auth", 0.005), ("db", 0.020)], 0.050)
+    assert header == 'db;dur=30.0;desc="2 calls", auth;dur=5.0, total;dur=50.0'
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.histogram("test_latency_seconds", "test", buckets=(0.1, 1.0))
+    h.observe(0.05, route="/x")
+    h.observe(0.5, route="/x")
+    text = h.render()
+    assert 'test_latency_seconds_bucket{route="/x",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="/x",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{route="/x"} 2' in text
+
+
+@patch("app.core.supabase.supabase.table")
+@patch("app.core.supabase.supabase.auth.get_user")
+def test_request_emits_server_timing_and_stage_metrics(mock_get_user, mock_table, client):
+    mock_get_user.return_value = MagicMock(user=MagicMock(id="u1"))
+    mock_table.return_value.select.return_value.eq.return_value.order.return_value.execute.return_value.data = []
+
+    before = stage_duration.count(route="/api/history_meals", stage="db")
+    resp = client.get("/api/history_meals", headers={"Authorization": "Bearer t"})
+
+    assert resp.status_code == 200
+    timing = resp.headers["server-timing"]
+    assert "auth;dur=" in timing and "db;dur=" in timing and "total;dur=" in timing
+    assert stage_duration.count(route="/api/history_meals", stage="db") == before + 1
+    assert "stage_duration_seconds_bucket" in client.get("/metrics").text
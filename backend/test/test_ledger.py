@@ -0,0 +1,43 @@
+import os
+from types import SimpleNamespace
+
+from app.core import ledger
+
+
+def _response(prompt, completion):
+    usage = SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion)
+    return SimpleNamespace(usage=usage)
+
+
+def test_record_from_response_estimates_cost():
+    rec = ledger.ModelCallRecord.from_response("vision", "gpt-4o", 120.0, _response(1000, 100), image_bytes=2048)
+    assert rec.total_tokens == 1100
+    assert rec.image_bytes == 2048
+    assert abs(rec.cost_usd - (1000 * 2.50 + 100 * 10.00) / 1_000_000) < 1e-12
+
+
+def test_writer_flushes_and_summarizes(tmp_path):
+    path = os.path.join(tmp_path, "ledger.sqlite3")
+    writer = ledger.LedgerWriter(path, flush_interval_s=0.01)
+    for ms in (100, 200, 300, 400):
+        writer.record(ledger.ModelCallRecord.from_response("vision", "gpt-5-mini", ms, _response(500, 50)))
+    writer.record(ledger.ModelCallRecord.from_response("recommendation", "gpt-4o", 50, outcome="TimeoutError"))
+    writer.close()
+
+    report = {r["model"]: r for r in ledger.summarize(days=1, path=path)}
+    vision = report["gpt-5-mini"]
+    assert vision["calls"] == 4
+    assert vision["p50_latency_ms"] in (200.0, 300.0)
+    assert vision["p95_latency_ms"] == 400.0
+    assert vision["total_tokens"] == 4 * 550
+    assert report["gpt-4o"]["errors"] == 1
+
+
+def test_admin_endpoint_requires_token(client, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/api/admin/model_usage").status_code == 404
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.get("/api/admin/model_usage", headers={"X-Admin-Token": "nope"}).status_code == 403
+    resp = client.get("/api/admin/model_usage", headers={"X-Admin-Token": "secret"})
+    assert resp.status_code == 200
+    assert "report" in resp.json()
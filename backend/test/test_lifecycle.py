@@ -0,0 +1,44 @@
+import asyncio
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app import serve
+from app.core import lifecycle
+from app.main import app
+
+
+def test_readyz_reports_ready_after_startup_and_503_while_draining():
+    with TestClient(app) as c:
+        assert c.get("/healthz").json() == {"status": "ok"}
+        resp = c.get("/readyz")
+        assert resp.status_code == 200
+        assert resp.json()["ready"] is True
+        assert resp.json()["warmup_ms"] is not None
+
+        lifecycle.mark_draining()
+        assert c.get("/readyz").status_code == 503
+        assert c.get("/healthz").status_code == 200
+
+
+def test_worker_count_respects_env_and_cgroup_limit(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert serve.worker_count() == 3
+
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    monkeypatch.setattr(serve.os, "sched_getaffinity", lambda _: set(range(16)), raising=False)
+    with patch.object(serve, "_cgroup_cpu_limit", return_value=1.5):
+        assert serve.worker_count() == 2
+    with patch.object(serve, "_cgroup_cpu_limit", return_value=None):
+        assert serve.worker_count() == 8  # MAX_WORKERS por defecto
+
+
+def test_recycle_middleware_signals_once_at_limit():
+    async def inner(scope, receive, send):
+        pass
+
+    mw = lifecycle.RecycleMiddleware(inner, max_requests=2, jitter=0)
+    with patch.object(lifecycle.os, "kill") as kill:
+        for _ in range(4):
+            asyncio.run(mw({"type": "http"}, None, None))
+    assert kill.call_count == 1
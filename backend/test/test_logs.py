@@ -0,0 +1,81 @@
+import io
+import json
+import logging
+import logging.handlers
+import queue
+
+from app.core import logs
+
+
+def _pipeline(sample_rate=1.0, maxsize=100):
+    stream = io.StringIO()
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(logs.JsonFormatter())
+    log_queue = queue.Queue(maxsize=maxsize)
+    logger = logging.getLogger(f"test.logs.{id(stream)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logs.NonBlockingQueueHandler(log_queue, sample_rate))
+    return logger, log_queue, writer, stream
+
+
+def _drain(log_queue, writer, stream):
+    listener = logging.handlers.QueueListener(log_queue, writer)
+    listener.start()
+    listener.stop()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_lines_carry_request_id_extras_and_exceptions():
+    logger, log_queue, writer, stream = _pipeline()
+    token = logs.request_id_var.set("req-1")
+    try:
+        logger.info("guardado %s", "ok", extra={"meal_id": 7})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("falló")
+    finally:
+        logs.request_id_var.reset(token)
+
+    info, error = _drain(log_queue, writer, stream)
+    assert info["msg"] == "guardado ok" and info["meal_id"] == 7 and info["request_id"] == "req-1"
+    assert info["level"] == "INFO" and "args" not in info
+    assert error["level"] == "ERROR" and "ValueError: boom" in error["exc"]
+
+
+def test_sampling_is_per_request_and_never_drops_warnings():
+    logger, log_queue, writer, stream = _pipeline(sample_rate=0.0)
+    logger.info("fuera de un request")
+    token = logs.request_id_var.set("req-2")
+    try:
+        logger.info("muestreado fuera")
+        logger.warning("siempre")
+    finally:
+        logs.request_id_var.reset(token)
+    assert [r["msg"] for r in _drain(log_queue, writer, stream)] == ["fuera de un request", "siempre"]
+
+    rate = 0.3
+    kept = sum(logs.sampled(f"req-{i}", rate) for i in range(5000))
+    assert 0.25 < kept / 5000 < 0.35
+    assert logs.sampled("req-9", rate) == logs.sampled("req-9", rate)
+
+
+def test_full_queue_drops_instead_of_blocking():
+    logger, log_queue, _, _ = _pipeline(maxsize=2)
+    before = logs.log_records_dropped_total.value()
+    for i in range(5):
+        logger.info("línea %d", i)
+    assert log_queue.qsize() == 2
+    assert logs.log_records_dropped_total.value() - before == 3
+
+
+def test_request_id_header_is_echoed_or_generated(client, caplog):
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        r = client.get("/healthz", headers={"X-Request-ID": "abc-123"})
+    assert r.headers["x-request-id"] == "abc-123"
+    access = [rec for rec in caplog.records if rec.name == "app.access"]
+    assert access and access[-1].path == "/healthz" and access[-1].status == 200
+
+    generated = client.get("/healthz").headers["x-request-id"]
+    assert len(generated) == 32 and generated != "abc-123"
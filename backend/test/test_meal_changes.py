@@ -0,0 +1,149 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import meals
+from bench import fake_supabase
+
+
+class _Query:
+    """Builder mínimo de postgrest sobre filas en memoria (select/eq/lt/or_/order/limit)."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, *_):
+        return self
+
+    def eq(self, column, value):
+        return _Query([r for r in self.rows if r.get(column) == value])
+
+    def lt(self, column, value):
+        return _Query([r for r in self.rows if r[column] < value])
+
+    def or_(self, filters):
+        return _Query([r for r in self.rows if fake_supabase.matches_any(r, f"({filters})")])
+
+    def order(self, column, desc=False):
+        # estable: order("change_xid").order("change_seq") se aplica al revés
+        self.rows = sorted(self.rows, key=lambda r: r[column], reverse=desc)
+        return self
+
+    def limit(self, n):
+        return _Query(self.rows[:n])
+
+    def execute(self):
+        return SimpleNamespace(data=self.rows)
+
+
+def _row(meal_id, seq, xid=None, **extra):
+    # sin xid explícito, cada cambio es su propia transacción (como el fake de bench)
+    return {"id": meal_id, "user_id": "u1", "change_seq": seq, "change_xid": seq if xid is None else xid, **extra}
+
+
+@pytest.fixture()
+def tables(monkeypatch):
+    data = {
+        "meals": [_row(i, i) for i in (1, 3, 4, 5)] + [_row(99, 2, user_id="u2")],
+        "meal_tombstones": [],
+        "horizon": None,  # None: todas las transacciones terminaron
+    }
+
+    def horizon():
+        xids = [r["change_xid"] for name in ("meals", "meal_tombstones") for r in data[name]]
+        return data["horizon"] or max(xids, default=0) + 1
+
+    admin = SimpleNamespace(rpc=lambda name, params: SimpleNamespace(
+        execute=lambda: SimpleNamespace(data=horizon())
+    ))
+    monkeypatch.setattr(meals, "supabase", SimpleNamespace(table=lambda name: _Query(data[name])))
+    monkeypatch.setattr(meals, "get_supabase_admin", lambda: admin)
+    app.dependency_overrides[meals.get_current_user_id] = lambda: "u1"
+    yield data
+    app.dependency_overrides.pop(meals.get_current_user_id, None)
+
+
+def _changes(client, since=None, **params):
+    if since:
+        params["since"] = since
+    r = client.get("/api/history_meals/changes", params=params)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_initial_sync_then_only_deltas(client, tables):
+    full = _changes(client)
+    assert [m["id"] for m in full["upserted"]] == [1, 3, 4, 5]
+    assert full["deleted"] == [] and full["has_more"] is False
+
+    # borrado (lápida) y alta nueva después del token
+    tables["meals"] = [m for m in tables["meals"] if m["id"] != 3]
+    tables["meal_tombstones"].append({"meal_id": 3, "user_id": "u1", "change_seq": 6, "change_xid": 6})
+    tables["meals"].append(_row(7, 7))
+
+    delta = _changes(client, full["next_since"])
+    assert [m["id"] for m in delta["upserted"]] == [7]
+    assert delta["deleted"] == [3]
+
+    in_sync = _changes(client, delta["next_since"])
+    assert in_sync["upserted"] == [] and in_sync["deleted"] == []
+    assert in_sync["next_since"].split(".")[:2] == ["7", "7"]
+    assert "etag" not in {k.lower() for k in client.get("/api/history_meals/changes").headers}
+
+
+def test_pages_are_ordered_by_change_seq(client, tables):
+    for meal in tables["meals"]:
+        if meal["id"] in (4, 5):
+            meal["change_seq"] = meal["change_xid"] = meal["change_seq"] + 4  # 8 y 9
+    tables["meal_tombstones"].append({"meal_id": 2, "user_id": "u1", "change_seq": 4, "change_xid": 4})
+    first = _changes(client, f"2.2.{int(time.time())}", limit=2)
+    # seq 3 (upsert) y 4 (lápida); la comida 4 queda para la siguiente página
+    assert [m["id"] for m in first["upserted"]] == [3]
+    assert first["deleted"] == [2]
+    assert first["has_more"] is True
+
+    second = _changes(client, first["next_since"], limit=2)
+    assert [m["id"] for m in second["upserted"]] == [4, 5]
+
+
+def test_mixed_changes_overflowing_one_page_report_has_more(client, tables):
+    full = _changes(client)
+    # 6 altas y 6 borrados intercalados: ninguna lista llena el límite, juntas sí
+    for i in range(6):
+        tables["meals"].append(_row(100 + i, 10 + 2 * i))
+        tables["meal_tombstones"].append({"meal_id": 200 + i, "user_id": "u1", "change_seq": 11 + 2 * i,
+                                          "change_xid": 11 + 2 * i})
+    first = _changes(client, full["next_since"], limit=10)
+    assert len(first["upserted"]) + len(first["deleted"]) == 10
+    assert first["has_more"] is True
+
+    second = _changes(client, first["next_since"], limit=10)
+    assert [m["id"] for m in second["upserted"]] == [105]
+    assert second["deleted"] == [205]
+    assert second["has_more"] is False
+
+
+def test_invalid_and_expired_tokens(client, tables):
+    assert client.get("/api/history_meals/changes", params={"since": "abc"}).status_code == 400
+    old = int(time.time()) - (meals.TOMBSTONE_RETENTION_DAYS + 1) * 86400
+    assert client.get("/api/history_meals/changes", params={"since": f"5.5.{old}"}).status_code == 410
+    # formato anterior "<change_seq>.<emitido>": sin xid no se puede seguir, sincronización completa
+    now = int(time.time())
+    assert client.get("/api/history_meals/changes", params={"since": f"5.{now}"}).status_code == 410
+
+
+def test_late_commit_is_not_skipped(client, tables):
+    full = _changes(client)
+    # la transacción 10 toma el seq 6 y sigue abierta; la 11 toma el 7 y confirma primero
+    tables["meals"].append(_row(6, 6, xid=10))
+    tables["meals"].append(_row(7, 7, xid=11))
+    tables["horizon"] = 10
+
+    early = _changes(client, full["next_since"])
+    assert early["upserted"] == []  # la 11 espera a que termine la 10
+    tables["horizon"] = None
+    late = _changes(client, early["next_since"])
+    assert [m["id"] for m in late["upserted"]] == [6, 7]
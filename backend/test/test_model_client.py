@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.model_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ModelCallPolicy,
+    call_model,
+    hedges_total,
+    retries_total,
+)
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def _policy(**kw):
+    base = dict(timeout_s=2.0, max_retries=2, backoff_base_s=0.001, backoff_max_s=0.001)
+    base.update(kw)
+    return ModelCallPolicy(**base)
+
+
+def test_retries_retryable_errors_then_succeeds():
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 3:
+            raise FakeStatusError(503)
+        return "ok"
+
+    before = retries_total.value(model="m-retry")
+    result = asyncio.run(call_model(create, policy=_policy(), circuit=CircuitBreaker("t1"), model="m-retry"))
+    assert result == "ok"
+    assert len(calls) == 3
+    assert calls[0]["timeout"] == 2.0
+    assert retries_total.value(model="m-retry") - before == 2
+
+
+def test_does_not_retry_client_errors():
+    calls = []
+
+    def create(**kwargs):
+        calls.append(1)
+        raise FakeStatusError(400)
+
+    with pytest.raises(FakeStatusError):
+        asyncio.run(call_model(create, policy=_policy(), circuit=CircuitBreaker("t2"), model="m"))
+    assert len(calls) == 1
+
+
+def test_timeout_raises():
+    def create(**kwargs):
+        time.sleep(0.3)
+        return "late"
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(call_model(create, policy=_policy(timeout_s=0.05, max_retries=0), circuit=CircuitBreaker("t3"), model="m"))
+
+
+def test_hedged_request_wins_when_primary_is_slow():
+    calls = []
+
+    def create(**kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    before = hedges_total.value(model="m-hedge")
+    policy = _policy(hedge=True, hedge_after_s=0.05)
+    result = asyncio.run(call_model(create, policy=policy, circuit=CircuitBreaker("t4"), model="m-hedge"))
+    assert result == "fast"
+    assert hedges_total.value(model="m-hedge") - before == 1
+
+
+def test_circuit_opens_and_fails_fast():
+    circuit = CircuitBreaker("t5", failure_threshold=2, reset_timeout_s=60)
+    calls = []
+
+    def create(**kwargs):
+        calls.append(1)
+        raise FakeStatusError(500)
+
+    with pytest.raises(FakeStatusError):
+        asyncio.run(call_model(create, policy=_policy(max_retries=1), circuit=circuit, model="m"))
+    assert circuit.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError) as exc:
+        asyncio.run(call_model(create, policy=_policy(), circuit=circuit, model="m"))
+    assert len(calls) == 2
+    # Retry-After del 503: lo que le queda abierto al circuito, no un valor fijo
+    assert 59 < exc.value.retry_after_s <= 60
+
+
+def test_circuit_half_open_probe_closes_on_success():
+    circuit = CircuitBreaker("t6", failure_threshold=1, reset_timeout_s=0.01)
+    circuit.record_failure()
+    assert circuit.state == CircuitBreaker.OPEN
+    time.sleep(0.02)
+    assert circuit.allow() is True
+    assert circuit.allow() is False  # solo una sonda en half_open
+    circuit.record_success()
+    assert circuit.state == CircuitBreaker.CLOSED
@@ -0,0 +1,67 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from app.jobs import reanalyse_meals
+from app.routes import analyse
+
+MEALS = [{"id": i, "img_url": f"http://x/storage/v1/object/public/meals/meals/u/{i}.jpg"} for i in range(1, 6)]
+BASELINE = [{"name": "Arroz blanco", "weight_grams": 150, "calories_kcal": 200,
+             "protein_g": 4, "carbs_g": 40, "fat_g": 1}]
+
+
+def _batches(after_id, size, user_id=None):
+    return [m for m in MEALS if after_id is None or m["id"] > after_id][:size]
+
+
+def _run(tmp_path, analyze, **kwargs):
+    with patch.object(reanalyse_meals, "_meals_batch", side_effect=_batches), \
+         patch.object(reanalyse_meals, "_meals_by_id", side_effect=lambda ids: [m for m in MEALS if m["id"] in ids]), \
+         patch.object(reanalyse_meals, "_baseline_items", side_effect=lambda ids: {i: BASELINE for i in ids}), \
+         patch.object(reanalyse_meals.storage, "download", return_value=b"jpeg"), \
+         patch.object(analyse, "analyze_image", side_effect=analyze), \
+         patch.dict("os.environ", {"SUPABASE_BUCKET": "meals"}):
+        return asyncio.run(reanalyse_meals.run("r1", str(tmp_path), batch_size=2, concurrency=2, **kwargs))
+
+
+def _meal_ids(tmp_path):
+    return sorted(r["meal_id"] for r in reanalyse_meals.RunFiles(str(tmp_path), "r1").load_results())
+
+
+async def _ok(image, content_type):
+    return {"alimentos": [{"nombre": "arroz blanco", "calorias": 180, "proteinas_g": 4,
+                           "carbohidratos_g": 38, "grasas_g": 1}]}
+
+
+def test_resumes_from_checkpoint_without_repeating_meals(tmp_path):
+    assert _run(tmp_path, _ok, limit=3) == {"ok": 3, "failed": 0, "skipped": 0}
+    # el lote [3, 4] quedó a medias: el checkpoint sigue en 2
+    assert json.loads((tmp_path / "r1" / "checkpoint.json").read_text())["after_id"] == 2
+    with open(tmp_path / "r1" / "results.jsonl", "a") as fh:
+        fh.write('{"meal_id": 4, "outc')  # interrupción a mitad de línea
+
+    assert _run(tmp_path, _ok) == {"ok": 2, "failed": 0, "skipped": 0}
+    assert _meal_ids(tmp_path) == [1, 2, 3, 4, 5]
+
+
+def test_failed_meals_are_retried_on_the_next_run(tmp_path):
+    async def flaky(image, content_type):
+        raise TimeoutError("modelo lento")
+
+    assert _run(tmp_path, flaky) == {"ok": 0, "failed": 5, "skipped": 0}
+    assert _run(tmp_path, _ok) == {"ok": 5, "failed": 0, "skipped": 0}
+    summary = reanalyse_meals.report("r1", str(tmp_path))["summary"]
+    assert summary["outcomes"] == {"ok": 5, "failed": 0, "skipped": 0}
+
+
+def test_summary_compares_against_meal_items():
+    results = [
+        {"meal_id": 1, "outcome": "ok", "latency_ms": 100.0, "baseline": BASELINE,
+         "items": [{"nombre": "arroz blanco", "calorias": 150}, {"nombre": "huevo", "calorias": 90}]},
+        {"meal_id": 2, "outcome": "failed", "baseline": BASELINE},
+    ]
+    summary = reanalyse_meals.summarize(results)
+    assert summary["outcomes"] == {"ok": 1, "failed": 1, "skipped": 0}
+    assert summary["mae"]["calorias"] == 40.0 and summary["calories_mape_pct"] == 20.0
+    assert summary["foods"] == {"precision": 0.5, "recall": 1.0, "f1": 0.667}
+    assert summary["latency_ms"]["p50"] == 100.0
@@ -0,0 +1,28 @@
+from postgrest.exceptions import APIError
+
+
+def test_relog_clones_meal_in_one_rpc(client, admin):
+    admin.rpc.return_value.execute.return_value.data = [{
+        "meal_id": 42, "total_calories": 300, "total_protein_g": 10, "total_carbs_g": 40, "total_fat_g": 5,
+    }]
+    r = client.post("/api/meals/7/relog", json={"scale": 0.5})
+    assert r.status_code == 201
+    assert r.json() == {
+        "meal_id": 42, "source_meal_id": 7, "scale": 0.5,
+        "totals": {"calorias": 300.0, "proteinas_g": 10.0, "carbohidratos_g": 40.0, "grasas_g": 5.0},
+    }
+    name, params = admin.rpc.call_args.args
+    assert name == "relog_meal"
+    assert params["p_user_id"] == "u1" and params["p_meal_id"] == 7 and params["p_scale"] == 0.5
+    assert admin.rpc.call_count == 1
+
+
+def test_relog_defaults_and_validation(client, admin):
+    admin.rpc.return_value.execute.return_value.data = [{"meal_id": 1}]
+    assert client.post("/api/meals/7/relog").json()["scale"] == 1.0
+    assert client.post("/api/meals/7/relog", json={"scale": 0}).status_code == 422
+
+
+def test_relog_of_someone_elses_meal_is_404(client, admin):
+    admin.rpc.return_value.execute.side_effect = APIError({"code": "P0002", "message": "Meal not found"})
+    assert client.post("/api/meals/7/relog").status_code == 404
@@ -0,0 +1,90 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core import storage
+from app.main import app
+from app.routes import meals
+
+
+def _signer(paths, expires_in):
+    return [{"path": p, "error": None, "signedURL": f"https://cdn/{p}?exp={expires_in}"} for p in paths]
+
+
+@pytest.fixture()
+def signed(monkeypatch):
+    monkeypatch.setenv("STORAGE_URL_MODE", "signed")
+    bucket = MagicMock()
+    bucket.create_signed_urls.side_effect = _signer
+    monkeypatch.setattr(storage, "bucket", lambda: bucket)
+    storage.signed_urls.clear()
+    yield bucket
+    storage.signed_urls.clear()
+
+
+def test_public_mode_stores_urls_and_leaves_rows_alone(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "https://x.supabase.co")
+    monkeypatch.setenv("SUPABASE_BUCKET", "meals")
+    monkeypatch.delenv("STORAGE_URL_MODE", raising=False)
+    ref = storage.stored_ref("blobs/ab/abc.jpg")
+    assert ref == "https://x.supabase.co/storage/v1/object/public/meals/blobs/ab/abc.jpg"
+    rows = [{"img_url": ref}]
+    assert storage.sign_rows(rows) is rows and storage.url_window() is None
+
+
+def test_one_batch_per_page_then_cache_until_the_window_ends(signed):
+    rows = [
+        {"id": 1, "img_url": "blobs/a.jpg", "thumb_url": "thumbs/a_320.webp",
+         "thumbnails": {"160": "thumbs/a_160.webp", "320": "thumbs/a_320.webp"}},
+        {"id": 2, "img_url": "blobs/a.jpg", "thumb_url": None},
+        {"id": 3, "img_url": "https://legacy/public/b.jpg"},
+    ]
+    out = storage.sign_rows(rows)
+    assert signed.create_signed_urls.call_count == 1
+    paths, ttl = signed.create_signed_urls.call_args.args
+    assert sorted(paths) == ["blobs/a.jpg", "thumbs/a_160.webp", "thumbs/a_320.webp"] and ttl == storage.SIGNED_URL_TTL_S
+    assert out[0]["thumbnails"]["160"].startswith("https://cdn/thumbs/a_160.webp")
+    assert out[1]["img_url"] == out[0]["img_url"] and out[1]["thumb_url"] is None
+    assert out[2]["img_url"] == "https://legacy/public/b.jpg"  # filas guardadas antes del cambio de modo
+    assert rows[0]["img_url"] == "blobs/a.jpg"  # no muta el resultado compartido
+
+    storage.sign_rows(rows)
+    assert signed.create_signed_urls.call_count == 1
+    later = storage.url_window() + 1
+    storage.sign(["blobs/a.jpg"], now=later * storage.SIGNED_URL_REFRESH_S)
+    assert signed.create_signed_urls.call_count == 2
+
+
+def test_failed_paths_are_not_cached(signed):
+    signed.create_signed_urls.side_effect = lambda paths, ttl: [
+        {"path": p, "error": "not_found", "signedURL": None} for p in paths
+    ]
+    assert storage.sign(["blobs/gone.jpg"]) == {}
+    signed.create_signed_urls.side_effect = _signer
+    assert storage.sign(["blobs/gone.jpg"])["blobs/gone.jpg"].startswith("https://cdn/")
+
+
+def test_history_signs_the_page_and_etag_follows_the_window(client, signed, monkeypatch):
+    db = MagicMock()
+    query = db.table.return_value.select.return_value.eq.return_value.order.return_value
+    query.execute.return_value.data = [{"id": i, "img_url": f"blobs/{i}.jpg"} for i in range(20)]
+    monkeypatch.setattr(meals, "supabase", db)
+    app.dependency_overrides[meals.get_current_user_id] = lambda: "u-signed"
+    try:
+        first = client.get("/api/history_meals")
+        assert first.status_code == 200 and signed.create_signed_urls.call_count == 1
+        assert all(m["img_url"].startswith("https://cdn/") for m in first.json())
+
+        etag = first.headers["etag"]
+        assert client.get("/api/history_meals", headers={"If-None-Match": etag}).status_code == 304
+        window = storage.url_window()
+        monkeypatch.setattr(storage, "url_window", lambda now=None: window + 1)
+        assert client.get("/api/history_meals", headers={"If-None-Match": etag}).status_code == 200
+    finally:
+        app.dependency_overrides.pop(meals.get_current_user_id, None)
+
+
+def test_object_path_accepts_stored_paths(monkeypatch):
+    monkeypatch.setenv("SUPABASE_BUCKET", "meals")
+    assert storage.object_path("blobs/ab/abc.jpg") == "blobs/ab/abc.jpg"
+    assert storage.object_path("https://x/storage/v1/object/public/meals/blobs/c.jpg") == "blobs/c.jpg"
@@ -0,0 +1,79 @@
+import threading
+import time
+
+
+from app.core import etags, singleflight
+from app.core.singleflight import Group
+
+
+def _concurrently(n, fn):
+    barrier = threading.Barrier(n)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_identical_reads_share_one_call():
+    group = Group()
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"id": "u1"}
+
+    results, errors = _concurrently(6, lambda: group.do(("users_me", "u1"), load, label="test"))
+    assert len(calls) == 1
+    assert not errors and len(results) == 6
+    assert all(r is results[0] for r in results)
+    assert group.inflight() == 0
+
+    # terminada la ráfaga, la siguiente lectura vuelve a consultar
+    group.do(("users_me", "u1"), load, label="test")
+    assert len(calls) == 2
+
+
+def test_errors_are_shared_and_the_key_is_released():
+    group = Group()
+
+    def failing():
+        time.sleep(0.05)
+        raise RuntimeError("supabase caído")
+
+    results, errors = _concurrently(4, lambda: group.do("k", failing))
+    assert not results and len(errors) == 4
+    assert group.do("k", lambda: "ok") == "ok"
+
+
+def test_reads_after_a_write_do_not_join_older_flights(monkeypatch):
+    monkeypatch.setattr(singleflight, "reads", Group())
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append("before")
+        started.set()
+        release.wait(1)
+        return "viejo"
+
+    t = threading.Thread(target=lambda: singleflight.read("u-sf", "meals_day", slow))
+    t.start()
+    started.wait(1)
+    etags.bump("u-sf")  # p. ej. save_analysis terminó mientras tanto
+    assert singleflight.read("u-sf", "meals_day", lambda: "nuevo") == "nuevo"
+    release.set()
+    t.join()
+    assert calls == ["before"]
@@ -0,0 +1,70 @@
+import hashlib
+import io
+from unittest.mock import MagicMock, patch
+
+from app.core import storage
+
+
+def _client(rows):
+    client = MagicMock()
+    client.rpc.return_value.execute.return_value.data = rows
+    return client
+
+
+def test_blob_path_is_derived_from_content_and_content_type():
+    digest, size = storage.content_hash(io.BytesIO(b"foto"))
+    assert digest == hashlib.sha256(b"foto").hexdigest() and size == 4
+    assert storage.blob_path(digest, "image/jpeg") == f"blobs/{digest[:2]}/{digest}.jpg"
+
+
+def test_put_blob_skips_upload_when_object_exists():
+    bucket = MagicMock()
+    bucket.exists.return_value = True
+    blob = storage.put_blob(bucket, io.BytesIO(b"foto"), "image/png")
+    assert blob.uploaded is False
+    bucket.upload.assert_not_called()
+
+    bucket.exists.return_value = False
+    blob = storage.put_blob(bucket, io.BytesIO(b"foto"), "image/png")
+    assert blob.uploaded is True
+    assert bucket.upload.call_args.kwargs["path"] == blob.path
+
+
+def test_acquire_reuploads_when_dedup_hit_is_the_only_reference():
+    bucket = MagicMock()
+    blob = storage.StoredBlob("ab" * 32, "blobs/ab/x.jpg", 4, "image/jpeg", uploaded=False)
+    assert storage.acquire_blob(_client([{"refcount": 1, "created": True}]), bucket, blob, io.BytesIO(b"foto")) == 1
+    assert bucket.upload.call_args.kwargs["file_options"]["upsert"] == "true"
+
+    bucket.reset_mock()
+    storage.acquire_blob(_client([{"refcount": 2, "created": False}]), bucket, blob, io.BytesIO(b"foto"))
+    bucket.upload.assert_not_called()
+
+
+def test_release_removes_blob_and_thumbnails_only_at_zero():
+    with patch.object(storage, "remove") as remove:
+        storage.release_image(_client([{"refcount": 1, "path": "blobs/ab/x.jpg"}]), "h")
+        remove.assert_not_called()
+        storage.release_image(_client([{"refcount": 0, "path": "blobs/ab/x.jpg"}]), "h")
+    removed = remove.call_args[0][0]
+    assert removed[0] == "blobs/ab/x.jpg" and "thumbs/ab/x_320.webp" in removed
+
+
+def test_dedup_stats_reports_ratio_and_bytes_saved():
+    stats = storage.dedup_stats(_client([{"blobs": 2, "references_count": 5, "stored_bytes": 300, "logical_bytes": 900}]))
+    assert stats["dedup_ratio"] == 2.5 and stats["bytes_saved"] == 600
+
+
+def test_delete_meal_releases_the_blob_with_the_service_role(client, admin, monkeypatch):
+    from app.routes import meals
+
+    db = MagicMock()
+    db.table.return_value.select.return_value.eq.return_value.eq.return_value.execute.return_value.data = [
+        {"id": 7, "image_hash": "h"}
+    ]
+    monkeypatch.setattr(meals, "supabase", db)
+    with patch.object(storage, "release_image") as release:
+        res = client.delete("/api/delete_meal/7", headers={"Authorization": "Bearer t"})
+    assert res.status_code == 200
+    # release_image_blob está cerrado para anon/authenticated: va con el cliente admin
+    release.assert_called_once_with(admin, "h")
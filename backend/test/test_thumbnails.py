@@ -0,0 +1,62 @@
+import io
+import os
+from unittest.mock import patch
+
+from PIL import Image
+
+from app.core import storage, thumbnails
+from app.jobs import backfill_thumbnails
+
+
+def _jpeg(width=1200, height=800) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 200, 40)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def test_render_produces_webp_per_size_keeping_aspect_ratio():
+    out = thumbnails.render(io.BytesIO(_jpeg()), sizes=(160, 320))
+    assert set(out) == {160, 320}
+    with Image.open(io.BytesIO(out[320])) as img:
+        assert img.format == "WEBP"
+        assert img.size == (320, 213)
+
+
+def test_thumb_path_and_public_url_round_trip():
+    assert thumbnails.thumb_path("meals/u1/20250101/abc.jpg", 320) == "thumbs/u1/20250101/abc_320.webp"
+    url = storage.public_url("thumbs/u1/abc_320.webp")
+    assert storage.object_path(url + "?v=1") == "thumbs/u1/abc_320.webp"
+    assert storage.object_path("https://otro.cdn/x.jpg") is None
+
+
+def test_submit_runs_in_background_and_cleans_up_temp_file(monkeypatch):
+    monkeypatch.setattr(thumbnails, "ENABLED", True)
+    seen = {}
+
+    def fake_generate(meal_id, path, fh):
+        seen["args"] = (meal_id, path, fh.read(), fh.name)
+
+    with patch.object(thumbnails, "generate", side_effect=fake_generate):
+        assert thumbnails.submit(7, "meals/u1/d/a.jpg", io.BytesIO(b"img")) is True
+        thumbnails.shutdown()
+
+    meal_id, path, data, tmp_name = seen["args"]
+    assert (meal_id, path, data) == (7, "meals/u1/d/a.jpg", b"img")
+    assert not os.path.exists(tmp_name)
+
+
+def test_submit_skips_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr(thumbnails, "ENABLED", True)
+    monkeypatch.setattr(thumbnails, "MAX_PENDING", 0)
+    assert thumbnails.submit(1, "meals/a.jpg", io.BytesIO(b"x")) is False
+
+
+def test_backfill_pages_by_id_and_counts_outcomes():
+    batches = [[{"id": 1, "img_url": storage.public_url("meals/u/1.jpg")}, {"id": 2, "img_url": None}], []]
+    with patch.object(backfill_thumbnails, "_pending_batch", side_effect=lambda after, size: batches.pop(0)), \
+         patch.object(storage, "download", return_value=_jpeg()), \
+         patch.object(thumbnails, "generate") as gen:
+        counts = backfill_thumbnails.run(batch_size=2, workers=1)
+
+    assert counts == {"ok": 1, "failed": 0, "skipped": 1}
+    assert gen.call_args[0][:2] == (1, "meals/u/1.jpg")
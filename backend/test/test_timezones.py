@@ -0,0 +1,121 @@
+import random
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from zoneinfo import ZoneInfo
+
+import pytest
+from pydantic import ValidationError
+
+from app.core import timezones
+from app.main import app
+from app.models.user import UserCreate
+from app.routes import meals
+
+
+def _per_row(value: str, tz_name: str):
+    # la conversión fila a fila que reemplaza local_date_times
+    local = datetime.fromisoformat(value).astimezone(ZoneInfo(tz_name))
+    return local.date().isoformat(), local.strftime("%H:%M")
+
+
+def test_resolve_tz_is_memoized_and_falls_back():
+    assert timezones.resolve_tz("America/Lima") is timezones.resolve_tz("America/Lima")
+    assert timezones.resolve_tz("No/Existe") is timezone.utc
+    assert timezones.resolve_tz("../etc/passwd") is timezone.utc  # ValueError de ZoneInfo
+    assert not timezones.is_valid_tz("No/Existe") and not timezones.is_valid_tz("")
+    assert timezones.is_valid_tz("Europe/Madrid")
+
+
+def test_day_and_range_bounds():
+    assert timezones.day_range_utc("2025-03-10", "America/Lima") == (
+        "2025-03-10", "2025-03-10T05:00:00+00:00", "2025-03-11T05:00:00+00:00",
+    )
+    # día de 23 horas por el cambio a horario de verano
+    assert timezones.range_utc("2024-03-10", None, "America/New_York") == (
+        "2024-03-10T05:00:00+00:00", "2024-03-11T04:00:00+00:00",
+    )
+    assert timezones.range_utc(None, None, "UTC") is None
+    with pytest.raises(ValueError):
+        timezones.range_utc("2025-02-01", "2025-01-01", "UTC")
+
+
+@pytest.mark.parametrize("tz_name", ["America/Lima", "America/New_York", "Australia/Lord_Howe", "Asia/Kolkata"])
+def test_bulk_conversion_matches_per_row(tz_name):
+    rng = random.Random(tz_name)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    values = [
+        (start + timedelta(seconds=rng.randrange(2 * 365 * 86400), microseconds=rng.randrange(10**6))).isoformat()
+        for _ in range(3000)
+    ]
+    # instantes justo alrededor de los cambios de hora de Nueva York
+    values += ["2024-03-10T06:59:59+00:00", "2024-03-10T07:00:00+00:00", "2024-11-03T05:30:00+00:00",
+               "2024-11-03T06:30:00+00:00", "2024-11-03T10:00:00Z", "2024-06-01T12:00:00-05:00"]
+    assert timezones.local_date_times(values, tz_name) == [_per_row(v, tz_name) for v in values]
+    assert timezones.local_date_times([], tz_name) == []
+
+
+def test_user_timezone_is_cached_until_forgotten(monkeypatch):
+    admin = MagicMock()
+    query = admin.table.return_value.select.return_value.eq.return_value
+    query.execute.return_value.data = [{"timezone": "Europe/Madrid"}]
+    monkeypatch.setattr(timezones, "get_supabase_admin", lambda: admin)
+    timezones.forget_user("u-tz")
+
+    assert timezones.user_timezone("u-tz") == "Europe/Madrid"
+    assert timezones.user_timezone("u-tz") == "Europe/Madrid"
+    assert query.execute.call_count == 1
+
+    query.execute.return_value.data = [{"timezone": "No/Existe"}]
+    timezones.forget_user("u-tz")
+    assert timezones.user_timezone("u-tz") == timezones.DEFAULT_TZ
+    timezones.forget_user("u-tz")
+
+
+def test_profile_rejects_unknown_timezone():
+    profile = {"name": "Ana", "age": 30, "height_cm": 160, "weight_kg": 60, "gender": "female",
+               "activity_level_id": 2, "objective_id": 1}
+    assert UserCreate(**profile).model_dump(exclude_none=True).get("timezone") is None
+    assert UserCreate(**profile, timezone="America/Bogota").timezone == "America/Bogota"
+    with pytest.raises(ValidationError):
+        UserCreate(**profile, timezone="Marte/Olympus")
+
+
+def test_meals_day_defaults_to_the_stored_timezone(client, monkeypatch):
+    seen = []
+    monkeypatch.setattr(meals, "_meals_and_summary_for_day", lambda date, tz, user_id: seen.append(tz) or {"timezone": tz})
+    monkeypatch.setattr(timezones, "user_timezone", lambda user_id: "Asia/Tokyo")
+    app.dependency_overrides[meals.get_current_user_id] = lambda: "u-tz-day"
+    try:
+        client.get("/api/meals/day?date=2025-01-01", headers={"Authorization": "Bearer t"})
+        client.get("/api/meals/day?date=2025-01-01&tz=UTC", headers={"Authorization": "Bearer t"})
+    finally:
+        app.dependency_overrides.pop(meals.get_current_user_id, None)
+    assert seen == ["Asia/Tokyo", "UTC"]
+
+
+def test_meals_day_304_does_not_read_the_profile(client, monkeypatch):
+    reads = []
+    monkeypatch.setenv("ETAG_MODE", "version")
+    monkeypatch.setattr(meals, "_meals_and_summary_for_day", lambda date, tz, user_id: {"timezone": tz})
+    monkeypatch.setattr(timezones, "user_timezone", lambda user_id: reads.append(user_id) or "Asia/Tokyo")
+    monkeypatch.setattr(timezones, "cached_user_timezone", lambda user_id: None)
+    app.dependency_overrides[meals.get_current_user_id] = lambda: "u-tz-304"
+    try:
+        first = client.get("/api/meals/day?date=2025-01-01", headers={"Authorization": "Bearer t"})
+        again = client.get(
+            "/api/meals/day?date=2025-01-01",
+            headers={"Authorization": "Bearer t", "If-None-Match": first.headers["ETag"]},
+        )
+    finally:
+        app.dependency_overrides.pop(meals.get_current_user_id, None)
+    assert again.status_code == 304
+    assert reads == ["u-tz-304"]
+
+
+def test_meals_day_etag_follows_the_cached_timezone(monkeypatch):
+    monkeypatch.setattr(timezones, "cached_user_timezone", lambda user_id: ("Asia/Tokyo", 100.0))
+    tokyo = meals._day_zone_parts("u1", None, "2025-01-01")
+    # la caché se recargó (otro worker pudo cambiar la zona): cambia el validador
+    monkeypatch.setattr(timezones, "cached_user_timezone", lambda user_id: ("Asia/Tokyo", 400.0))
+    assert meals._day_zone_parts("u1", None, "2025-01-01") != tokyo
+    assert meals._day_zone_parts("u1", "UTC", None) == ("UTC", timezones.today("UTC"))
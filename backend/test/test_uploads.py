@@ -0,0 +1,58 @@
+import io
+import tempfile
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.core.uploads import UploadLimitMiddleware, storage_source
+
+
+def _app(max_bytes: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_bytes=max_bytes)
+
+    @app.post("/up")
+    async def up(image: UploadFile = File(...)):
+        return {"size": image.size}
+
+    return app
+
+
+def test_upload_under_limit_passes():
+    c = TestClient(_app(10_000))
+    r = c.post("/up", files={"image": ("a.jpg", b"x" * 1000, "image/jpeg")})
+    assert r.status_code == 200 and r.json() == {"size": 1000}
+
+
+def test_declared_content_length_over_limit_is_rejected_early():
+    c = TestClient(_app(10_000))
+    r = c.post("/up", files={"image": ("a.jpg", b"x" * 20_000, "image/jpeg")})
+    assert r.status_code == 413
+    assert "máximo" in r.json()["detail"]
+
+
+def test_streamed_body_over_limit_is_rejected():
+    c = TestClient(_app(10_000))
+    body = b"--b\r\nContent-Disposition: form-data; name=\"image\"; filename=\"a.jpg\"\r\n" \
+           b"Content-Type: image/jpeg\r\n\r\n" + b"x" * 20_000 + b"\r\n--b--\r\n"
+
+    def chunks():
+        for i in range(0, len(body), 4096):
+            yield body[i:i + 4096]
+
+    r = c.post("/up", content=chunks(), headers={"content-type": "multipart/form-data; boundary=b"})
+    assert r.status_code == 413
+
+
+def test_storage_source_returns_bytes_in_memory_and_reader_on_disk():
+    small = tempfile.SpooledTemporaryFile(max_size=100)
+    small.write(b"abc")
+    with storage_source(small) as src:
+        assert src == b"abc"
+
+    big = tempfile.SpooledTemporaryFile(max_size=10)
+    big.write(b"y" * 50)
+    with storage_source(big) as src:
+        assert isinstance(src, io.BufferedReader)
+        assert src.read() == b"y" * 50
+    assert not big.closed
@@ -1,5 +1,5 @@
 // app/(home)/history/index.tsx
-import { useEffect, useMemo, useState, useCallback } from 'react'
+import { useEffect, useMemo, useState, useCallback, useRef } from 'react'
 import {
     ActivityIndicator,
     FlatList,
@@ -26,6 +26,8 @@ type Meal = {
     user_id: string
     date_creation: string
     img_url: string
+    thumb_url?: string | null
+    thumbnails?: Record<string, string> | null
     recommendation: string
     total_calories: number
     total_protein_g: number
@@ -39,6 +41,24 @@ type SortKey = 'kcal' | 'proteina' | 'carbs' | 'grasas' | 'fecha'
 type SortDir = 'asc' | 'desc'
 
 const STORAGE_KEY = 'historyFilters-v1'
+const HISTORY_CACHE_KEY = 'historyMeals-v1'
+
+// respuesta de /history_meals/changes
+type MealChanges = {
+    upserted: Meal[]
+    deleted: (string | number)[]
+    next_since: string
+    has_more: boolean
+}
+
+type HistorySync = { since: string | null; meals: Meal[] }
+
+function mergeChanges(current: Meal[], changes: MealChanges): Meal[] {
+    const byId = new Map(current.map((m) => [String(m.id), m]))
+    for (const id of changes.deleted) byId.delete(String(id))
+    for (const meal of changes.upserted) byId.set(String(meal.id), meal)
+    return Array.from(byId.values())
+}
 
 export default function History() {
     const API_URL = process.env.EXPO_PUBLIC_API_URL || ''
@@ -55,6 +75,10 @@ export default function History() {
         return h
     }, [session?.access_token])
 
+    // Delta-sync: se guarda el historial y el último token; cada refresco pide solo los cambios
+    const syncRef = useRef<HistorySync | null>(null)
+    const cacheKey = `${HISTORY_CACHE_KEY}:${session?.user?.id ?? ''}`
+
     const [showDeleteConfirm, setShowDeleteConfirm] = useState(false)
     const [mealDeleteId, setMealDeleteId] = useState<string | null>(null)
     const [loadingDelete, setLoadingDelete] = useState(false)
@@ -126,17 +150,37 @@ export default function History() {
                 setError(null)
                 if (showSpinner) setLoading(true)
 
-                const res = await fetch(`${API_URL}/history_meals`, {
-                    headers: {
-                        ...headers,
-                        'Cache-Control': 'no-cache',
-                        Pragma: 'no-cache',
-                    },
-                    cache: 'no-store',
-                    signal: controller.signal,
-                })
-                if (!res.ok) throw new Error(`HTTP ${res.status}`)
-                const data: Meal[] = await res.json()
+                let sync = syncRef.current
+                if (sync === null) {
+                    const raw = await AsyncStorage.getItem(cacheKey)
+                    sync = raw ? JSON.parse(raw) : { since: null, meals: [] }
+                }
+                let { since, meals: data } = sync as HistorySync
+
+                let hasMore = true
+                while (hasMore) {
+                    const query = since ? `?since=${encodeURIComponent(since)}` : ''
+                    const res = await fetch(`${API_URL}/history_meals/changes${query}`, {
+                        headers: {
+                            ...headers,
+                            'Cache-Control': 'no-cache',
+                            Pragma: 'no-cache',
+                        },
+                        cache: 'no-store',
+                        signal: controller.signal,
+                    })
+                    if (res.status === 410) {
+                        // token vencido: sincronización completa
+                        since = null
+                        data = []
+                        continue
+                    }
+                    if (!res.ok) throw new Error(`HTTP ${res.status}`)
+                    const changes: MealChanges = await res.json()
+                    data = mergeChanges(data, changes)
+                    since = changes.next_since
+                    hasMore = changes.has_more
+                }
 
                 // Orden inicial por fecha desc para consistencia
                 data.sort(
@@ -144,6 +188,8 @@ export default function History() {
                         new Date(b.date_creation).getTime() -
                         new Date(a.date_creation).getTime()
                 )
+                syncRef.current = { since, meals: data }
+                AsyncStorage.setItem(cacheKey, JSON.stringify(syncRef.current)).catch(() => {})
                 setMeals(data)
             } catch (e: any) {
                 if (e?.name !== 'AbortError') {
@@ -154,7 +200,7 @@ export default function History() {
             }
             return controller
         },
-        [API_URL, headers, meals.length]
+        [API_URL, headers, meals.length, cacheKey]
     )
 
     // Carga inicial
@@ -328,7 +374,7 @@ export default function History() {
                 <View style={styles.card}>
                     <Image
                         source={{
-                            uri: `${item.img_url}?v=${encodeURIComponent(
+                            uri: `${item.thumbnails?.['640'] ?? item.thumb_url ?? item.img_url}?v=${encodeURIComponent(
                                 item.date_creation
                             )}`,
                         }}
@@ -22,6 +22,7 @@ import {
     MediaTypeOptions,
 } from 'expo-image-picker'
 import { useAuth } from '../../context/AuthContext'
+import { useDaySummaryStream } from '../../hooks/useDaySummaryStream'
 
 /* ---------- Tipos ---------- */
 export type UserInfo = {
@@ -84,6 +85,7 @@ export type DayMeal = {
     user_id: string
     date_creation: string
     img_url?: string | null
+    thumb_url?: string | null
     recommendation?: string | null
     total_calories?: number | null
     total_carbs_g?: number | null
@@ -232,7 +234,7 @@ function MealMiniCard({ item }: { item: DayMeal }) {
         >
             {hasImg ? (
                 <Image
-                    source={{ uri: item.img_url! }}
+                    source={{ uri: (item.thumb_url ?? item.img_url)! }}
                     style={{
                         width: 56,
                         height: 56,
@@ -361,9 +363,18 @@ export default function Home() {
         [API_URL, session?.access_token]
     )
 
+    // el servidor empuja el resumen al conectar y tras cada cambio (guardar, borrar, perfil)
+    const { connected: dayLive } = useDaySummaryStream<DaySummary>(
+        API_URL,
+        session?.access_token,
+        selectedDate,
+        setDaySummary
+    )
+
+    // sin stream (red que corta conexiones largas, backend viejo): GET normal
     useEffect(() => {
-        loadDaySummary(selectedDate)
-    }, [loadDaySummary, selectedDate])
+        if (!dayLive) loadDaySummary(selectedDate)
+    }, [dayLive, loadDaySummary, selectedDate])
 
     const goPrevDay = useCallback(
         () => setSelectedDate((s) => toYMD(addDays(parseYMD(s), -1))),
@@ -582,8 +593,8 @@ export default function Home() {
             setRecommendation(null)
             setIsAnalyzing(false)
             Alert.alert('Éxito', 'Análisis guardado')
-            // recargar progreso del día
-            loadDaySummary(selectedDate)
+            // con el stream conectado el resumen del día llega solo
+            if (!dayLive) loadDaySummary(selectedDate)
             getInfo()
         } catch (e: any) {
             Alert.alert('Error', e?.message || 'No se pudo guardar el análisis')
@@ -599,6 +610,7 @@ export default function Home() {
         imageFile,
         recommendation,
         selectedDate,
+        dayLive,
         loadDaySummary,
         session?.access_token,
     ])
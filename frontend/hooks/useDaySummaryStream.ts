@@ -0,0 +1,97 @@
+import { useEffect, useRef, useState } from 'react'
+
+// Resumen del día por Server-Sent Events (GET /meals/day/stream).
+// React Native no expone el cuerpo de fetch como stream, así que se lee con
+// XMLHttpRequest: onprogress entrega el texto acumulado y se parsean los
+// eventos nuevos. Si la conexión se corta se reconecta con backoff; mientras
+// tanto `connected` queda en false y la pantalla puede usar el GET normal.
+// `responseText` acumula todo lo recibido mientras dure la conexión: pasado
+// MAX_STREAM_CHARS se corta y se reconecta en el acto (sin backoff).
+
+const MAX_BACKOFF_MS = 30000
+const MAX_STREAM_CHARS = 1024 * 1024
+
+export function useDaySummaryStream<T>(
+    apiUrl: string | undefined,
+    token: string | undefined,
+    date: string,
+    onSummary: (summary: T) => void
+) {
+    const [connected, setConnected] = useState(false)
+    const [error, setError] = useState<string | null>(null)
+    const onSummaryRef = useRef(onSummary)
+    onSummaryRef.current = onSummary
+
+    useEffect(() => {
+        if (!apiUrl || !token) return
+        let xhr: XMLHttpRequest | null = null
+        let retryTimer: ReturnType<typeof setTimeout> | null = null
+        let closed = false
+        let attempt = 0
+
+        const connect = () => {
+            let seen = 0
+            let buffer = ''
+            xhr = new XMLHttpRequest()
+            xhr.open(
+                'GET',
+                `${apiUrl}/meals/day/stream?date=${encodeURIComponent(date)}`
+            )
+            xhr.setRequestHeader('Authorization', `Bearer ${token}`)
+            xhr.setRequestHeader('Accept', 'text/event-stream')
+
+            xhr.onprogress = () => {
+                if (!xhr) return
+                buffer += xhr.responseText.slice(seen)
+                seen = xhr.responseText.length
+                const blocks = buffer.split('\n\n')
+                buffer = blocks.pop() ?? ''
+                for (const block of blocks) {
+                    let event = 'message'
+                    const data: string[] = []
+                    for (const line of block.split('\n')) {
+                        if (line.startsWith('event: ')) event = line.slice(7)
+                        else if (line.startsWith('data: ')) data.push(line.slice(6))
+                    }
+                    if (event === 'day_summary' && data.length) {
+                        attempt = 0
+                        setConnected(true)
+                        setError(null)
+                        onSummaryRef.current(JSON.parse(data.join('\n')) as T)
+                    }
+                }
+                if (seen > MAX_STREAM_CHARS && !buffer) {
+                    // abort no dispara onload/onerror: se reconecta desde aquí
+                    xhr.onload = xhr.onerror = xhr.onprogress = null
+                    xhr.abort()
+                    attempt = 0
+                    connect()
+                }
+            }
+
+            const retry = () => {
+                setConnected(false)
+                if (closed) return
+                if (xhr && xhr.status >= 400 && xhr.status !== 429)
+                    setError(`Error ${xhr.status}`)
+                const delay = Math.min(MAX_BACKOFF_MS, 1000 * 2 ** attempt)
+                attempt += 1
+                retryTimer = setTimeout(connect, delay)
+            }
+            // el servidor cierra el stream al drenar un worker: se reconecta a otro
+            xhr.onload = retry
+            xhr.onerror = retry
+            xhr.send()
+        }
+
+        connect()
+        return () => {
+            closed = true
+            if (retryTimer) clearTimeout(retryTimer)
+            xhr?.abort()
+            setConnected(false)
+        }
+    }, [apiUrl, token, date])
+
+    return { connected, error }
+}